@@ -1,7 +1,10 @@
 import os
 
+import httpx
 from dotenv import load_dotenv
-from supabase import Client, create_client
+from supabase import Client, ClientOptions, create_client
+
+from app.core import retry
 
 
 class Config:
@@ -21,6 +24,72 @@ class Config:
     CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY", "")
     CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET", "")
 
+    # Write-behind message persistence (local journal flushed to Supabase)
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() == "true"
+    MESSAGE_JOURNAL_PATH = os.getenv("MESSAGE_JOURNAL_PATH", "data/messages.journal")
+    MESSAGE_JOURNAL_BATCH_SIZE = int(os.getenv("MESSAGE_JOURNAL_BATCH_SIZE", "200"))
+    MESSAGE_JOURNAL_FLUSH_SECONDS = float(
+        os.getenv("MESSAGE_JOURNAL_FLUSH_SECONDS", "0.5")
+    )
+
+    # Conversation ownership cache (conversation_id -> owner, escalation state)
+    CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "10000"))
+    CONVERSATION_CACHE_TTL_SECONDS = float(
+        os.getenv("CONVERSATION_CACHE_TTL_SECONDS", "300")
+    )
+
+    # Profile / role cache used by the auth checks
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+    PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+
+    # Agent -> assigned conversation cache for message authorization. Only the
+    # worker that resolves a case invalidates it; the others may still accept
+    # messages from the agent for up to this long, so keep it short
+    ASSIGNMENT_CACHE_SIZE = int(os.getenv("ASSIGNMENT_CACHE_SIZE", "1000"))
+    ASSIGNMENT_CACHE_TTL_SECONDS = float(os.getenv("ASSIGNMENT_CACHE_TTL_SECONDS", "5"))
+
+    # In-memory autocomplete trie of the agents' canned responses
+    CANNED_RESPONSES_CACHE_TTL_SECONDS = float(
+        os.getenv("CANNED_RESPONSES_CACHE_TTL_SECONDS", "300")
+    )
+
+    # Cold-storage archival of old conversations (0 disables the nightly job)
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+    ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", "128"))
+
+    # Idempotency-Key replay store for retried POST requests (idempotency_keys
+    # table); a running key whose worker died is reclaimable after the lease
+    IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "300"))
+
+    # WebSocket fan-out between workers: "memory" (single worker) or "postgres"
+    # (LISTEN/NOTIFY; direct connection or session pooler, not port 6543)
+    BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "memory").lower()
+    BROADCAST_DATABASE_URL = os.getenv("BROADCAST_DATABASE_URL", "")
+
+    # Agent work queue: seconds of waiting one priority level is worth
+    AGENT_QUEUE_AGING_SECONDS = float(os.getenv("AGENT_QUEUE_AGING_SECONDS", "600"))
+
+    # Automatic assignment of pending requests to available agents
+    AUTO_ASSIGN_ENABLED = os.getenv("AUTO_ASSIGN_ENABLED", "false").lower() == "true"
+    AUTO_ASSIGN_TICK_SECONDS = float(os.getenv("AUTO_ASSIGN_TICK_SECONDS", "5"))
+    AUTO_ASSIGN_GRACE_SECONDS = float(os.getenv("AUTO_ASSIGN_GRACE_SECONDS", "30"))
+
+    # Email outbox dispatcher (retries with exponential backoff, then dead letter)
+    EMAIL_OUTBOX_POLL_SECONDS = int(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "10"))
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+    EMAIL_OUTBOX_BACKOFF_SECONDS = float(
+        os.getenv("EMAIL_OUTBOX_BACKOFF_SECONDS", "30")
+    )
+
+    # Retries of Supabase calls (full-jitter backoff, budget per HTTP request)
+    DB_RETRY_MAX_ATTEMPTS = int(os.getenv("DB_RETRY_MAX_ATTEMPTS", "3"))
+    DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.2"))
+    DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "2.0"))
+    DB_RETRY_BUDGET_PER_REQUEST = int(os.getenv("DB_RETRY_BUDGET_PER_REQUEST", "3"))
+
     # Image upload limits
     MAX_IMAGE_SIZE_MB = 10  # 10MB max
     ALLOWED_IMAGE_TYPES = [
@@ -53,8 +122,24 @@ SUPABASE_KEY = Config.SUPABASE_SERVICE_ROLE_KEY
 assert SUPABASE_URL is not None
 assert SUPABASE_KEY is not None
 
+retry.configure(
+    retry.RetryPolicy(
+        max_attempts=Config.DB_RETRY_MAX_ATTEMPTS,
+        base_delay=Config.DB_RETRY_BASE_DELAY,
+        max_delay=Config.DB_RETRY_MAX_DELAY,
+    )
+)
+
+# Cliente HTTP compartido por PostgREST y auth. Los reintentos se hacen en las
+# rutas y en los servicios (app.core.retry), no en el transporte
+_http_client = httpx.Client(
+    transport=httpx.HTTPTransport(http2=True),
+    timeout=120,
+    follow_redirects=True,
+)
+
 supabase_: Client = create_client(
-    SUPABASE_URL, SUPABASE_KEY
+    SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=_http_client)
 )  # Inicializar el cliente de Supabase con la URL y la clave de servicio
 
 
@@ -0,0 +1,71 @@
+"""
+Fixed-size log-bucketed histogram (HDR-style) for streaming percentiles.
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class LogHistogram:
+    """
+    Records non-negative values in logarithmic buckets, so every percentile is
+    accurate to within `precision` (relative error) while memory and query
+    cost depend only on the value range, never on how many values were seen.
+    Values above max_value are clamped to the last bucket.
+    """
+
+    def __init__(
+        self, min_value: float = 1.0, max_value: float = 3.0e6, precision: float = 0.02
+    ):
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_growth = math.log1p(precision)
+        self._counts: List[int] = [0] * (self._index(max_value) + 1)
+        self._total = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_growth) + 1
+
+    def _upper_bound(self, index: int) -> float:
+        return self.min_value * math.exp(index * self._log_growth)
+
+    def record(self, value: float) -> None:
+        value = max(value, 0.0)
+        index = min(self._index(value), len(self._counts) - 1)
+        with self._lock:
+            self._counts[index] += 1
+            self._total += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Value at percentile p (0-100), or None when empty"""
+        with self._lock:
+            if not self._total:
+                return None
+            rank = max(1, math.ceil(self._total * p / 100))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return min(self._upper_bound(index), self._max)
+            return self._max
+
+    def summary(
+        self, percentiles: Iterable[float] = (50, 90, 95, 99)
+    ) -> Dict[str, Optional[float]]:
+        """count, mean, max and the requested percentiles"""
+        result: Dict[str, Optional[float]] = {
+            f"p{p}": self.percentile(p) for p in percentiles
+        }
+        with self._lock:
+            result["count"] = self._total
+            result["mean"] = self._sum / self._total if self._total else None
+            result["max"] = self._max if self._total else None
+        return result
@@ -0,0 +1,15 @@
+"""
+Helpers for keyset (cursor) pagination with PostgREST.
+"""
+
+
+def keyset_after(order_column: str, order_value: str, last_id: str) -> str:
+    """
+    Build a PostgREST `or` filter selecting rows strictly after
+    (order_value, last_id) when ordered by (order_column, id) ascending.
+    Values are double-quoted because timestamps contain reserved characters.
+    """
+    return (
+        f'{order_column}.gt."{order_value}",'
+        f'and({order_column}.eq."{order_value}",id.gt."{last_id}")'
+    )
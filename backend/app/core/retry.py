@@ -0,0 +1,219 @@
+"""
+Shared retry policy for database (Supabase) calls.
+
+- Full-jitter exponential backoff: the delay before retry n is uniform in
+  [0, min(max_delay, base_delay * 2**n)], so clients that failed together
+  don't retry together.
+- Per-request budget: every HTTP request gets a fixed number of retries for
+  all of its database calls (retry_budget(), installed by a middleware), so a
+  DB flap costs at most that many extra calls per request instead of
+  max_attempts per call.
+- Read-only routes retry at the route boundary: call_with_retry_async runs
+  the blocking call in the threadpool and waits out the backoff with
+  asyncio.sleep, so neither the event loop nor a worker thread sleeps
+  (with_db_retry decorates whole sync handlers).
+- Service code that already runs in a worker thread (writes made on behalf of
+  a request, scheduler jobs, the outbox dispatcher, background executors)
+  wraps single calls in call_with_retry, which sleeps that thread. Writes
+  that aren't idempotent retry only when the request never reached the
+  server (retryable=is_connect_error).
+- Per-operation counters (calls, retries, failures, budget exhausted).
+"""
+
+import asyncio
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from postgrest.exceptions import APIError
+from supabase_auth.errors import AuthRetryableError
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+class RetryPolicy:
+    def __init__(
+        self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Full-jitter delay before retry number `retry` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+class RetryBudget:
+    """Retries left for the current request, shared by all its calls"""
+
+    def __init__(self, retries: int) -> None:
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class RetryStats:
+    """Per-operation counters"""
+
+    EVENTS = ("calls", "retries", "failures", "budget_exhausted")
+
+    def __init__(self) -> None:
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, event: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(
+                operation, {name: 0 for name in self.EVENTS}
+            )
+            counts[event] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {operation: dict(c) for operation, c in self._counts.items()}
+
+
+retry_stats = RetryStats()
+default_policy = RetryPolicy()
+
+_budget: ContextVar[Optional[RetryBudget]] = ContextVar("retry_budget", default=None)
+
+
+def configure(policy: RetryPolicy) -> None:
+    """Replace the default policy (called once with the values from Config)"""
+    global default_policy
+    default_policy = policy
+
+
+@contextmanager
+def retry_budget(retries: int) -> Iterator[RetryBudget]:
+    """Give the calls made inside the block a shared budget of `retries`"""
+    budget = RetryBudget(retries)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection errors, timeouts and 502/503/504 responses"""
+    if isinstance(error, (httpx.TransportError, AuthRetryableError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    if isinstance(error, APIError):
+        # Gateway errors aren't JSON: postgrest reports the HTTP status as code
+        return str(error.code) in {str(status) for status in RETRYABLE_STATUS}
+    return False
+
+
+def is_connect_error(error: Exception) -> bool:
+    """The request never reached the server: safe to retry even for inserts"""
+    return isinstance(error, httpx.ConnectError)
+
+
+def _may_retry(operation: str, retry: int, policy: RetryPolicy) -> bool:
+    if retry + 1 >= policy.max_attempts:
+        return False
+    budget = _budget.get()
+    if budget is not None and not budget.spend():
+        retry_stats.record(operation, "budget_exhausted")
+        return False
+    retry_stats.record(operation, "retries")
+    return True
+
+
+async def call_with_retry_async(
+    operation: Callable[[], T],
+    name: str,
+    policy: Optional[RetryPolicy] = None,
+    retryable: Callable[[Exception], bool] = is_retryable,
+) -> T:
+    """
+    Run a blocking operation in the threadpool with the retry policy, waiting
+    out the backoff with asyncio.sleep so no worker thread is held meanwhile.
+    """
+    policy = policy or default_policy
+    retry_stats.record(name, "calls")
+    retry = 0
+    while True:
+        try:
+            return await run_in_threadpool(operation)
+        except Exception as e:
+            if not retryable(e) or not _may_retry(name, retry, policy):
+                retry_stats.record(name, "failures")
+                raise
+        await asyncio.sleep(policy.delay(retry))
+        retry += 1
+
+
+def call_with_retry(
+    operation: Callable[[], T],
+    name: str,
+    policy: Optional[RetryPolicy] = None,
+    retryable: Callable[[Exception], bool] = is_retryable,
+) -> T:
+    """
+    Run a blocking operation with the retry policy in the current thread.
+    The backoff sleeps the thread: use it from service functions and
+    background jobs, never on the event loop (see call_with_retry_async).
+    """
+    policy = policy or default_policy
+    retry_stats.record(name, "calls")
+    retry = 0
+    while True:
+        try:
+            return operation()
+        except Exception as e:
+            if not retryable(e) or not _may_retry(name, retry, policy):
+                retry_stats.record(name, "failures")
+                raise
+        time.sleep(policy.delay(retry))
+        retry += 1
+
+
+def with_db_retry(
+    name: str,
+) -> Callable[[Callable[..., T]], Callable[..., Awaitable[T]]]:
+    """
+    Decorator for blocking route handlers that only read: the handler runs in
+    the threadpool through call_with_retry_async and is re-run as a whole on
+    a retryable error. FastAPI still sees the handler's own signature.
+    """
+
+    def decorator(handler: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(handler)
+        async def endpoint(*args: Any, **kwargs: Any) -> T:
+            return await call_with_retry_async(lambda: handler(*args, **kwargs), name)
+
+        return endpoint
+
+    return decorator
+
+
+def get_retry_stats() -> Dict[str, Any]:
+    """Counters per operation plus the active policy"""
+    return {
+        "policy": {
+            "max_attempts": default_policy.max_attempts,
+            "base_delay": default_policy.base_delay,
+            "max_delay": default_policy.max_delay,
+        },
+        "operations": retry_stats.snapshot(),
+    }
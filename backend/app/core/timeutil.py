@@ -0,0 +1,16 @@
+"""
+Timestamp helpers for the naive-UTC ISO strings stored in Supabase.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def epoch_seconds(timestamp: Optional[str]) -> Optional[float]:
+    """Seconds since epoch of a naive-UTC ISO timestamp (None if missing)"""
+    if not timestamp:
+        return None
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
@@ -0,0 +1,96 @@
+"""
+Prefix trie for autocomplete ranked by score.
+"""
+
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+
+def normalize_key(text: str) -> str:
+    """Lowercase and strip accents, so 'Inscripción' matches 'inscrip'"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.top: List[str] = []
+
+
+class PrefixTrie:
+    """
+    Every node keeps the ids of the `k` best-scored items below it, so a
+    lookup costs O(len(prefix) + limit) no matter how many items are stored.
+    Scores can only be raised in place (update_score); to remove items build
+    a new trie.
+    """
+
+    def __init__(self, k: int = 10) -> None:
+        self.k = k
+        self._root = _Node()
+        self._scores: Dict[str, float] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def insert(self, item_id: str, keys: Iterable[str], score: float = 0) -> None:
+        """Index an item under each of its keys (shortcut, title words, ...)"""
+        with self._lock:
+            self._scores[item_id] = score
+            self._keys[item_id] = [normalize_key(key) for key in keys if key]
+            for node in self._path_nodes(item_id, create=True):
+                self._offer(node, item_id)
+
+    def update_score(self, item_id: str, score: float) -> None:
+        """Raise an item's score and re-rank it in the nodes on its paths"""
+        with self._lock:
+            if item_id not in self._scores:
+                return
+            self._scores[item_id] = score
+            for node in self._path_nodes(item_id, create=False):
+                self._offer(node, item_id)
+
+    def search(self, prefix: str, limit: int = 10) -> List[str]:
+        """Ids of the best-scored items with a key starting with prefix"""
+        node = self._root
+        for char in normalize_key(prefix):
+            child = node.children.get(char)
+            if child is None:
+                return []
+            node = child
+        with self._lock:
+            return node.top[:limit]
+
+    def _path_nodes(self, item_id: str, create: bool) -> List[_Node]:
+        """Nodes of every prefix of the item's keys (each node once)"""
+        nodes: Dict[int, _Node] = {}
+        for key in self._keys[item_id]:
+            node = self._root
+            for char in key:
+                child = node.children.get(char)
+                if child is None:
+                    if not create:
+                        break
+                    child = node.children[char] = _Node()
+                node = child
+                nodes[id(node)] = node
+        return list(nodes.values())
+
+    def _offer(self, node: _Node, item_id: str) -> None:
+        top = node.top
+        if item_id not in top:
+            if len(top) >= self.k:
+                if self._rank(item_id) >= self._rank(top[-1]):
+                    return
+                top.pop()
+            top.append(item_id)
+        top.sort(key=self._rank)
+
+    def _rank(self, item_id: str) -> Tuple[float, str]:
+        return (-self._scores[item_id], item_id)
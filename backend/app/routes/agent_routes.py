@@ -3,20 +3,41 @@ Rutas para agentes de soporte.
 Maneja la gestión de solicitudes escaladas y conversaciones asignadas.
 """
 
-from typing import Any, Dict, List
+from datetime import date
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
+from app.core.retry import call_with_retry_async, get_retry_stats, with_db_retry
 from app.routes.auth import get_current_user
+from app.services import conversation_service
 from app.services.agent_service import (
     assign_request_to_agent,
     get_active_case,
+    get_active_cases,
     get_agent_requests,
     get_conversation_messages,
+    is_agent_assigned,
     resolve_request,
     send_agent_message,
+    set_agent_availability,
 )
+from app.services.agent_metrics_service import agent_metrics
+from app.services.canned_response_service import (
+    create_canned_response,
+    delete_canned_response,
+    list_canned_responses,
+    record_canned_response_use,
+    suggest_canned_responses,
+    update_canned_response,
+)
+from app.services.case_search_service import find_similar_cases, search_resolved_cases
+from app.services.email_outbox_service import get_outbox_status
+from app.services.export_service import iter_export_records, iter_ndjson
+from app.services.idempotency_service import idempotency_store
+from app.services.rating_analytics_service import DIMENSIONS, get_rating_stats
 
 router = APIRouter()
 
@@ -24,15 +45,28 @@ router = APIRouter()
 # --- Request/Response Models --- #
 class SendMessageRequest(BaseModel):
     content: str
+    # Respuesta predefinida usada para escribir el mensaje (cuenta un uso)
+    canned_response_id: Optional[str] = None
+
+
+class CannedResponseRequest(BaseModel):
+    title: str = Field(..., min_length=1, max_length=100)
+    content: str = Field(..., min_length=1)
+    shortcut: Optional[str] = Field(None, pattern=r"^/?[\w-]{1,30}$")
+
+
+class AvailabilityRequest(BaseModel):
+    accepting_cases: bool
+    max_cases: int = Field(1, ge=1, le=10)
 
 
 # --- Dependencias --- #
-def get_current_agent(user: Any = Depends(get_current_user)) -> Any:
+async def get_current_agent(user: Any = Depends(get_current_user)) -> Any:
     """Verificar que el usuario actual es un agente"""
-    from app.services.auth_services import get_user_info
+    from app.services.auth_services import get_user_role
 
-    user_info = get_user_info(user)
-    if user_info.get("role") != "agent":
+    role = await call_with_retry_async(lambda: get_user_role(user.id), "get user role")
+    if role != "agent":
         raise HTTPException(
             status_code=403, detail="Acceso denegado. Se requiere rol de agente."
         )
@@ -41,6 +75,7 @@ def get_current_agent(user: Any = Depends(get_current_user)) -> Any:
 
 # --- Rutas --- #
 @router.get("/requests")
+@with_db_retry("list agent requests")
 def get_requests(
     agent: Any = Depends(get_current_agent),
 ) -> Dict[str, List[Dict[str, Any]]]:
@@ -50,11 +85,29 @@ def get_requests(
     return {"requests": requests}
 
 
+@router.get("/active-cases")
+@with_db_retry("list active cases")
+def get_active_cases_endpoint(
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Obtener los casos activos del agente (sin historial de mensajes)"""
+    return {"cases": get_active_cases(agent.id)}
+
+
 @router.get("/active-case")
-def get_active_case_endpoint(agent: Any = Depends(get_current_agent)) -> Dict[str, Any]:
-    """Obtener el caso activo del agente (si tiene uno)"""
+@with_db_retry("get active case")
+def get_active_case_endpoint(
+    include_messages: bool = Query(True, description="Incluir el historial"),
+    request_id: Optional[str] = Query(
+        None, description="Caso a abrir (por defecto, el asignado hace más tiempo)"
+    ),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """Obtener un caso activo del agente (si tiene uno)"""
     agent_id = agent.id
-    active_case = get_active_case(agent_id)
+    active_case = get_active_case(
+        agent_id, include_messages=include_messages, request_id=request_id
+    )
 
     if not active_case:
         raise HTTPException(status_code=404, detail="No hay caso activo")
@@ -66,21 +119,53 @@ def get_active_case_endpoint(agent: Any = Depends(get_current_agent)) -> Dict[st
 def take_request(
     request_id: str, agent: Any = Depends(get_current_agent)
 ) -> Dict[str, str]:
-    """Tomar una solicitud pendiente (asignarla al agente)"""
+    """
+    Tomar una solicitud pendiente (asignarla al agente).
+    Responde 409 si otro agente la tomó primero o si el agente ya alcanzó su
+    límite de casos activos; el email al usuario queda en el outbox.
+    """
     agent_id = agent.id
 
-    # Verificar que el agente no tenga ya un caso activo
-    current_case = get_active_case(agent_id)
-    if current_case:
-        raise HTTPException(
-            status_code=400,
-            detail="Ya tienes un caso activo. Debes resolverlo antes de tomar otro.",
-        )
-
     assign_request_to_agent(request_id, agent_id)
     return {"message": "Solicitud asignada correctamente"}
 
 
+@router.put("/availability")
+def update_availability(
+    request: AvailabilityRequest, agent: Any = Depends(get_current_agent)
+) -> Dict[str, Any]:
+    """
+    Declarar si el agente acepta casos asignados automáticamente y cuántos
+    casos puede atender a la vez (también limita las tomas manuales)
+    """
+    return set_agent_availability(agent.id, request.accepting_cases, request.max_cases)
+
+
+@router.get("/requests/{request_id}/similar")
+@with_db_retry("find similar cases")
+def get_similar_cases(
+    request_id: str,
+    limit: int = Query(5, ge=1, le=20),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """Casos resueltos parecidos a una solicitud (según su resumen)"""
+    return {"results": find_similar_cases(request_id, limit=limit)}
+
+
+@router.get("/cases/search")
+@with_db_retry("search resolved cases")
+def search_cases(
+    q: str = Query(..., min_length=2, description="Texto a buscar"),
+    limit: int = Query(10, ge=1, le=50),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """
+    Buscar en los casos resueltos (resumen y mensajes), ordenados por
+    relevancia y con un fragmento resaltado de cada uno
+    """
+    return {"results": search_resolved_cases(q, limit=limit)}
+
+
 @router.post("/requests/{request_id}/resolve")
 def resolve_request_endpoint(
     request_id: str, agent: Any = Depends(get_current_agent)
@@ -92,12 +177,38 @@ def resolve_request_endpoint(
 
 
 @router.get("/conversations/{conversation_id}/messages")
+@with_db_retry("get agent conversation messages")
 def get_messages(
-    conversation_id: str, agent: Any = Depends(get_current_agent)
-) -> Dict[str, List[Dict[str, Any]]]:
-    """Obtener mensajes de una conversación"""
+    conversation_id: str,
+    after_timestamp: Optional[str] = Query(None, description="Cursor: timestamp"),
+    after_id: Optional[str] = Query(None, description="Cursor: id del mensaje"),
+    limit: int = Query(200, ge=1, le=500),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """
+    Obtener mensajes de una conversación.
+    Con un cursor (after_timestamp + after_id) solo devuelve los mensajes
+    posteriores, junto con el nuevo cursor.
+    """
+    if after_timestamp and after_id:
+        result = conversation_service.get_messages_since(
+            conversation_id, after_timestamp, after_id, limit
+        )
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail="Error obteniendo mensajes")
+        return {
+            "messages": result["messages"],
+            "cursor": result["cursor"],
+            "has_more": result["has_more"],
+        }
+
     messages = get_conversation_messages(conversation_id)
-    return {"messages": messages}
+    cursor = (
+        {"timestamp": messages[-1]["timestamp"], "id": messages[-1]["id"]}
+        if messages
+        else None
+    )
+    return {"messages": messages, "cursor": cursor}
 
 
 @router.post("/conversations/{conversation_id}/messages")
@@ -105,16 +216,143 @@ def send_message(
     conversation_id: str,
     request: SendMessageRequest,
     agent: Any = Depends(get_current_agent),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ) -> Dict[str, Any]:
     """Enviar un mensaje como agente en una conversación"""
-    agent_id = agent.id
+    return idempotency_store.run(
+        "agent.send_message",
+        agent.id,
+        idempotency_key,
+        {"conversation_id": conversation_id, **request.model_dump()},
+        lambda: _send_message(conversation_id, request, agent.id),
+    )
+
 
+def _send_message(
+    conversation_id: str, request: SendMessageRequest, agent_id: str
+) -> Dict[str, Any]:
     # Verificar que el agente tiene esta conversación asignada
-    active_case = get_active_case(agent_id)
-    if not active_case or active_case["conversation"]["id"] != conversation_id:
+    if not is_agent_assigned(agent_id, conversation_id):
         raise HTTPException(
             status_code=403, detail="No tienes acceso a esta conversación"
         )
 
     message = send_agent_message(conversation_id, request.content)
+    if request.canned_response_id:
+        record_canned_response_use(request.canned_response_id)
     return {"message": message}
+
+
+@router.get("/canned-responses")
+@with_db_retry("list canned responses")
+def get_canned_responses(agent: Any = Depends(get_current_agent)) -> Dict[str, Any]:
+    """Listar las respuestas predefinidas, las más usadas primero"""
+    return {"responses": list_canned_responses()}
+
+
+@router.get("/canned-responses/suggest")
+@with_db_retry("suggest canned responses")
+def suggest_responses(
+    prefix: str = Query(..., min_length=1, description="Texto escrito por el agente"),
+    limit: int = Query(5, ge=1, le=10),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """Autocompletar respuestas predefinidas por atajo o palabras del título"""
+    return {"suggestions": suggest_canned_responses(prefix, limit=limit)}
+
+
+@router.post("/canned-responses")
+def create_response(
+    request: CannedResponseRequest, agent: Any = Depends(get_current_agent)
+) -> Dict[str, Any]:
+    """Crear una respuesta predefinida"""
+    return create_canned_response(
+        request.title, request.content, _shortcut(request), agent.id
+    )
+
+
+@router.put("/canned-responses/{response_id}")
+def update_response(
+    response_id: str,
+    request: CannedResponseRequest,
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """Editar una respuesta predefinida"""
+    return update_canned_response(
+        response_id, request.title, request.content, _shortcut(request)
+    )
+
+
+@router.delete("/canned-responses/{response_id}")
+def delete_response(
+    response_id: str, agent: Any = Depends(get_current_agent)
+) -> Dict[str, str]:
+    """Eliminar una respuesta predefinida"""
+    delete_canned_response(response_id)
+    return {"message": "Respuesta eliminada correctamente"}
+
+
+def _shortcut(request: CannedResponseRequest) -> Optional[str]:
+    return request.shortcut.lstrip("/").lower() if request.shortcut else None
+
+
+@router.get("/export")
+def export_transcripts(
+    user_id: Optional[str] = Query(None, description="Filtrar por usuario"),
+    start: Optional[date] = Query(None, description="Creadas desde (inclusive)"),
+    end: Optional[date] = Query(None, description="Creadas hasta (exclusive)"),
+    escalated: Optional[bool] = Query(None, description="Filtrar por escalamiento"),
+    gzip: bool = Query(False, description="Comprimir la salida con gzip"),
+    agent: Any = Depends(get_current_agent),
+) -> StreamingResponse:
+    """Exportar conversaciones y mensajes como NDJSON (streaming)"""
+    records = iter_export_records(
+        user_id=user_id,
+        start=start.isoformat() if start else None,
+        end=end.isoformat() if end else None,
+        escalated=escalated,
+    )
+    filename = "transcripts.ndjson.gz" if gzip else "transcripts.ndjson"
+    return StreamingResponse(
+        iter_ndjson(records, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/metrics")
+def get_agent_metrics(agent: Any = Depends(get_current_agent)) -> Dict[str, Any]:
+    """
+    Métricas de SLA de la cola: profundidad, contadores y percentiles de
+    tiempo hasta asignación y hasta resolución (en segundos), más los
+    reintentos de llamadas a la base de datos por operación
+    """
+    return {**agent_metrics.snapshot(), "db_retries": get_retry_stats()}
+
+
+@router.get("/analytics/ratings")
+@with_db_retry("get rating stats")
+def get_ratings_analytics(
+    dimension: str = Query("kb_entry", description="'kb_entry' o 'response_type'"),
+    order_by: str = Query("down_count", pattern="^(down_count|up_count|down_ratio)$"),
+    limit: int = Query(50, ge=1, le=200),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """Obtener calificaciones agregadas por entrada de conocimiento o tipo de respuesta"""
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail="Dimensión no válida")
+
+    return {
+        "dimension": dimension,
+        "stats": get_rating_stats(dimension, order_by=order_by, limit=limit),
+    }
+
+
+@router.get("/email-outbox")
+@with_db_retry("get email outbox status")
+def get_email_outbox_status(
+    dead_limit: int = Query(20, ge=0, le=200),
+    agent: Any = Depends(get_current_agent),
+) -> Dict[str, Any]:
+    """Estado de entrega de los emails: conteo por estado y últimos fallidos"""
+    return get_outbox_status(dead_limit=dead_limit)
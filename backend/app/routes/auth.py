@@ -4,6 +4,7 @@ from fastapi import APIRouter, Cookie, Depends, HTTPException, Response
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 
+from app.core.retry import call_with_retry_async, with_db_retry
 from app.services.auth_services import (
     get_user_from_token,
     get_user_info,
@@ -35,12 +36,16 @@ class LoginRequest(BaseModel):
 
 
 # --- Dependencias --- #
-def get_current_user(access_token: Optional[str] = Cookie(default=None)) -> Any:
+async def get_current_user(
+    access_token: Optional[str] = Cookie(default=None),
+) -> Any:
     """Obtener usuario autenticado desde cookie"""
     if not access_token:
         raise HTTPException(status_code=401, detail="No token cookie found")
 
-    user = get_user_from_token(access_token)
+    user = await call_with_retry_async(
+        lambda: get_user_from_token(access_token), "auth get_user"
+    )
     return user
 
 
@@ -61,6 +66,7 @@ async def get_current_user_ws(token: Optional[str] = None) -> Any:
 
 # --- Routes --- #
 @router.get("/me", response_model=MeResponse)
+@with_db_retry("get current user info")
 def get_me(user: Any = Depends(get_current_user)) -> Dict[str, Any]:
     """Obtener información del usuario autenticado"""
     return {"message": "Usuario autenticado", "user": get_user_info(user)}
@@ -1,9 +1,10 @@
 from typing import Any, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
 from app.routes.auth import get_current_user
 from app.services.academic_chatbot_service import academic_chatbot
 from app.services import conversation_service
+from app.services.idempotency_service import idempotency_store
 
 router = APIRouter()
 
@@ -22,17 +23,30 @@ class InitialChatRequest(BaseModel):
 
 @router.post("/ask")
 def ask_chatbot(
-    req: ChatRequest, user: Any = Depends(get_current_user)
+    req: ChatRequest,
+    user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ) -> Dict[str, Any]:
     """
     Endpoint principal del chatbot académico.
     Integra DeepSeek + Supabase para responder consultas en español.
     Ahora con gestión automática de conversaciones y mensajes.
+    Retries with the same Idempotency-Key replay the first response.
     """
     user_id = user.id
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
+    return idempotency_store.run(
+        "chatbot.ask",
+        user_id,
+        idempotency_key,
+        req.model_dump(),
+        lambda: _ask_chatbot(req, user_id),
+    )
+
+
+def _ask_chatbot(req: ChatRequest, user_id: str) -> Dict[str, Any]:
     question = req.question.encode("utf-8", errors="ignore").decode("utf-8")
 
     # 1. Create or get conversation
@@ -45,22 +59,13 @@ def ask_chatbot(
         conversation_id = conv_result["conversation_id"]
     else:
         # Verify conversation belongs to user
-        conv = conversation_service.get_conversation(conversation_id, user_id)
-        if not conv:
+        if not conversation_service.user_owns_conversation(conversation_id, user_id):
             raise HTTPException(status_code=404, detail="Conversation not found")
 
     # 2. Check for escalation request
     is_escalation = conversation_service.detect_escalation_request(question)
 
     if is_escalation:
-        # Save user message
-        conversation_service.save_message(
-            conversation_id, "user", question, "escalation"
-        )
-
-        # Escalate conversation
-        conversation_service.escalate_conversation(conversation_id)
-
         # Generate escalation response
         escalation_response = (
             "Entiendo que necesitas hablar con un agente humano. "
@@ -69,146 +74,158 @@ def ask_chatbot(
             "Gracias por tu paciencia. 🤝"
         )
 
-        # Save assistant response
-        conversation_service.save_message(
-            conversation_id, "assistant", escalation_response, "escalation"
+        # Save user message and assistant response in one insert, before
+        # escalating: the agent's summary is built from the saved messages
+        conversation_service.save_messages(
+            conversation_id,
+            [
+                {"role": "user", "content": question, "response_type": "escalation"},
+                {
+                    "role": "assistant",
+                    "content": escalation_response,
+                    "response_type": "escalation",
+                },
+            ],
         )
 
+        # Escalate conversation
+        conversation_service.escalate_conversation(conversation_id)
+
         return {
             "answer": escalation_response,
             "conversation_id": conversation_id,
             "escalated": True,
         }
 
-    # 3. Save user message
-    user_msg_result = conversation_service.save_message(
-        conversation_id, "user", question, "academic_chatbot"
-    )
-
-    if not user_msg_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save user message")
-
-    # 4. Auto-generate title if needed (after 3rd user message)
-    conversation_service.auto_generate_title_if_needed(conversation_id)
-
-    # 5. Get chatbot response
+    # 3. Get chatbot response
     response = academic_chatbot(question)
     answer = response.get("answer", "")
 
-    # 6. Save assistant response
-    assistant_msg_result = conversation_service.save_message(
-        conversation_id, "assistant", answer, "academic_chatbot"
+    # 4. Save user message and assistant response in one insert
+    save_result = conversation_service.save_messages(
+        conversation_id,
+        [
+            {"role": "user", "content": question, "response_type": "academic_chatbot"},
+            {
+                "role": "assistant",
+                "content": answer,
+                "response_type": "academic_chatbot",
+                "kb_sources": response.get("kb_sources"),
+            },
+        ],
     )
 
-    if not assistant_msg_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save assistant message")
+    if not save_result.get("success"):
+        raise HTTPException(status_code=500, detail="Failed to save messages")
+
+    user_message, assistant_message = save_result["messages"]
 
-    # 7. Return response with conversation_id and message_ids
+    # 5. Auto-generate title if needed (after 3rd user message)
+    conversation_service.auto_generate_title_if_needed(conversation_id)
+
+    # 6. Return response with conversation_id and message_ids
     return {
         "answer": answer,
         "conversation_id": conversation_id,
-        "user_message_id": user_msg_result.get("message_id"),
-        "assistant_message_id": assistant_msg_result.get("message_id"),
+        "user_message_id": user_message["id"],
+        "assistant_message_id": assistant_message["id"],
         "escalated": False,
     }
 
 
 @router.post("/start")
 def start_conversation(
-    req: InitialChatRequest, user: Any = Depends(get_current_user)
+    req: InitialChatRequest,
+    user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ) -> Dict[str, Any]:
     """
     Start a new conversation with welcome message and initial user message.
-    This endpoint creates a conversation and stores:
+    This endpoint creates a conversation and stores, in a single insert:
     1. Welcome message (assistant)
     2. User's first message
     3. AI response to user's message
+    Retries with the same Idempotency-Key replay the first response.
     """
     user_id = user.id
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
+    return idempotency_store.run(
+        "chatbot.start",
+        user_id,
+        idempotency_key,
+        req.model_dump(),
+        lambda: _start_conversation(req, user_id),
+    )
+
+
+def _start_conversation(req: InitialChatRequest, user_id: str) -> Dict[str, Any]:
     # 1. Create new conversation
     conv_result = conversation_service.create_conversation(user_id)
     if not conv_result.get("success"):
         raise HTTPException(status_code=500, detail="Failed to create conversation")
     conversation_id = conv_result["conversation_id"]
 
-    # 2. Save welcome message (assistant)
-    welcome_result = conversation_service.save_message(
-        conversation_id, "assistant", req.welcome_message, "greeting"
-    )
-    if not welcome_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save welcome message")
-
-    # 3. Save user's initial message
-    user_msg_result = conversation_service.save_message(
-        conversation_id, "user", req.initial_message, "academic_chatbot"
-    )
-    if not user_msg_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save user message")
-
-    # 4. Check for escalation in initial message
+    # 2. Check for escalation in initial message
     is_escalation = conversation_service.detect_escalation_request(req.initial_message)
 
     if is_escalation:
-        # Escalate conversation
-        conversation_service.escalate_conversation(conversation_id)
-
         # Generate escalation response
-        escalation_response = (
+        answer = (
             "Entiendo que necesitas hablar con un agente humano. "
             "Te estoy conectando con nuestro equipo de soporte. "
             "Un agente se pondrá en contacto contigo en breve. "
             "Gracias por tu paciencia. 🤝"
         )
-
-        # Save assistant escalation response
-        assistant_msg_result = conversation_service.save_message(
-            conversation_id, "assistant", escalation_response, "escalation"
-        )
-
-        # Get all messages
-        messages = conversation_service.get_conversation_messages(conversation_id)
-
-        return {
-            "success": True,
-            "data": {
-                "conversation": {
-                    "id": conversation_id,
-                    "created_at": conv_result["created_at"],
-                    "is_escalated": True,
-                },
-                "messages": messages,
+        response_type = "escalation"
+        kb_sources = None
+    else:
+        # Generate AI response to user's initial message
+        response = academic_chatbot(req.initial_message)
+        answer = response.get("answer", "")
+        response_type = "academic_chatbot"
+        kb_sources = response.get("kb_sources")
+
+    # 3. Save welcome, user and assistant messages in one insert.
+    # No title check is needed here: titles are generated after the 3rd user message.
+    save_result = conversation_service.save_messages(
+        conversation_id,
+        [
+            {
+                "role": "assistant",
+                "content": req.welcome_message,
+                "response_type": "greeting",
             },
-        }
-
-    # 5. Generate AI response to user's initial message
-    response = academic_chatbot(req.initial_message)
-    answer = response.get("answer", "")
-
-    # 6. Save assistant response
-    assistant_msg_result = conversation_service.save_message(
-        conversation_id, "assistant", answer, "academic_chatbot"
+            {
+                "role": "user",
+                "content": req.initial_message,
+                "response_type": "academic_chatbot",
+            },
+            {
+                "role": "assistant",
+                "content": answer,
+                "response_type": response_type,
+                "kb_sources": kb_sources,
+            },
+        ],
     )
-    if not assistant_msg_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save assistant message")
-
-    # 7. Auto-generate title if this qualifies as 1st user message
-    conversation_service.auto_generate_title_if_needed(conversation_id)
+    if not save_result.get("success"):
+        raise HTTPException(status_code=500, detail="Failed to save messages")
 
-    # 8. Get all messages to return
-    messages = conversation_service.get_conversation_messages(conversation_id)
+    # 4. Escalate once the messages are saved: the agent's summary reads them
+    if is_escalation:
+        conversation_service.escalate_conversation(conversation_id)
 
-    # 9. Return complete conversation data
+    # 5. Return complete conversation data (inserted rows, no re-read)
     return {
         "success": True,
         "data": {
             "conversation": {
                 "id": conversation_id,
                 "created_at": conv_result["created_at"],
-                "is_escalated": False,
+                "is_escalated": is_escalation,
             },
-            "messages": messages,
+            "messages": save_result["messages"],
         },
     }
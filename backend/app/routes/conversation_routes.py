@@ -1,8 +1,13 @@
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from app.core.retry import with_db_retry
 from app.routes.auth import get_current_user
 from app.services import conversation_service
+from app.services.cloudinary_service import cloudinary_service
+from app.services.idempotency_service import idempotency_store
 
 router = APIRouter()
 
@@ -30,6 +35,11 @@ class UpdateTitleRequest(BaseModel):
     title: str
 
 
+class BulkDeleteRequest(BaseModel):
+    conversation_ids: Optional[List[str]] = Field(default=None, max_length=500)
+    older_than: Optional[datetime] = None
+
+
 @router.post("/conversations", response_model=CreateConversationResponse)
 def create_conversation(user: Any = Depends(get_current_user)) -> Dict[str, Any]:
     """
@@ -53,6 +63,7 @@ def create_conversation(user: Any = Depends(get_current_user)) -> Dict[str, Any]
 
 
 @router.get("/conversations")
+@with_db_retry("list user conversations")
 def get_user_conversations(user: Any = Depends(get_current_user)) -> Dict[str, Any]:
     """
     Get all conversations for the authenticated user.
@@ -66,7 +77,39 @@ def get_user_conversations(user: Any = Depends(get_current_user)) -> Dict[str, A
     return {"conversations": conversations, "count": len(conversations)}
 
 
+@router.get("/conversations/search")
+@with_db_retry("search conversations")
+def search_conversations(
+    q: str = Query(..., min_length=2, max_length=200, description="Search terms"),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0),
+    user: Any = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    Search the authenticated user's messages and return matching conversations,
+    ranked by relevance with a highlighted snippet.
+    """
+    user_id = user.id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    result = conversation_service.search_conversations(
+        user_id, q.strip(), limit=limit, offset=offset
+    )
+
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail="Failed to search conversations")
+
+    return {
+        "results": result["results"],
+        "total": result["total"],
+        "limit": limit,
+        "offset": offset,
+    }
+
+
 @router.get("/conversations/{conversation_id}")
+@with_db_retry("get conversation")
 def get_conversation(
     conversation_id: str, user: Any = Depends(get_current_user)
 ) -> Dict[str, Any]:
@@ -88,23 +131,94 @@ def get_conversation(
     return {"conversation": conversation, "messages": messages}
 
 
+@router.get("/conversations/{conversation_id}/messages")
+@with_db_retry("get messages since cursor")
+def get_messages_since(
+    conversation_id: str,
+    after_timestamp: Optional[str] = Query(None, description="Cursor timestamp"),
+    after_id: Optional[str] = Query(None, description="Cursor message id"),
+    limit: int = Query(200, ge=1, le=500),
+    user: Any = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    Get the messages after a (timestamp, id) cursor. Clients keep the returned
+    cursor and send it back to fetch only new messages.
+    """
+    user_id = user.id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    if not conversation_service.user_owns_conversation(conversation_id, user_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    result = conversation_service.get_messages_since(
+        conversation_id, after_timestamp, after_id, limit
+    )
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail="Failed to fetch messages")
+
+    return {
+        "messages": result["messages"],
+        "cursor": result["cursor"],
+        "has_more": result["has_more"],
+    }
+
+
+@router.get("/conversations/{conversation_id}/snapshot")
+@with_db_retry("get conversation snapshot")
+def get_conversation_snapshot(
+    conversation_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    user: Any = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    Get a conversation, a page of its messages, its escalation status and the
+    assigned agent's name in a single call (used when opening a chat).
+    """
+    user_id = user.id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    snapshot = conversation_service.get_conversation_snapshot(
+        conversation_id, user_id, message_limit=limit
+    )
+
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return snapshot
+
+
 @router.post("/conversations/{conversation_id}/messages")
 def add_message(
     conversation_id: str,
     req: MessageRequest,
     user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ) -> Dict[str, Any]:
     """
     Add a new message to a conversation.
     Automatically generates title after 3rd user message.
+    Retries with the same Idempotency-Key replay the first response.
     """
     user_id = user.id
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
+    return idempotency_store.run(
+        "conversations.add_message",
+        user_id,
+        idempotency_key,
+        {"conversation_id": conversation_id, **req.model_dump()},
+        lambda: _add_message(conversation_id, req, user_id),
+    )
+
+
+def _add_message(
+    conversation_id: str, req: MessageRequest, user_id: str
+) -> Dict[str, Any]:
     # Verify conversation belongs to user
-    conversation = conversation_service.get_conversation(conversation_id, user_id)
-    if not conversation:
+    if not conversation_service.user_owns_conversation(conversation_id, user_id):
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Validate role
@@ -146,22 +260,22 @@ def escalate_conversation(
         raise HTTPException(status_code=401, detail="User not authenticated")
 
     # Verify conversation belongs to user
-    conversation = conversation_service.get_conversation(conversation_id, user_id)
-    if not conversation:
+    if not conversation_service.user_owns_conversation(conversation_id, user_id):
         raise HTTPException(status_code=404, detail="Conversation not found")
 
+    # If there's a message, save it as an escalation message first, so the
+    # agent's summary (scheduled by the escalation) includes it
+    if req.message:
+        conversation_service.save_message(
+            conversation_id, "user", req.message, "escalation"
+        )
+
     # Escalate conversation
     success = conversation_service.escalate_conversation(conversation_id)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to escalate conversation")
 
-    # If there's a message, save it as an escalation message
-    if req.message:
-        conversation_service.save_message(
-            conversation_id, "user", req.message, "escalation"
-        )
-
     return {
         "success": True,
         "message": "Conversation escalated successfully. A support agent will assist you shortly.",
@@ -182,8 +296,7 @@ def update_conversation_title(
         raise HTTPException(status_code=401, detail="User not authenticated")
 
     # Verify conversation belongs to user
-    conversation = conversation_service.get_conversation(conversation_id, user_id)
-    if not conversation:
+    if not conversation_service.user_owns_conversation(conversation_id, user_id):
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Validate title
@@ -236,6 +349,7 @@ def rate_message(
 
 
 @router.get("/conversations/{conversation_id}/escalation-status")
+@with_db_retry("get escalation status")
 def get_escalation_status(
     conversation_id: str, user: Any = Depends(get_current_user)
 ) -> Dict[str, Any]:
@@ -247,54 +361,15 @@ def get_escalation_status(
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    # Verify conversation belongs to user (or user is agent)
-    conversation = conversation_service.get_conversation(conversation_id, user_id)
-    if not conversation:
+    # Verify conversation belongs to user and load its agent_request in one query
+    escalation_data = conversation_service.get_escalation_status(
+        conversation_id, user_id
+    )
+    if escalation_data is None:
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
 
-    # Get agent_request if exists
-    from app.core.config import supabase_
-
-    agent_request_response = (
-        supabase_.table("agent_requests")
-        .select("id, status, assigned_at, resolved_at, agent_id")
-        .eq("conversation_id", conversation_id)
-        .execute()
-    )
-
-    escalation_data = {
-        "is_escalated": conversation.get("is_escalated", False),
-        "escalated_at": conversation.get("escalated_at"),
-        "resolved": conversation.get("resolved", False),
-        "resolved_at": conversation.get("resolved_at"),
-        "agent_request": None,
-    }
-
-    if agent_request_response.data and len(agent_request_response.data) > 0:
-        agent_req = agent_request_response.data[0]
-
-        # Get agent name if agent_id exists
-        agent_name = None
-        if agent_req.get("agent_id"):
-            agent_profile = (
-                supabase_.table("profiles")
-                .select("full_name")
-                .eq("id", agent_req["agent_id"])
-                .execute()
-            )
-            if agent_profile.data and len(agent_profile.data) > 0:
-                agent_name = agent_profile.data[0].get("full_name")
-
-        escalation_data["agent_request"] = {
-            "id": agent_req["id"],
-            "status": agent_req["status"],
-            "assigned_at": agent_req.get("assigned_at"),
-            "resolved_at": agent_req.get("resolved_at"),
-            "agent_name": agent_name,
-        }
-
     return escalation_data
 
 
@@ -311,8 +386,7 @@ def delete_conversation(
         raise HTTPException(status_code=401, detail="User not authenticated")
 
     # Verify conversation belongs to user
-    conversation = conversation_service.get_conversation(conversation_id, user_id)
-    if not conversation:
+    if not conversation_service.user_owns_conversation(conversation_id, user_id):
         raise HTTPException(
             status_code=404, detail="Conversation not found or access denied"
         )
@@ -324,3 +398,49 @@ def delete_conversation(
         raise HTTPException(status_code=500, detail="Failed to delete conversation")
 
     return {"success": True, "message": "Conversation deleted successfully"}
+
+
+@router.post("/conversations/bulk-delete")
+async def bulk_delete_conversations(
+    req: BulkDeleteRequest, user: Any = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    Delete several conversations of the authenticated user at once, either by
+    id or every conversation whose last message is older than a date.
+    Images attached to their messages are removed from Cloudinary.
+    """
+    user_id = user.id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    if req.conversation_ids is None and req.older_than is None:
+        raise HTTPException(
+            status_code=400, detail="Provide conversation_ids or older_than"
+        )
+
+    older_than: Optional[str] = None
+    if req.older_than:
+        # Stored timestamps are naive UTC
+        cutoff = req.older_than
+        if cutoff.tzinfo:
+            cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+        older_than = cutoff.isoformat()
+
+    result = await run_in_threadpool(
+        conversation_service.delete_conversations,
+        user_id,
+        req.conversation_ids,
+        older_than,
+    )
+
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail="Failed to delete conversations")
+
+    if result["image_urls"]:
+        await cloudinary_service.delete_images(result["image_urls"])
+
+    return {
+        "success": True,
+        "deleted_ids": result["deleted_ids"],
+        "deleted_count": len(result["deleted_ids"]),
+    }
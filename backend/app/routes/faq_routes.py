@@ -1,14 +1,16 @@
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
 
+from app.core.retry import with_db_retry
 from app.routes.auth import get_current_user
 from app.services.faq_services import (
     get_answer_by_question_id,
     get_questions_from_db,
 )
 from app.services import conversation_service
+from app.services.idempotency_service import idempotency_store
 
 router = APIRouter()
 
@@ -24,6 +26,7 @@ class QuestionsListResponse(BaseModel):
 
 
 @router.get("/list-questions", response_model=QuestionsListResponse)
+@with_db_retry("list faq questions")
 def list_questions(
     user: Any = Depends(get_current_user),
 ) -> Dict[str, List[QuestionResponse]]:
@@ -45,16 +48,30 @@ class FAQRequest(BaseModel):
 # New endpoint with conversation tracking
 @router.post("/get_answer/{question_id}")
 def get_answer(
-    question_id: int, req: FAQRequest, user: Any = Depends(get_current_user)
+    question_id: int,
+    req: FAQRequest,
+    user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ) -> Dict[str, Any]:
     """
     Endpoint para obtener la respuesta a una pregunta frecuente por su ID.
     Ahora con tracking de conversación automático.
+    Los reintentos con el mismo Idempotency-Key repiten la primera respuesta.
     """
     user_id = user.id
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
+    return idempotency_store.run(
+        "faq.get_answer",
+        user_id,
+        idempotency_key,
+        {"question_id": question_id, **req.model_dump()},
+        lambda: _get_answer(question_id, req, user_id),
+    )
+
+
+def _get_answer(question_id: int, req: FAQRequest, user_id: str) -> Dict[str, Any]:
     # Get the question text first
     questions = get_questions_from_db()
     question_text = None
@@ -76,36 +93,34 @@ def get_answer(
         conversation_id = conv_result["conversation_id"]
     else:
         # Verify conversation belongs to user
-        conv = conversation_service.get_conversation(conversation_id, user_id)
-        if not conv:
+        if not conversation_service.user_owns_conversation(conversation_id, user_id):
             raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # 2. Save user's question (the FAQ selection)
-    user_msg_result = conversation_service.save_message(
-        conversation_id, "user", question_text, "faq"
-    )
-    if not user_msg_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save user message")
-
-    # 3. Get the FAQ answer
+    # 2. Get the FAQ answer
     answer = get_answer_by_question_id(question_id)
     if answer is None:
         raise HTTPException(status_code=404, detail="Pregunta no encontrada")
 
-    # 4. Save assistant's answer
-    assistant_msg_result = conversation_service.save_message(
-        conversation_id, "assistant", answer, "faq"
+    # 3. Save user's question (the FAQ selection) and the answer in one insert
+    save_result = conversation_service.save_messages(
+        conversation_id,
+        [
+            {"role": "user", "content": question_text, "response_type": "faq"},
+            {"role": "assistant", "content": answer, "response_type": "faq"},
+        ],
     )
-    if not assistant_msg_result.get("success"):
-        raise HTTPException(status_code=500, detail="Failed to save assistant message")
+    if not save_result.get("success"):
+        raise HTTPException(status_code=500, detail="Failed to save messages")
+
+    user_message, assistant_message = save_result["messages"]
 
-    # 5. Auto-generate title if needed
+    # 4. Auto-generate title if needed
     conversation_service.auto_generate_title_if_needed(conversation_id)
 
-    # 6. Return response with conversation tracking
+    # 5. Return response with conversation tracking
     return {
         "answer": answer,
         "conversation_id": conversation_id,
-        "user_message_id": user_msg_result.get("message_id"),
-        "assistant_message_id": assistant_msg_result.get("message_id"),
+        "user_message_id": user_message["id"],
+        "assistant_message_id": assistant_message["id"],
     }
@@ -2,13 +2,19 @@
 Router para manejo de mensajes con imágenes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, Header, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional, Any, Dict
 import uuid
 from datetime import datetime
 from app.core.config import get_supabase
+from app.core.retry import call_with_retry_async, is_connect_error
 from app.routes.auth import get_current_user
+from app.services.agent_service import is_agent_assigned
+from app.services.auth_services import get_user_role
+from app.services import conversation_service
 from app.services.cloudinary_service import cloudinary_service
+from app.services.idempotency_service import idempotency_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +28,7 @@ async def send_message_with_image(
     image: UploadFile = File(...),
     content: Optional[str] = Form(None),
     user: Any = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ) -> Dict[str, Any]:
     """
     Envía un mensaje con imagen adjunta
@@ -30,41 +37,43 @@ async def send_message_with_image(
         conversation_id: ID de la conversación
         image: Archivo de imagen (multipart/form-data)
         content: Texto opcional que acompaña la imagen
+        idempotency_key: Los reintentos con la misma clave repiten la primera respuesta
 
     Returns:
         dict: Información del mensaje creado
     """
+    return await idempotency_store.run_async(
+        "messages.send_with_image",
+        user.id,
+        idempotency_key,
+        {
+            "conversation_id": conversation_id,
+            "content": content,
+            "filename": image.filename,
+            "size": image.size,
+        },
+        lambda: _send_message_with_image(conversation_id, image, content, user),
+    )
+
+
+async def _send_message_with_image(
+    conversation_id: str, image: UploadFile, content: Optional[str], user: Any
+) -> Dict[str, Any]:
     try:
         supabase = get_supabase()
 
         # 1. Validar que la conversación existe y pertenece al usuario
-        conversation_response = (
-            supabase.table("conversations")
-            .select("*")
-            .eq("id", conversation_id)
-            .execute()
+        conversation = await run_in_threadpool(
+            conversation_service.get_conversation_access, conversation_id
         )
 
-        if not conversation_response.data:
+        if not conversation:
             raise HTTPException(status_code=404, detail="Conversación no encontrada")
 
-        conversation = conversation_response.data[0]
-
         # Verificar que el usuario es dueño de la conversación o es un agente asignado
         if conversation["user_id"] != user.id:
             # Verificar si es agente asignado
-            agent_request_response = (
-                supabase.table("agent_requests")
-                .select("agent_id")
-                .eq("conversation_id", conversation_id)
-                .eq("status", "in_progress")
-                .execute()
-            )
-
-            if (
-                not agent_request_response.data
-                or agent_request_response.data[0]["agent_id"] != user.id
-            ):
+            if not await run_in_threadpool(is_agent_assigned, user.id, conversation_id):
                 raise HTTPException(
                     status_code=403,
                     detail="No autorizado para enviar mensajes en esta conversación",
@@ -77,14 +86,8 @@ async def send_message_with_image(
         )
 
         # 3. Determinar rol del mensaje
-        profile_response = (
-            supabase.table("profiles").select("role").eq("id", user.id).execute()
-        )
-        role = (
-            "assistant"
-            if profile_response.data and profile_response.data[0]["role"] == "agent"
-            else "user"
-        )
+        user_role = await run_in_threadpool(get_user_role, user.id)
+        role = "assistant" if user_role == "agent" else "user"
 
         # 4. Crear mensaje en la base de datos
         message_id = str(uuid.uuid4())
@@ -98,7 +101,11 @@ async def send_message_with_image(
             "timestamp": datetime.utcnow().isoformat(),
         }
 
-        result = supabase.table("messages").insert(message_data).execute()
+        result = await call_with_retry_async(
+            lambda: supabase.table("messages").insert(message_data).execute(),
+            "insert message with image",
+            retryable=is_connect_error,
+        )
 
         if not result.data:
             # Si falla la inserción, intentar eliminar imagen de Cloudinary
@@ -106,9 +113,13 @@ async def send_message_with_image(
             raise HTTPException(status_code=500, detail="Error al guardar mensaje")
 
         # 5. Actualizar last_message_at en la conversación
-        supabase.table("conversations").update(
-            {"last_message_at": datetime.utcnow().isoformat()}
-        ).eq("id", conversation_id).execute()
+        await call_with_retry_async(
+            lambda: supabase.table("conversations")
+            .update({"last_message_at": datetime.utcnow().isoformat()})
+            .eq("id", conversation_id)
+            .execute(),
+            "update conversation last_message_at",
+        )
 
         logger.info(f"Mensaje con imagen creado exitosamente: {message_id}")
 
@@ -134,8 +145,12 @@ async def delete_message_image(
         supabase = get_supabase()
 
         # 1. Obtener mensaje
-        message_response = (
-            supabase.table("messages").select("*").eq("id", message_id).execute()
+        message_response = await call_with_retry_async(
+            lambda: supabase.table("messages")
+            .select("*")
+            .eq("id", message_id)
+            .execute(),
+            "get message",
         )
 
         if not message_response.data:
@@ -144,11 +159,12 @@ async def delete_message_image(
         message = message_response.data[0]
 
         # 2. Verificar permisos (debe ser el autor del mensaje)
-        conversation_response = (
-            supabase.table("conversations")
+        conversation_response = await call_with_retry_async(
+            lambda: supabase.table("conversations")
             .select("user_id")
             .eq("id", message["conversation_id"])
-            .execute()
+            .execute(),
+            "get conversation owner",
         )
 
         if (
@@ -156,12 +172,7 @@ async def delete_message_image(
             or conversation_response.data[0]["user_id"] != user.id
         ):
             # Verificar si es agente
-            profile_response = (
-                supabase.table("profiles").select("role").eq("id", user.id).execute()
-            )
-            if not (
-                profile_response.data and profile_response.data[0]["role"] == "agent"
-            ):
+            if await run_in_threadpool(get_user_role, user.id) != "agent":
                 raise HTTPException(status_code=403, detail="No autorizado")
 
         # 3. Eliminar imagen de Cloudinary
@@ -169,9 +180,13 @@ async def delete_message_image(
             await cloudinary_service.delete_image(message["image_url"])
 
         # 4. Actualizar mensaje en BD (remover image_url)
-        supabase.table("messages").update(
-            {"image_url": None, "response_type": "text"}
-        ).eq("id", message_id).execute()
+        await call_with_retry_async(
+            lambda: supabase.table("messages")
+            .update({"image_url": None, "response_type": "text"})
+            .eq("id", message_id)
+            .execute(),
+            "remove message image",
+        )
 
         return {"success": True, "message": "Imagen eliminada"}
 
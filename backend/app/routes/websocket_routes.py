@@ -3,95 +3,72 @@ WebSocket routes for real-time chat when conversations are escalated
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, Optional, Set
 import json
-from datetime import datetime, timezone
 
-from app.core.config import supabase_
+from app.services import conversation_service
+from app.services.agent_queue_service import AGENT_QUEUE_ROOM, agent_queue
+from app.services.agent_service import is_agent_assigned
+from app.services.auth_services import get_user_from_token, get_user_role
+from app.services.realtime_service import manager
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
-
-def get_utc_timestamp() -> str:
-    """
-    Obtener timestamp UTC en formato compatible con Supabase.
-    Supabase espera formato ISO sin timezone explícito (naive UTC).
-    """
-    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+# Missed messages sent on reconnect; older gaps are fetched over HTTP
+RESYNC_LIMIT = 500
 
 
 # Store active connections: conversation_id -> Set[WebSocket]
 active_connections: Dict[str, Set[WebSocket]] = {}
 
 
-class ConnectionManager:
-    """Manage WebSocket connections for escalated conversations"""
-
-    def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, conversation_id: str):
-        """Add a new WebSocket connection to a conversation room"""
-        await websocket.accept()
-
-        if conversation_id not in self.active_connections:
-            self.active_connections[conversation_id] = set()
-
-        self.active_connections[conversation_id].add(websocket)
-        print(f"✅ WebSocket connected to conversation {conversation_id[:8]}...")
-
-    def disconnect(self, websocket: WebSocket, conversation_id: str):
-        """Remove a WebSocket connection from a conversation room"""
-        if conversation_id in self.active_connections:
-            self.active_connections[conversation_id].discard(websocket)
-
-            # Remove empty conversation rooms
-            if not self.active_connections[conversation_id]:
-                del self.active_connections[conversation_id]
-
-        print(f"❌ WebSocket disconnected from conversation {conversation_id[:8]}...")
-
-    async def broadcast_to_conversation(
-        self, conversation_id: str, message: dict, exclude: WebSocket = None
-    ):
-        """Broadcast a message to all connections in a conversation room"""
-        if conversation_id not in self.active_connections:
-            return
-
-        # Create a copy to avoid modification during iteration
-        connections = self.active_connections[conversation_id].copy()
-
-        for connection in connections:
-            if connection != exclude:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"⚠️ Error sending message to WebSocket: {e}")
-                    # Remove dead connections
-                    self.disconnect(connection, conversation_id)
-
-
-manager = ConnectionManager()
-
-
 @router.websocket("/chat/{conversation_id}")
 async def websocket_chat(
     websocket: WebSocket,
     conversation_id: str,
-):
+    after_timestamp: Optional[str] = None,
+    after_id: Optional[str] = None,
+) -> None:
     """
     WebSocket endpoint for real-time chat in escalated conversations.
 
     Both users and agents connect to the same conversation_id.
     Messages are broadcasted to all connected clients in that conversation.
+    Escalation status changes are pushed as {"type": "escalation_status"}.
+
+    Reconnecting clients pass their last (timestamp, id) cursor as
+    ?after_timestamp=...&after_id=... and first receive the messages they
+    missed as {"type": "resync", "messages", "cursor", "has_more"}.
+
+    Requires the same session cookie as the HTTP API: only the owner of the
+    conversation and the agent assigned to it can join the room.
     """
-    # Note: Authentication is tricky with WebSockets
-    # For now, we rely on the conversation_id being hard to guess (UUID)
-    # In production, you should validate the token sent in the connection
+    user = await _authenticate_user(websocket)
+    if not user or not await _can_join_conversation(user.id, conversation_id):
+        await websocket.close(code=1008)
+        return
 
     await manager.connect(websocket, conversation_id)
 
     try:
+        if after_timestamp and after_id:
+            missed = await run_in_threadpool(
+                conversation_service.get_messages_since,
+                conversation_id,
+                after_timestamp,
+                after_id,
+                RESYNC_LIMIT,
+            )
+            await websocket.send_json(
+                {
+                    "type": "resync",
+                    "messages": missed["messages"],
+                    "cursor": missed["cursor"],
+                    "has_more": missed["has_more"],
+                }
+            )
+
         while True:
             # Receive message from client
             data = await websocket.receive_text()
@@ -113,24 +90,21 @@ async def websocket_chat(
                 content = message_data["content"]
                 user_id = message_data.get("user_id")
 
-                # Save message to database
+                # Save message to database (or the write-behind journal)
                 try:
-                    result = (
-                        supabase_.table("messages")
-                        .insert(
-                            {
-                                "conversation_id": conversation_id,
-                                "role": role,
-                                "content": content,
-                                "response_type": "live_chat",
-                                "timestamp": get_utc_timestamp(),
-                            }
-                        )
-                        .execute()
+                    result = await run_in_threadpool(
+                        conversation_service.save_message,
+                        conversation_id,
+                        role,
+                        content,
+                        "live_chat",
                     )
 
-                    if result.data and len(result.data) > 0:
-                        saved_message = result.data[0]
+                    if result.get("success"):
+                        saved_message = {
+                            "id": result["message_id"],
+                            "timestamp": result["timestamp"],
+                        }
 
                         # Broadcast to all connected clients (except sender)
                         broadcast_data = {
@@ -152,6 +126,7 @@ async def websocket_chat(
                             {
                                 "type": "message_sent",
                                 "message_id": saved_message["id"],
+                                "timestamp": saved_message["timestamp"],
                             }
                         )
 
@@ -178,3 +153,80 @@ async def websocket_chat(
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
         manager.disconnect(websocket, conversation_id)
+
+
+async def _authenticate_user(websocket: WebSocket) -> Optional[Any]:
+    """Return the user behind the session cookie, or None"""
+    token = websocket.cookies.get("access_token")
+    if not token:
+        return None
+
+    try:
+        return await run_in_threadpool(get_user_from_token, token)
+    except Exception:
+        return None
+
+
+async def _authenticate_agent(websocket: WebSocket) -> Optional[Any]:
+    """Return the agent behind the session cookie, or None"""
+    user = await _authenticate_user(websocket)
+    if not user:
+        return None
+
+    try:
+        role = await run_in_threadpool(get_user_role, user.id)
+    except Exception:
+        return None
+
+    return user if role == "agent" else None
+
+
+async def _can_join_conversation(user_id: str, conversation_id: str) -> bool:
+    """The owner of the conversation or the agent assigned to it"""
+    try:
+        if await run_in_threadpool(
+            conversation_service.user_owns_conversation, conversation_id, user_id
+        ):
+            return True
+        return await run_in_threadpool(is_agent_assigned, user_id, conversation_id)
+    except Exception as e:
+        print(f"❌ Error checking access to conversation {conversation_id[:8]}: {e}")
+        return False
+
+
+@router.websocket("/agent/queue")
+async def websocket_agent_queue(websocket: WebSocket) -> None:
+    """
+    WebSocket endpoint with the live queue of pending requests for agents.
+
+    On connect the agent receives {"type": "snapshot", "requests": [...]}
+    (oldest / highest priority first); afterwards only deltas are pushed:
+    request_added, request_taken and request_resolved.
+    Requires the same session cookie as the HTTP API.
+    """
+    agent = await _authenticate_agent(websocket)
+    if not agent:
+        await websocket.close(code=1008)
+        return
+
+    connections = agent_queue.connections
+    await connections.connect(websocket, AGENT_QUEUE_ROOM)
+
+    try:
+        # Reload first: requests may have been escalated through other workers
+        try:
+            requests = await run_in_threadpool(agent_queue.refresh)
+        except Exception as e:
+            print(f"⚠️ Could not reload the agent queue, sending local copy: {e}")
+            requests = agent_queue.snapshot()
+        await websocket.send_json({"type": "snapshot", "requests": requests})
+
+        # Nothing is expected from the client; keep reading to detect disconnects
+        while True:
+            await websocket.receive_text()
+
+    except WebSocketDisconnect:
+        connections.disconnect(websocket, AGENT_QUEUE_ROOM)
+    except Exception as e:
+        print(f"❌ Agent queue WebSocket error: {e}")
+        connections.disconnect(websocket, AGENT_QUEUE_ROOM)
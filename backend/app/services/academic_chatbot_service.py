@@ -86,10 +86,10 @@ def build_combined_knowledge_base() -> tuple[str, List[Dict[str, Any]]]:
 
 def find_exact_match(
     user_question: str, all_entries: List[Dict[str, Any]]
-) -> Optional[str]:
+) -> Optional[Dict[str, Any]]:
     """
     Busca coincidencias exactas o muy cercanas en la base de conocimiento.
-    Retorna la respuesta directamente si encuentra una coincidencia.
+    Retorna la entrada completa si encuentra una coincidencia.
     """
     user_question_clean = clean_text(user_question.lower())
 
@@ -98,7 +98,7 @@ def find_exact_match(
 
         # Coincidencia exacta
         if user_question_clean == question_clean:
-            return entry["answer"]
+            return entry
 
         # Coincidencia parcial (la pregunta del usuario contiene la pregunta de la BD)
         if (
@@ -113,11 +113,46 @@ def find_exact_match(
                 set(user_question_clean.split()) | set(question_clean.split())
             )
             if similarity / total_words > 0.7:
-                return entry["answer"]
+                return entry
 
     return None
 
 
+def kb_source_ref(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Referencia compacta a una entrada de la base de conocimiento"""
+    return {"source": entry["source"], "id": entry["id"]}
+
+
+def find_supporting_entries(
+    model_answer: str, all_entries: List[Dict[str, Any]], max_entries: int = 3
+) -> List[Dict[str, Any]]:
+    """
+    Identifica las entradas de la base de conocimiento en las que se basó una
+    respuesta del modelo, por solapamiento de palabras significativas.
+    Retorna hasta max_entries referencias, de mayor a menor solapamiento.
+    """
+
+    def significant_words(text: str) -> set:
+        return {w for w in re.findall(r"\w+", clean_text(text.lower())) if len(w) > 3}
+
+    answer_words = significant_words(model_answer)
+    if not answer_words:
+        return []
+
+    scored = []
+    for entry in all_entries:
+        entry_words = significant_words(entry["answer"])
+        if not entry_words:
+            continue
+        # Fracción de la entrada que aparece en la respuesta
+        overlap = len(entry_words & answer_words) / len(entry_words)
+        if overlap >= 0.5:
+            scored.append((overlap, entry))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [kb_source_ref(entry) for _, entry in scored[:max_entries]]
+
+
 def academic_chatbot(user_question: str) -> Dict[str, Any]:
     """
     Chatbot académico que usa LLaMA + Supabase (knowledge_base + faqs).
@@ -133,9 +168,13 @@ def academic_chatbot(user_question: str) -> Dict[str, Any]:
         }
 
     # 2️⃣ Buscar coincidencia exacta primero (bypass del modelo)
-    exact_answer = find_exact_match(user_question, all_entries)
-    if exact_answer:
-        return {"answer": exact_answer}
+    exact_entry = find_exact_match(user_question, all_entries)
+    if exact_entry:
+        return {
+            "answer": exact_entry["answer"],
+            "match_type": "exact",
+            "kb_sources": [kb_source_ref(exact_entry)],
+        }
 
     # 3️⃣ Construir PROMPT ULTRA-RESTRICTIVO
     system_prompt = f"""You are "UniBot", an academic assistant chatbot.
@@ -269,7 +308,11 @@ If **ANY** answer is NO, use the "I don't know" response instead.
                     "answer": "Disculpa, no tengo información disponible para responder tu pregunta. ¿Te gustaría que escale tu consulta con un agente humano? Escribe 'Agente' para continuar."
                 }
 
-        return {"answer": model_answer}
+        return {
+            "answer": model_answer,
+            "match_type": "retrieved",
+            "kb_sources": find_supporting_entries(model_answer, all_entries),
+        }
 
     except Exception as e:
         print(f"Error en academic_chatbot: {str(e)}")
@@ -0,0 +1,181 @@
+"""
+Agent Metrics Service
+SLA metrics for the support queue kept incrementally in memory: queue depth,
+open cases, event counters (total and last 24 hours) and time-to-assign /
+time-to-resolve percentiles (LogHistogram, ~2% relative error).
+
+The state is rebuilt from agent_requests once at startup and then updated by
+escalate_conversation, assign_request_to_agent and resolve_request, so
+GET /agent/metrics never scans the table. Each worker process keeps its own
+copy; with several workers the numbers describe that worker's events since
+its startup bootstrap.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.core.histogram import LogHistogram
+from app.core.config import supabase_
+from app.core.pagination import keyset_after
+from app.core.retry import call_with_retry
+from app.core.timeutil import epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("escalated", "assigned", "resolved")
+BOOTSTRAP_PAGE_SIZE = 1000
+# Rolling window of the recent-event counters: 24 buckets of one hour
+WINDOW_BUCKETS = 24
+BUCKET_SECONDS = 3600
+
+
+class RollingCounter:
+    """Event count over the last WINDOW_BUCKETS * BUCKET_SECONDS seconds"""
+
+    def __init__(self) -> None:
+        self._counts = [0] * WINDOW_BUCKETS
+        self._slots = [-1] * WINDOW_BUCKETS
+
+    def add(self, at: float) -> None:
+        slot = int(at // BUCKET_SECONDS)
+        if slot <= int(time.time() // BUCKET_SECONDS) - WINDOW_BUCKETS:
+            return
+        index = slot % WINDOW_BUCKETS
+        if self._slots[index] != slot:
+            self._slots[index] = slot
+            self._counts[index] = 0
+        self._counts[index] += 1
+
+    def total(self) -> int:
+        oldest = int(time.time() // BUCKET_SECONDS) - WINDOW_BUCKETS
+        return sum(
+            count for count, slot in zip(self._counts, self._slots) if slot > oldest
+        )
+
+
+class AgentMetrics:
+    """Counters and latency histograms of the agent queue"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.pending = 0
+            self.in_progress = 0
+            self.totals = {event: 0 for event in EVENTS}
+            self.recent = {event: RollingCounter() for event in EVENTS}
+            self.time_to_assign = LogHistogram()
+            self.time_to_resolve = LogHistogram()
+            self.bootstrapped_at: Optional[str] = None
+
+    def record_escalated(self, escalated_at: Optional[str]) -> None:
+        with self._lock:
+            self.pending += 1
+            self._count("escalated", epoch_seconds(escalated_at))
+
+    def record_assigned(
+        self, escalated_at: Optional[str], assigned_at: Optional[str]
+    ) -> None:
+        with self._lock:
+            self.pending = max(self.pending - 1, 0)
+            self.in_progress += 1
+            self._count("assigned", epoch_seconds(assigned_at))
+        self._observe(self.time_to_assign, escalated_at, assigned_at)
+
+    def record_resolved(
+        self, escalated_at: Optional[str], resolved_at: Optional[str]
+    ) -> None:
+        with self._lock:
+            self.in_progress = max(self.in_progress - 1, 0)
+            self._count("resolved", epoch_seconds(resolved_at))
+        self._observe(self.time_to_resolve, escalated_at, resolved_at)
+
+    # Missing timestamps (old rows) still count in the totals, but not in the
+    # rolling window or the histograms
+
+    def _count(self, event: str, at: Optional[float]) -> None:
+        self.totals[event] += 1
+        if at is not None:
+            self.recent[event].add(at)
+
+    def _observe(
+        self, histogram: LogHistogram, start: Optional[str], end: Optional[str]
+    ) -> None:
+        start_ts, end_ts = epoch_seconds(start), epoch_seconds(end)
+        if start_ts is not None and end_ts is not None:
+            histogram.record(end_ts - start_ts)
+
+    def bootstrap(self) -> None:
+        """Rebuild counters and histograms from agent_requests (paged scan)"""
+        self.reset()
+        cursor = None
+        rows_seen = 0
+        while True:
+            query = supabase_.table("agent_requests").select(
+                "id, status, created_at, assigned_at, resolved_at"
+            )
+            if cursor:
+                query = query.or_(keyset_after("created_at", *cursor))
+            response = call_with_retry(
+                query.order("created_at")
+                .order("id")
+                .limit(BOOTSTRAP_PAGE_SIZE)
+                .execute,
+                "bootstrap agent metrics",
+            )
+            rows = response.data or []
+
+            for row in rows:
+                self._replay(row)
+            rows_seen += len(rows)
+
+            if len(rows) < BOOTSTRAP_PAGE_SIZE:
+                break
+            cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+        self.bootstrapped_at = (
+            datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+        )
+        logger.info(f"Agent metrics bootstrapped from {rows_seen} agent requests")
+
+    def _replay(self, row: Dict[str, Any]) -> None:
+        self.record_escalated(row["created_at"])
+        if row.get("assigned_at") or row["status"] in ("in_progress", "resolved"):
+            self.record_assigned(row["created_at"], row.get("assigned_at"))
+        if row["status"] == "resolved":
+            self.record_resolved(row["created_at"], row.get("resolved_at"))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current metrics (cost independent of the number of requests)"""
+        with self._lock:
+            queue = {"pending": self.pending, "in_progress": self.in_progress}
+            totals = dict(self.totals)
+            last_24h = {
+                event: counter.total() for event, counter in self.recent.items()
+            }
+            bootstrapped_at = self.bootstrapped_at
+
+        return {
+            "queue": queue,
+            "totals": totals,
+            "last_24h": last_24h,
+            "time_to_assign_seconds": self.time_to_assign.summary(),
+            "time_to_resolve_seconds": self.time_to_resolve.summary(),
+            "bootstrapped_at": bootstrapped_at,
+        }
+
+
+agent_metrics = AgentMetrics()
+
+
+def start_agent_metrics() -> None:
+    """Bootstrap the metrics at startup; the app still starts if the DB is unavailable"""
+    try:
+        agent_metrics.bootstrap()
+    except Exception as e:
+        logger.error(f"Error bootstrapping agent metrics: {e}")
@@ -0,0 +1,151 @@
+"""
+Agent Queue Service
+In-memory priority queue of pending agent_requests, pushed to connected
+agents over /ws/agent/queue so they don't have to refresh GET /agent/requests.
+
+The queue is seeded from the database at startup and kept current by
+escalate_conversation (request_added), assign_request_to_agent
+(request_taken) and resolve_request (request_resolved). Agents receive a
+"snapshot" on connect and only these deltas afterwards.
+
+Those calls only update the queue of the worker that makes them (the deltas
+reach every worker's sockets through the broadcast backend, not its heap).
+Readers that need the whole picture (an agent's snapshot, the auto-assign
+tick) call refresh(), which reloads the queue from the database.
+
+Ordering is by escalation time with aging: the sort key is
+escalated_at - priority * AGENT_QUEUE_AGING_SECONDS, so a request with a
+higher (optional) priority column is served as if it had been waiting that
+much longer, and an old low-priority request still ends up ahead of new ones.
+Add the column in the Supabase SQL Editor:
+
+ALTER TABLE agent_requests ADD COLUMN IF NOT EXISTS priority INT NOT NULL DEFAULT 0;
+"""
+
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import Config, supabase_
+from app.core.retry import call_with_retry
+from app.core.timeutil import epoch_seconds
+from app.services.realtime_service import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Single room shared by every connected agent
+AGENT_QUEUE_ROOM = "agent-queue"
+
+
+class AgentWorkQueue:
+    """Pending agent requests ordered by escalation time with aging"""
+
+    def __init__(self, aging_seconds: float) -> None:
+        self.aging_seconds = aging_seconds
+        self.connections = ConnectionManager(namespace="agent_queue")
+        self._heap: List[Tuple[float, str]] = []
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _sort_key(self, entry: Dict[str, Any]) -> float:
+        # Entries without an escalation time are queued as escalated now
+        escalated = epoch_seconds(entry.get("escalated_at")) or time.time()
+        return escalated - (entry.get("priority") or 0) * self.aging_seconds
+
+    def seed(self) -> None:
+        """Load every pending request from the database"""
+        response = call_with_retry(
+            lambda: supabase_.table("agent_requests")
+            .select(
+                "id, conversation_id, created_at, priority, "
+                "conversations:conversation_id (user_id, escalated_at, title)"
+            )
+            .eq("status", "pending")
+            .execute(),
+            "load pending agent requests",
+        )
+
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+            for row in response.data or []:
+                self._push(self._entry_from_row(row))
+
+        logger.info(f"Agent queue seeded with {len(self._entries)} pending requests")
+
+    def refresh(self) -> List[Dict[str, Any]]:
+        """Reload the pending requests from the database; returns snapshot()"""
+        self.seed()
+        return self.snapshot()
+
+    def add(self, request: Dict[str, Any], conversation: Dict[str, Any]) -> None:
+        """Queue a new pending request and push it to connected agents"""
+        entry = self._entry_from_row({**request, "conversations": conversation})
+        with self._lock:
+            self._push(entry)
+
+        self._publish({"type": "request_added", "request": entry})
+
+    def take(self, request_id: str, agent_id: str) -> None:
+        """Drop a request claimed by an agent"""
+        self._discard(request_id)
+        self._publish(
+            {"type": "request_taken", "request_id": request_id, "agent_id": agent_id}
+        )
+
+    def resolve(self, request_id: str) -> None:
+        """Drop a resolved request"""
+        self._discard(request_id)
+        self._publish({"type": "request_resolved", "request_id": request_id})
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Pending requests in service order"""
+        with self._lock:
+            return [
+                self._entries[request_id]
+                for _, request_id in sorted(self._heap)
+                if request_id in self._entries
+            ]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry_from_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        conversation = row.get("conversations") or {}
+        return {
+            "id": row["id"],
+            "conversation_id": row["conversation_id"],
+            "status": "pending",
+            "escalated_at": conversation.get("escalated_at") or row.get("created_at"),
+            "user_email": conversation.get("user_id"),  # user_id como identificador
+            "title": conversation.get("title"),
+            "priority": row.get("priority") or 0,
+        }
+
+    def _push(self, entry: Dict[str, Any]) -> None:
+        self._entries[entry["id"]] = entry
+        heapq.heappush(self._heap, (self._sort_key(entry), entry["id"]))
+
+    def _discard(self, request_id: str) -> None:
+        # Heap items are removed lazily, when the heap gets mostly stale
+        with self._lock:
+            self._entries.pop(request_id, None)
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [item for item in self._heap if item[1] in self._entries]
+                heapq.heapify(self._heap)
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        self.connections.notify_conversation(AGENT_QUEUE_ROOM, event)
+
+
+agent_queue = AgentWorkQueue(aging_seconds=Config.AGENT_QUEUE_AGING_SECONDS)
+
+
+def start_agent_queue() -> None:
+    """Seed the queue at startup; the app still starts if the DB is unavailable"""
+    try:
+        agent_queue.seed()
+    except Exception as e:
+        logger.error(f"Error seeding agent queue: {e}")
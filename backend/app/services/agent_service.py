@@ -4,13 +4,36 @@ Servicio para gestionar operaciones de agentes de soporte.
 
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
-import time
 
+import httpx
 from fastapi import HTTPException
-from httpx import ReadError, ConnectError, TimeoutException
 
-from app.core.config import supabase_
+from app.core.cache import TTLCache
+from app.core.config import Config, supabase_
+from app.core.retry import call_with_retry, is_connect_error
+from app.services.agent_metrics_service import agent_metrics
+from app.services.agent_queue_service import agent_queue
+from app.services.auth_services import invalidate_profile
+from app.services.case_search_service import schedule_case_indexing
+from app.services.conversation_service import (
+    get_messages_since,
+    publish_escalation_status,
+)
+from app.services.email_outbox_service import (
+    PermanentEmailError,
+    enqueue_email,
+    register_email_handler,
+)
 from app.services.email_service import get_email_service
+from app.services.message_journal_service import get_message_journal
+
+# Mensajes por consulta al cargar el historial completo de un caso
+MESSAGES_PAGE_SIZE = 500
+
+# (agent_id, conversation_id) -> True while the agent holds the case
+_assignment_cache = TTLCache(
+    maxsize=Config.ASSIGNMENT_CACHE_SIZE, ttl=Config.ASSIGNMENT_CACHE_TTL_SECONDS
+)
 
 
 def get_utc_timestamp() -> str:
@@ -21,42 +44,6 @@ def get_utc_timestamp() -> str:
     return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
 
 
-def execute_with_retry(operation, max_retries=3, operation_name="Database operation"):
-    """
-    Ejecutar operación de base de datos con retry logic para manejar errores de conexión.
-
-    Args:
-        operation: Función lambda o callable que ejecuta la operación
-        max_retries: Número máximo de intentos
-        operation_name: Nombre de la operación para logging
-
-    Returns:
-        Resultado de la operación
-    """
-    retry_delay = 0.5  # segundos
-
-    for attempt in range(max_retries):
-        try:
-            return operation()
-        except (ReadError, ConnectError, TimeoutException) as e:
-            if attempt < max_retries - 1:
-                print(
-                    f"⚠️ Connection error in {operation_name} (attempt {attempt + 1}/{max_retries}): {e}"
-                )
-                time.sleep(retry_delay * (attempt + 1))  # Exponential backoff
-                continue
-            else:
-                print(f"❌ Failed {operation_name} after {max_retries} attempts: {e}")
-                raise HTTPException(
-                    status_code=503,
-                    detail=f"Error de conexión con la base de datos. Por favor, intente nuevamente.",
-                )
-        except Exception as e:
-            # Otros errores no son reintentos
-            print(f"❌ Unexpected error in {operation_name}: {e}")
-            raise
-
-
 def get_agent_requests(agent_id: str) -> List[Dict[str, Any]]:
     """
     Obtener todas las solicitudes de agente pendientes y en progreso.
@@ -64,9 +51,26 @@ def get_agent_requests(agent_id: str) -> List[Dict[str, Any]]:
     Retorna:
     - Todas las solicitudes con status='pending'
     - Las solicitudes con status='in_progress' asignadas a este agente
+
+    Cada solicitud trae el resumen del escalamiento ("summary", generado en
+    segundo plano; None mientras no esté listo) en lugar del historial.
+
+    Usa tres consultas sin importar cuántas solicitudes haya: las solicitudes
+    (filtradas en la base de datos), los perfiles (un solo in_()) y el conteo y
+    último mensaje de cada conversación (RPC). Crear en el SQL Editor de Supabase:
+
+    CREATE OR REPLACE FUNCTION get_conversation_message_stats(p_conversation_ids UUID[])
+    RETURNS TABLE (conversation_id UUID, message_count BIGINT, last_message TEXT) AS $$
+      SELECT m.conversation_id,
+             COUNT(*) AS message_count,
+             (ARRAY_AGG(m.content ORDER BY m.timestamp DESC))[1] AS last_message
+      FROM messages m
+      WHERE m.conversation_id = ANY(p_conversation_ids)
+      GROUP BY m.conversation_id;
+    $$ LANGUAGE sql STABLE;
     """
     try:
-        # Obtener agent_requests desde la tabla correcta con JOIN a conversations
+        # Filtrar: pending (todas) o in_progress (solo del agente actual)
         response = (
             supabase_.table("agent_requests")
             .select(
@@ -84,62 +88,79 @@ def get_agent_requests(agent_id: str) -> List[Dict[str, Any]]:
                 )
                 """
             )
+            .or_(f"status.eq.pending,and(status.eq.in_progress,agent_id.eq.{agent_id})")
             .order("created_at", desc=True)
             .execute()
         )
 
-        requests = []
-        for req in response.data:
-            # Filtrar: pending (todas) o in_progress (solo del agente actual)
-            if req["status"] == "pending" or (
-                req["status"] == "in_progress" and req.get("agent_id") == agent_id
-            ):
-                conversation = req.get("conversations", {})
-                user_id = conversation.get("user_id")
-
-                # Obtener información del usuario desde profiles
-                profile_response = (
-                    supabase_.table("profiles")
-                    .select("full_name")
-                    .eq("id", user_id)
-                    .single()
-                    .execute()
-                )
+        rows = response.data or []
+        if not rows:
+            return []
 
-                user_name = (
-                    profile_response.data.get("full_name", "Usuario")
-                    if profile_response.data
-                    else "Usuario"
-                )
+        user_ids = list(
+            {
+                (req.get("conversations") or {}).get("user_id")
+                for req in rows
+                if (req.get("conversations") or {}).get("user_id")
+            }
+        )
+        conversation_ids = [req["conversation_id"] for req in rows]
+
+        # Obtener nombres de usuario en una sola consulta
+        user_names: Dict[str, str] = {}
+        if user_ids:
+            profiles_response = (
+                supabase_.table("profiles")
+                .select("id, full_name")
+                .in_("id", user_ids)
+                .execute()
+            )
+            for profile in profiles_response.data or []:
+                user_names[profile["id"]] = profile.get("full_name") or "Usuario"
+
+        # Conteo y último mensaje de cada conversación (agregado en la base de datos)
+        stats_response = supabase_.rpc(
+            "get_conversation_message_stats",
+            {"p_conversation_ids": conversation_ids},
+        ).execute()
+        message_stats = {
+            stat["conversation_id"]: stat for stat in stats_response.data or []
+        }
 
-                # Obtener mensajes de la conversación
-                messages_response = (
-                    supabase_.table("messages")
-                    .select("content, timestamp")
-                    .eq("conversation_id", conversation.get("id"))
-                    .order("timestamp", desc=False)
-                    .execute()
-                )
+        journal = get_message_journal()
 
-                messages = messages_response.data if messages_response.data else []
-                last_message = messages[-1]["content"] if messages else None
-                message_count = len(messages)
-
-                requests.append(
-                    {
-                        "id": req["id"],
-                        "conversation_id": req["conversation_id"],
-                        "agent_id": req.get("agent_id"),
-                        "status": req["status"],
-                        "escalated_at": conversation.get("escalated_at"),
-                        "assigned_at": req.get("assigned_at"),
-                        "resolved_at": req.get("resolved_at"),
-                        "user_email": user_id,  # Usamos user_id como identificador
-                        "user_name": user_name,
-                        "last_message": last_message,
-                        "message_count": message_count,
-                    }
-                )
+        requests = []
+        for req in rows:
+            conversation = req.get("conversations") or {}
+            user_id = conversation.get("user_id")
+
+            stats = message_stats.get(req["conversation_id"], {})
+            last_message = stats.get("last_message")
+            message_count = stats.get("message_count", 0)
+
+            # Incluir mensajes aún pendientes en el journal de escritura diferida
+            if journal:
+                pending = journal.pending_messages(req["conversation_id"])
+                if pending:
+                    last_message = pending[-1]["content"]
+                    message_count += len(pending)
+
+            requests.append(
+                {
+                    "id": req["id"],
+                    "conversation_id": req["conversation_id"],
+                    "agent_id": req.get("agent_id"),
+                    "status": req["status"],
+                    "escalated_at": conversation.get("escalated_at"),
+                    "assigned_at": req.get("assigned_at"),
+                    "resolved_at": req.get("resolved_at"),
+                    "user_email": user_id,  # Usamos user_id como identificador
+                    "user_name": user_names.get(user_id or "", "Usuario"),
+                    "last_message": last_message,
+                    "message_count": message_count,
+                    "summary": req.get("summary"),
+                }
+            )
 
         return requests
 
@@ -150,71 +171,126 @@ def get_agent_requests(agent_id: str) -> List[Dict[str, Any]]:
         )
 
 
-def get_active_case(agent_id: str) -> Optional[Dict[str, Any]]:
-    """
-    Obtener el caso activo del agente (si tiene uno).
+ACTIVE_CASE_SELECT = """
+    *,
+    conversations:conversation_id (
+        id,
+        user_id,
+        created_at,
+        is_escalated,
+        resolved,
+        title
+    )
+"""
 
-    Un caso activo es una agent_request con status='in_progress' asignada a este agente.
+
+def _active_case_payload(
+    request_data: Dict[str, Any], user_name: str
+) -> Dict[str, Any]:
+    conversation = request_data.get("conversations") or {}
+    return {
+        "request": {
+            "id": request_data["id"],
+            "conversation_id": request_data["conversation_id"],
+            "agent_id": request_data.get("agent_id"),
+            "status": request_data["status"],
+            "escalated_at": request_data.get("created_at"),
+            "assigned_at": request_data.get("assigned_at"),
+            "resolved_at": request_data.get("resolved_at"),
+            "summary": request_data.get("summary"),
+        },
+        "conversation": conversation,
+        "user_info": {"email": conversation.get("user_id"), "name": user_name},
+    }
+
+
+def _user_names(user_ids: List[str]) -> Dict[str, str]:
+    """full_name de varios perfiles en una sola consulta"""
+    if not user_ids:
+        return {}
+    response = (
+        supabase_.table("profiles")
+        .select("id, full_name")
+        .in_("id", list(set(user_ids)))
+        .execute()
+    )
+    return {row["id"]: row.get("full_name") or "Usuario" for row in response.data or []}
+
+
+def get_active_cases(agent_id: str) -> List[Dict[str, Any]]:
+    """
+    Obtener todos los casos activos del agente (status='in_progress'), los
+    asignados primero al principio. Sin historial de mensajes: el cliente
+    abre cada caso con get_active_case.
     """
     try:
         response = (
             supabase_.table("agent_requests")
-            .select(
-                """
-                *,
-                conversations:conversation_id (
-                    id,
-                    user_id,
-                    created_at,
-                    is_escalated,
-                    resolved,
-                    title
-                )
-                """
-            )
+            .select(ACTIVE_CASE_SELECT)
             .eq("agent_id", agent_id)
             .eq("status", "in_progress")
-            .limit(1)
+            .order("assigned_at")
+            .order("id")
             .execute()
         )
+        rows = response.data or []
+        user_ids = [(row.get("conversations") or {}).get("user_id") for row in rows]
+        names = _user_names([user_id for user_id in user_ids if user_id])
+        return [
+            _active_case_payload(row, names.get(user_id or "", "Usuario"))
+            for row, user_id in zip(rows, user_ids)
+        ]
+
+    except Exception as e:
+        print(f"Error obteniendo casos activos: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Error obteniendo casos activos: {str(e)}"
+        )
+
+
+def get_active_case(
+    agent_id: str, include_messages: bool = True, request_id: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Obtener un caso activo del agente: el de request_id o, sin él, el asignado
+    hace más tiempo (un agente puede atender hasta max_cases a la vez; la
+    lista completa está en get_active_cases).
+
+    Un caso activo es una agent_request con status='in_progress' asignada a este agente.
+    Incluye el resumen del escalamiento (request.summary); con
+    include_messages=False no se descarga el historial (el cliente lo
+    sincroniza por cursor con GET /agent/conversations/{id}/messages).
+    """
+    try:
+        query = (
+            supabase_.table("agent_requests")
+            .select(ACTIVE_CASE_SELECT)
+            .eq("agent_id", agent_id)
+            .eq("status", "in_progress")
+        )
+        if request_id:
+            query = query.eq("id", request_id)
+
+        response = query.order("assigned_at").order("id").limit(1).execute()
 
         if not response.data:
             return None
 
         request_data = response.data[0]
-        conversation = request_data.get("conversations", {})
-
-        # Obtener mensajes de la conversación
-        messages = get_conversation_messages(conversation["id"])
-
-        # Obtener información del usuario desde profiles
-        profile_response = (
-            supabase_.table("profiles")
-            .select("full_name")
-            .eq("id", conversation["user_id"])
-            .single()
-            .execute()
+        conversation = request_data.get("conversations") or {}
+        user_id = conversation.get("user_id")
+        user_name = (
+            _user_names([user_id]).get(user_id, "Usuario") if user_id else "Usuario"
         )
 
-        user_name = (
-            profile_response.data.get("full_name", "Usuario")
-            if profile_response.data
-            else "Usuario"
+        # Obtener mensajes de la conversación
+        messages = (
+            get_conversation_messages(conversation["id"]) if include_messages else None
         )
 
         return {
-            "request": {
-                "id": request_data["id"],
-                "conversation_id": request_data["conversation_id"],
-                "agent_id": request_data.get("agent_id"),
-                "status": request_data["status"],
-                "escalated_at": request_data.get("created_at"),
-                "assigned_at": request_data.get("assigned_at"),
-                "resolved_at": request_data.get("resolved_at"),
-            },
-            "conversation": conversation,
+            **_active_case_payload(request_data, user_name),
             "messages": messages,
-            "user_info": {"email": conversation["user_id"], "name": user_name},
         }
 
     except Exception as e:
@@ -224,198 +300,274 @@ def get_active_case(agent_id: str) -> Optional[Dict[str, Any]]:
         )
 
 
-def assign_request_to_agent(request_id: str, agent_id: str) -> None:
+def get_available_agents() -> List[Dict[str, Any]]:
     """
-    Asignar una solicitud pendiente a un agente.
+    Agentes que aceptan casos, con su capacidad y su carga actual.
+
+    Returns:
+        [{"id", "max_cases", "load"}]
+    """
+    agents_response = call_with_retry(
+        lambda: supabase_.table("profiles")
+        .select("id, max_cases")
+        .eq("role", "agent")
+        .eq("accepting_cases", True)
+        .execute(),
+        "list available agents",
+    )
+    agents = agents_response.data or []
+    if not agents:
+        return []
+
+    loads_response = call_with_retry(
+        lambda: supabase_.table("agent_requests")
+        .select("agent_id")
+        .eq("status", "in_progress")
+        .in_("agent_id", [agent["id"] for agent in agents])
+        .execute(),
+        "count agent loads",
+    )
+    loads: Dict[str, int] = {}
+    for row in loads_response.data or []:
+        loads[row["agent_id"]] = loads.get(row["agent_id"], 0) + 1
+
+    return [
+        {
+            "id": agent["id"],
+            "max_cases": agent.get("max_cases") or 1,
+            "load": loads.get(agent["id"], 0),
+        }
+        for agent in agents
+    ]
 
-    Actualiza el agent_id y cambia status de 'pending' a 'in_progress' en agent_requests.
-    Envía un email al usuario notificando que su caso fue tomado.
+
+def set_agent_availability(
+    agent_id: str, accepting_cases: bool, max_cases: int
+) -> Dict[str, Any]:
+    """
+    Actualizar la disponibilidad del agente para la asignación automática
+    y su capacidad (casos en progreso simultáneos).
     """
     try:
-        # Verificar que la solicitud existe y está pendiente
-        check_response = (
-            supabase_.table("agent_requests")
-            .select(
-                """
-                *,
-                conversations:conversation_id (
-                    user_id
-                )
-            """
-            )
-            .eq("id", request_id)
-            .eq("status", "pending")
-            .execute()
+        response = call_with_retry(
+            lambda: supabase_.table("profiles")
+            .update({"accepting_cases": accepting_cases, "max_cases": max_cases})
+            .eq("id", agent_id)
+            .execute(),
+            "update agent availability",
         )
+        invalidate_profile(agent_id)
 
-        if not check_response.data:
-            raise HTTPException(
-                status_code=404,
-                detail="Solicitud no encontrada o ya está asignada",
-            )
+        if not response.data:
+            raise HTTPException(status_code=404, detail="Agente no encontrado")
 
-        request_data = check_response.data[0]
-        user_id = request_data["conversations"]["user_id"]
+        return {"accepting_cases": accepting_cases, "max_cases": max_cases}
 
-        # IMPORTANTE: Obtener TODOS los datos necesarios en variables locales
-        # ANTES de hacer cualquier operación de escritura o envío de email
-        # Esto evita problemas de estado compartido entre requests concurrentes
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error actualizando disponibilidad: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Error actualizando disponibilidad: {str(e)}"
+        )
 
-        print(f"📊 Fetching user data for user_id: {user_id}")
 
-        # Obtener información del usuario (email y nombre) con retry
-        user_profile = execute_with_retry(
-            lambda: supabase_.table("profiles")
-            .select("full_name")
-            .eq("id", user_id)
-            .single()
-            .execute(),
-            operation_name=f"fetch user profile {user_id}",
-        )
+def is_agent_assigned(agent_id: str, conversation_id: str) -> bool:
+    """
+    Verificar que el agente tiene asignada (in_progress) la conversación.
 
-        # Obtener información del agente con retry
-        agent_profile = execute_with_retry(
-            lambda: supabase_.table("profiles")
-            .select("full_name")
-            .eq("id", agent_id)
-            .single()
-            .execute(),
-            operation_name=f"fetch agent profile {agent_id}",
-        )
+    Una sola consulta indexada, y los resultados positivos se cachean unos
+    segundos (ASSIGNMENT_CACHE_TTL_SECONDS). resolve_request invalida la caché
+    de su worker; en los demás el agente conserva el acceso como mucho ese
+    TTL. Índice recomendado:
 
-        user_name = (
-            user_profile.data.get("full_name", "Usuario")
-            if user_profile.data
-            else "Usuario"
+    CREATE INDEX IF NOT EXISTS agent_requests_assignment
+      ON agent_requests (conversation_id, agent_id) WHERE status = 'in_progress';
+    """
+    cache_key = (agent_id, conversation_id)
+    if _assignment_cache.get(cache_key):
+        return True
+
+    response = call_with_retry(
+        lambda: supabase_.table("agent_requests")
+        .select("id")
+        .eq("conversation_id", conversation_id)
+        .eq("agent_id", agent_id)
+        .eq("status", "in_progress")
+        .limit(1)
+        .execute(),
+        "check agent assignment",
+    )
+
+    assigned = bool(response.data)
+    if assigned:
+        _assignment_cache.set(cache_key, True)
+    return assigned
+
+
+def claim_agent_request(request_id: str, agent_id: str) -> Dict[str, Any]:
+    """
+    Tomar una solicitud pendiente de forma atómica (una sola consulta).
+
+    El UPDATE condicional solo afecta a la solicitud si sigue 'pending' y el
+    agente tiene menos casos 'in_progress' que su capacidad (profiles.max_cases,
+    1 por defecto); si dos agentes la reclaman a la vez, solo uno la obtiene y
+    el otro recibe 409. Crear en el SQL Editor de Supabase:
+
+    ALTER TABLE profiles
+      ADD COLUMN IF NOT EXISTS max_cases INT NOT NULL DEFAULT 1,
+      ADD COLUMN IF NOT EXISTS accepting_cases BOOLEAN NOT NULL DEFAULT false;
+
+    -- Reemplazado por el límite de max_cases
+    DROP INDEX IF EXISTS agent_requests_one_active_case;
+
+    CREATE OR REPLACE FUNCTION claim_agent_request(p_request_id UUID, p_agent_id UUID)
+    RETURNS TABLE (
+      id UUID, conversation_id UUID, user_id UUID,
+      created_at TIMESTAMP, assigned_at TIMESTAMP
+    ) AS $$
+    DECLARE
+      v_capacity INT;
+    BEGIN
+      -- Bloquear el perfil serializa los reclamos concurrentes del mismo agente
+      SELECT p.max_cases INTO v_capacity FROM profiles p
+      WHERE p.id = p_agent_id FOR UPDATE;
+
+      IF (
+        SELECT COUNT(*) FROM agent_requests a
+        WHERE a.agent_id = p_agent_id AND a.status = 'in_progress'
+      ) >= COALESCE(v_capacity, 1) THEN
+        RETURN;
+      END IF;
+
+      RETURN QUERY
+      UPDATE agent_requests r
+      SET agent_id = p_agent_id,
+          status = 'in_progress',
+          assigned_at = (now() AT TIME ZONE 'utc'),
+          updated_at = (now() AT TIME ZONE 'utc')
+      FROM conversations c
+      WHERE r.id = p_request_id
+        AND r.status = 'pending'
+        AND c.id = r.conversation_id
+      RETURNING r.id, r.conversation_id, c.user_id, r.created_at, r.assigned_at;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    Returns:
+        {"id", "conversation_id", "user_id", "created_at", "assigned_at"}
+        de la solicitud tomada
+    """
+    try:
+        response = call_with_retry(
+            lambda: supabase_.rpc(
+                "claim_agent_request",
+                {"p_request_id": request_id, "p_agent_id": agent_id},
+            ).execute(),
+            "claim agent request",
+            retryable=is_connect_error,
         )
-        agent_name = (
-            agent_profile.data.get("full_name", "Agente de Soporte")
-            if agent_profile.data
-            else "Agente de Soporte"
+    except (HTTPException, httpx.TransportError):
+        raise
+    except Exception as e:
+        print(f"Error tomando solicitud: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Error tomando solicitud: {str(e)}"
         )
 
-        print(f"   User name: {user_name}")
-        print(f"   Agent name: {agent_name}")
+    if not response.data:
+        raise HTTPException(
+            status_code=409,
+            detail="La solicitud ya fue tomada por otro agente o alcanzaste tu límite de casos activos.",
+        )
 
-        # Obtener email del usuario usando RPC function (mismo método que scheduler)
-        user_email = None
-        try:
-            print(f"   Fetching email using RPC for user_id: {user_id}")
+    return response.data[0]
 
-            # Usar RPC function para obtener email desde auth.users
-            result = execute_with_retry(
-                lambda: supabase_.rpc(
-                    "get_user_email", {"user_uuid": user_id}
-                ).execute(),
-                operation_name=f"fetch user email via RPC {user_id}",
-            )
 
-            if result.data and len(result.data) > 0:
-                user_data = result.data[0]
-                user_email = user_data.get("email")
-
-                # Actualizar user_name si viene del RPC
-                rpc_name = user_data.get("full_name")
-                if rpc_name:
-                    user_name = rpc_name
-
-                if user_email:
-                    print(
-                        f"✅ Email retrieved via RPC: {user_email} (for user_id: {user_id})"
-                    )
-                else:
-                    print(f"⚠️ RPC returned data but no email field")
-            else:
-                print(f"⚠️ RPC returned no data for user {user_id}")
-
-        except Exception as rpc_error:
-            print(f"⚠️ Could not fetch user email via RPC: {rpc_error}")
-            print(f"   Error details: {type(rpc_error).__name__}")
-            import traceback
-
-            traceback.print_exc()
-
-        if not user_email:
-            print(f"⚠️ No email found for user {user_id}, skipping email notification")
-
-        # Guardar conversation_id en variable local
-        conversation_id_local = request_data["conversation_id"]
-        print(f"   Conversation ID: {conversation_id_local}")
-
-        # PRIMERO: Actualizar la base de datos con retry
-        print(
-            f"💾 Updating database: assigning request {request_id} to agent {agent_id}"
-        )
-        execute_with_retry(
-            lambda: supabase_.table("agent_requests")
-            .update(
-                {
-                    "agent_id": agent_id,
-                    "status": "in_progress",
-                    "assigned_at": get_utc_timestamp(),
-                    "updated_at": get_utc_timestamp(),
-                }
-            )
-            .eq("id", request_id)
-            .execute(),
-            operation_name=f"assign request {request_id} to agent {agent_id}",
-        )
-        print(f"✅ Database updated successfully")
-
-        # SEGUNDO: Enviar email de notificación (en un bloque completamente separado)
-        # Usar variables locales para evitar problemas de estado compartido
-        print(f"\n📧 Preparing to send email notification")
-        print(f"   Target email: {user_email}")
-        print(f"   User name: {user_name}")
-        print(f"   Agent name: {agent_name}")
-        print(f"   Conversation ID: {conversation_id_local}")
-
-        email_sent_successfully = False
-        if user_email:
-            try:
-                # Crear una NUEVA instancia del servicio para evitar conflictos
-                # con conexiones HTTP/2 reutilizadas del cliente de Supabase
-                from app.services.email_service import EmailService
-
-                email_service = EmailService()  # Nueva instancia, no reutilizar
-                print(f"   Email service initialized (fresh instance)")
-
-                # Intentar enviar email (puede fallar si no hay configuración SMTP)
-                email_sent_successfully = (
-                    email_service.send_agent_assignment_notification(
-                        to_email=user_email,
-                        user_name=user_name,
-                        agent_name=agent_name,
-                        conversation_id=conversation_id_local,
-                    )
-                )
+def assign_request_to_agent(request_id: str, agent_id: str) -> Dict[str, Any]:
+    """
+    Asignar una solicitud pendiente a un agente.
 
-                if email_sent_successfully:
-                    print(
-                        f"✅ Email sent successfully to {user_email} - Case assigned by {agent_name}"
-                    )
-                else:
-                    print(f"⚠️ Email not sent (SMTP not configured or error)")
-                    print(f"   Check SMTP_USER and SMTP_PASSWORD environment variables")
-            except Exception as email_error:
-                # No fallar si el email no se envía
-                print(f"❌ Error sending email notification: {email_error}")
-                print(f"   Error type: {type(email_error).__name__}")
-                import traceback
-
-                traceback.print_exc()
-        else:
-            print(f"⚠️ Cannot send email - no email address found for user")
-
-        print(f"\n✅ Request {request_id} assigned to agent {agent_id} (complete)")
+    Toma la solicitud de forma atómica (ver claim_agent_request), encola el
+    email al usuario en el outbox y avisa a los demás agentes y al estudiante
+    por WebSocket. Ninguna de estas operaciones espera al servidor SMTP.
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error asignando solicitud: {e}")
-        raise HTTPException(
-            status_code=500, detail=f"Error asignando solicitud: {str(e)}"
+    Returns:
+        La solicitud tomada (ver claim_agent_request)
+    """
+    claim = claim_agent_request(request_id, agent_id)
+
+    try:
+        enqueue_email(
+            "agent_assignment",
+            {
+                "conversation_id": claim["conversation_id"],
+                "user_id": claim["user_id"],
+                "agent_id": agent_id,
+            },
+            dedupe_key=f"agent_assignment:{request_id}",
         )
+    except Exception as e:
+        # La solicitud ya quedó asignada; solo se pierde el email
+        print(f"⚠️ Could not enqueue assignment email for {request_id}: {e}")
+
+    agent_metrics.record_assigned(claim.get("created_at"), claim.get("assigned_at"))
+
+    # Avisar a los demás agentes y al estudiante (si tiene el chat abierto)
+    agent_queue.take(request_id, agent_id)
+    publish_escalation_status(claim["conversation_id"])
+
+    print(f"✅ Request {request_id} assigned to agent {agent_id}")
+    return claim
+
+
+def deliver_assignment_notification(payload: Dict[str, Any]) -> None:
+    """
+    Enviar al usuario el email de que su caso fue tomado.
+    Lo ejecuta el despachador del outbox de emails (nunca una petición HTTP).
+
+    Args:
+        payload: {"conversation_id", "user_id", "agent_id"}
+    """
+    user_id = payload["user_id"]
+    agent_id = payload["agent_id"]
+
+    # Obtener nombre y email del usuario desde auth.users (RPC get_user_email)
+    result = call_with_retry(
+        lambda: supabase_.rpc("get_user_email", {"user_uuid": user_id}).execute(),
+        "get user email",
+    )
+    user_data = result.data[0] if result.data else {}
+    user_email = user_data.get("email")
+    if not user_email:
+        raise PermanentEmailError(f"No email found for user {user_id}")
+
+    # Obtener información del agente
+    agent_profile = call_with_retry(
+        lambda: supabase_.table("profiles")
+        .select("full_name")
+        .eq("id", agent_id)
+        .maybe_single()
+        .execute(),
+        "get agent profile",
+    )
+    agent_name = (
+        agent_profile.data.get("full_name")
+        if agent_profile and agent_profile.data
+        else None
+    ) or "Agente de Soporte"
+
+    sent = get_email_service().send_agent_assignment_notification(
+        to_email=user_email,
+        user_name=user_data.get("full_name") or "Usuario",
+        agent_name=agent_name,
+        conversation_id=payload["conversation_id"],
+    )
+    if not sent:
+        raise RuntimeError("SMTP send failed (see email_service logs)")
+
+
+register_email_handler("agent_assignment", deliver_assignment_notification)
 
 
 def resolve_request(request_id: str, agent_id: str) -> None:
@@ -423,16 +575,18 @@ def resolve_request(request_id: str, agent_id: str) -> None:
     Resolver una solicitud (marcarla como resuelta).
 
     Cambia status de 'in_progress' a 'resolved' en agent_requests y marca la conversación como resuelta.
+    El caso se agrega en segundo plano al índice de búsqueda de casos resueltos.
     """
     try:
         # Verificar que la solicitud está asignada a este agente
-        check_response = (
-            supabase_.table("agent_requests")
+        check_response = call_with_retry(
+            lambda: supabase_.table("agent_requests")
             .select("*")
             .eq("id", request_id)
             .eq("agent_id", agent_id)
             .eq("status", "in_progress")
-            .execute()
+            .execute(),
+            "check request before resolving",
         )
 
         if not check_response.data:
@@ -444,23 +598,41 @@ def resolve_request(request_id: str, agent_id: str) -> None:
         request_data = check_response.data[0]
         conversation_id = request_data["conversation_id"]
 
-        # Marcar la solicitud como resuelta
-        supabase_.table("agent_requests").update(
-            {
-                "status": "resolved",
-                "resolved_at": get_utc_timestamp(),
-                "updated_at": get_utc_timestamp(),
-            }
-        ).eq("id", request_id).execute()
+        # Marcar la solicitud y la conversación como resueltas (actualizaciones
+        # idempotentes: se pueden reintentar)
+        resolved_at = get_utc_timestamp()
+        call_with_retry(
+            lambda: supabase_.table("agent_requests")
+            .update(
+                {
+                    "status": "resolved",
+                    "resolved_at": resolved_at,
+                    "updated_at": resolved_at,
+                }
+            )
+            .eq("id", request_id)
+            .execute(),
+            "resolve agent request",
+        )
+        call_with_retry(
+            lambda: supabase_.table("conversations")
+            .update(
+                {
+                    "resolved": True,
+                    "resolved_at": resolved_at,
+                    "updated_at": resolved_at,
+                }
+            )
+            .eq("id", conversation_id)
+            .execute(),
+            "mark conversation resolved",
+        )
 
-        # Marcar la conversación como resuelta
-        supabase_.table("conversations").update(
-            {
-                "resolved": True,
-                "resolved_at": get_utc_timestamp(),
-                "updated_at": get_utc_timestamp(),
-            }
-        ).eq("id", conversation_id).execute()
+        _assignment_cache.invalidate((agent_id, conversation_id))
+        agent_metrics.record_resolved(request_data.get("created_at"), resolved_at)
+        agent_queue.resolve(request_id)
+        publish_escalation_status(conversation_id)
+        schedule_case_indexing(request_id)
 
     except HTTPException:
         raise
@@ -472,31 +644,33 @@ def resolve_request(request_id: str, agent_id: str) -> None:
 
 
 def get_conversation_messages(conversation_id: str) -> List[Dict[str, Any]]:
-    """Obtener todos los mensajes de una conversación"""
-    try:
-        response = (
-            supabase_.table("messages")
-            .select("*")
-            .eq("conversation_id", conversation_id)
-            .order("timestamp", desc=False)
-            .execute()
+    """
+    Obtener todos los mensajes de una conversación, incluidos los archivados
+    y los que aún esperan en el journal (páginas de get_messages_since).
+    """
+    messages: List[Dict[str, Any]] = []
+    after_timestamp: Optional[str] = None
+    after_id: Optional[str] = None
+    while True:
+        result = get_messages_since(
+            conversation_id, after_timestamp, after_id, MESSAGES_PAGE_SIZE
         )
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail="Error obteniendo mensajes")
 
-        return response.data
-
-    except Exception as e:
-        print(f"Error obteniendo mensajes: {e}")
-        raise HTTPException(
-            status_code=500, detail=f"Error obteniendo mensajes: {str(e)}"
-        )
+        messages += result["messages"]
+        if not result["has_more"]:
+            return messages
+        after_timestamp = result["cursor"]["timestamp"]
+        after_id = result["cursor"]["id"]
 
 
 def send_agent_message(conversation_id: str, content: str) -> Dict[str, Any]:
     """Enviar un mensaje como agente en una conversación"""
     try:
         # Insertar mensaje con role='assistant' (el agente actúa como asistente)
-        response = (
-            supabase_.table("messages")
+        response = call_with_retry(
+            lambda: supabase_.table("messages")
             .insert(
                 {
                     "conversation_id": conversation_id,
@@ -504,7 +678,9 @@ def send_agent_message(conversation_id: str, content: str) -> Dict[str, Any]:
                     "role": "assistant",  # Usar 'role' en lugar de 'sender'
                 }
             )
-            .execute()
+            .execute(),
+            "insert agent message",
+            retryable=is_connect_error,
         )
 
         if not response.data:
@@ -0,0 +1,315 @@
+"""
+Archive Service
+Moves old conversations out of the messages table into compressed
+per-conversation bundles (gzip JSON) and reads them back on demand.
+
+The conversation row stays in place as a stub marked with archived_at and a
+few summary fields, so ownership checks and the conversation list keep
+working. Add the columns in the Supabase SQL Editor:
+
+ALTER TABLE conversations
+  ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS archive_key TEXT,
+  ADD COLUMN IF NOT EXISTS archived_message_count INT,
+  ADD COLUMN IF NOT EXISTS archived_last_message TEXT;
+"""
+
+import gzip
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import Config, supabase_
+from app.core.retry import call_with_retry, is_connect_error
+from app.services.export_service import iter_conversation_messages
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_VERSION = 1
+# Message ids per DELETE request (they travel in the query string)
+DELETE_BATCH_SIZE = 200
+
+
+def get_utc_timestamp() -> str:
+    """
+    Obtener timestamp UTC en formato compatible con Supabase.
+    Supabase espera formato ISO sin timezone explícito (naive UTC).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class ArchiveStore(ABC):
+    """Storage backend for archive bundles (local disk, object store, ...)"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> bool:
+        """Store a bundle unless the key is taken (False then); never overwrites"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """The bundle stored under key, or None"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether a bundle is stored under key"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a bundle (no error if missing)"""
+
+
+class FilesystemArchiveStore(ArchiveStore):
+    """Archive bundles stored as files under a root directory"""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, key: str, data: bytes) -> bool:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # link() fails if the bundle exists: a complete file or nothing
+            os.link(tmp_path, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+archive_store: ArchiveStore = FilesystemArchiveStore(Config.ARCHIVE_DIR)
+
+# conversation_id -> archived messages, for recently opened archived chats
+_bundle_cache = TTLCache(maxsize=Config.ARCHIVE_CACHE_SIZE, ttl=None)
+
+
+def archive_key(conversation_id: str) -> str:
+    """Key of the bundle of a conversation"""
+    return f"{conversation_id}.json.gz"
+
+
+def _claim(conversation_id: str, archived_at: str) -> bool:
+    """
+    Mark the conversation as being archived, unless another worker already
+    did (every worker runs the archive job). One conditional UPDATE.
+    """
+    response = call_with_retry(
+        lambda: supabase_.table("conversations")
+        .update({"archived_at": archived_at})
+        .eq("id", conversation_id)
+        .is_("archived_at", "null")
+        .execute(),
+        "claim conversation for archive",
+        retryable=is_connect_error,
+    )
+    return bool(response.data)
+
+
+def _release_claim(conversation_id: str, archived_at: str) -> None:
+    """Undo a claim whose archive failed before any message was deleted"""
+    try:
+        call_with_retry(
+            lambda: supabase_.table("conversations")
+            .update({"archived_at": None})
+            .eq("id", conversation_id)
+            .eq("archived_at", archived_at)
+            .execute(),
+            "release archive claim",
+        )
+    except Exception as e:
+        logger.error(f"Error releasing archive claim of {conversation_id}: {e}")
+
+
+def archive_conversation(conversation: Dict[str, Any]) -> bool:
+    """
+    Archive one conversation: claim the row, write its bundle, fill in the
+    stub and delete its messages. Returns False if it was not archived
+    (claimed by another worker, or an error).
+
+    The claim (archived_at set while it is NULL) makes each conversation
+    archived by one worker only. Messages are deleted last and only those in
+    the bundle, so rows written meanwhile (e.g. by the journal) stay live and
+    a failure never loses messages. A bundle is never overwritten: one left
+    by an interrupted run is kept and its messages are the ones archived.
+    """
+    # Imported here: conversation_service reads the bundles of this module
+    from app.services.conversation_service import invalidate_conversation_cache
+
+    conversation_id = conversation["id"]
+    archived_at = get_utc_timestamp()
+    try:
+        if not _claim(conversation_id, archived_at):
+            logger.info(f"Conversation {conversation_id} already archived, skipping")
+            return False
+    except Exception as e:
+        logger.error(f"Error claiming conversation {conversation_id}: {e}")
+        return False
+
+    deleting = False
+    try:
+        key = archive_key(conversation_id)
+        bundle: Dict[str, Any] = {
+            "version": BUNDLE_VERSION,
+            "archived_at": archived_at,
+            "conversation": conversation,
+            "messages": list(iter_conversation_messages(conversation_id)),
+        }
+        data = gzip.compress(json.dumps(bundle, ensure_ascii=False).encode("utf-8"))
+        if not archive_store.put(key, data):
+            existing = archive_store.get(key)
+            if existing is None:
+                raise RuntimeError(f"Bundle {key} exists but can't be read")
+            bundle = json.loads(gzip.decompress(existing))
+        messages: List[Dict[str, Any]] = bundle["messages"]
+
+        previews = [msg for msg in messages if msg.get("response_type") != "greeting"]
+        last_message = previews[-1]["content"][:100] if previews else None
+
+        call_with_retry(
+            lambda: supabase_.table("conversations")
+            .update(
+                {
+                    "archive_key": key,
+                    "archived_message_count": len(messages),
+                    "archived_last_message": last_message,
+                }
+            )
+            .eq("id", conversation_id)
+            .execute(),
+            "update archive stub",
+        )
+
+        deleting = True
+        archived_ids = [msg["id"] for msg in messages]
+        for i in range(0, len(archived_ids), DELETE_BATCH_SIZE):
+            batch = archived_ids[i : i + DELETE_BATCH_SIZE]
+            call_with_retry(
+                lambda: supabase_.table("messages")
+                .delete()
+                .eq("conversation_id", conversation_id)
+                .in_("id", batch)
+                .execute(),
+                "delete archived messages",
+            )
+
+        _bundle_cache.invalidate(conversation_id)
+        invalidate_conversation_cache(conversation_id)
+        logger.info(
+            f"Archived conversation {conversation_id} ({len(messages)} messages)"
+        )
+        return True
+
+    except Exception as e:
+        logger.error(f"Error archiving conversation {conversation_id}: {e}")
+        # Before the deletes every message is still live: let a later run retry
+        if not deleting:
+            _release_claim(conversation_id, archived_at)
+        return False
+
+
+def archive_old_conversations(days: int, batch_size: int = 100) -> int:
+    """
+    Archive conversations idle for more than `days` days, or resolved more
+    than `days` days ago. Escalated conversations still waiting for or being
+    handled by an agent are left alone.
+
+    Returns the number of archived conversations.
+    """
+    cutoff = (
+        (datetime.now(timezone.utc) - timedelta(days=days))
+        .replace(tzinfo=None)
+        .isoformat()
+    )
+    archived = 0
+    failed_ids: List[str] = []
+
+    logger.info(f"Archiving conversations inactive since {cutoff}")
+
+    while True:
+        query = (
+            supabase_.table("conversations")
+            .select("*")
+            .is_("archived_at", "null")
+            .or_(
+                f'and(last_message_at.lt."{cutoff}",is_escalated.eq.false),'
+                f'and(last_message_at.lt."{cutoff}",resolved.eq.true),'
+                f'and(resolved.eq.true,resolved_at.lt."{cutoff}")'
+            )
+        )
+        if failed_ids:
+            query = query.not_.in_("id", failed_ids)
+
+        response = call_with_retry(
+            query.order("created_at").limit(batch_size).execute,
+            "list conversations to archive",
+        )
+        candidates = response.data or []
+        if not candidates:
+            break
+
+        for conversation in candidates:
+            if archive_conversation(conversation):
+                archived += 1
+            else:
+                failed_ids.append(conversation["id"])
+
+    logger.info(f"Archived {archived} conversations ({len(failed_ids)} failed)")
+    return archived
+
+
+def load_archived_messages(
+    conversation_id: str, cache: bool = True
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Messages of an archived conversation, or None if it has no bundle.
+    Callers check conversations.archived_at first, so live conversations
+    never touch the store. Recently loaded bundles are served from an LRU
+    cache; bulk readers (exports) pass cache=False to leave it alone.
+    """
+    cached = _bundle_cache.get(conversation_id)
+    if cached is not None:
+        return cached
+
+    data = archive_store.get(archive_key(conversation_id))
+    if data is None:
+        return None
+
+    messages = json.loads(gzip.decompress(data))["messages"]
+    if cache:
+        _bundle_cache.set(conversation_id, messages)
+    return messages
+
+
+def delete_archive(conversation_id: str) -> None:
+    """Remove the bundle of a conversation (if any)"""
+    _bundle_cache.invalidate(conversation_id)
+    archive_store.delete(archive_key(conversation_id))
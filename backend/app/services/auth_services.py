@@ -1,8 +1,15 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from fastapi import HTTPException
+from supabase_auth.errors import AuthRetryableError
 
-from app.core.config import supabase_
+from app.core.cache import TTLCache
+from app.core.config import Config, supabase_
+
+# user_id -> profiles row, shared by every role check
+_profile_cache = TTLCache(
+    maxsize=Config.PROFILE_CACHE_SIZE, ttl=Config.PROFILE_CACHE_TTL_SECONDS
+)
 
 
 def get_user_from_token(token: str) -> Any:
@@ -12,6 +19,9 @@ def get_user_from_token(token: str) -> Any:
         if not user_response or not user_response.user:
             raise HTTPException(status_code=401, detail="Token inválido")
         return user_response.user
+    except AuthRetryableError:
+        # Auth no disponible: no es un token inválido, se puede reintentar
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail="Token inválido") from e
 
@@ -35,6 +45,7 @@ def register_user(email: str, password: str, full_name: str, role: str = "user")
         supabase_.table("profiles").insert(
             {"id": user_id, "full_name": full_name, "role": role}
         ).execute()
+        invalidate_profile(user_id)
 
         return response.user
     except Exception as e:
@@ -61,48 +72,37 @@ def login_user(email: str, password: str) -> str:
         raise HTTPException(status_code=400, detail=f"Error en login: {error_msg}")
 
 
+def get_profile(user_id: str) -> Dict[str, Any]:
+    """
+    Obtener el perfil (fila de profiles) de un usuario.
+    Se sirve desde una caché con TTL; llamar a invalidate_profile al modificarlo.
+    """
+    cached = _profile_cache.get(user_id)
+    if cached is not None:
+        return dict(cached)
+
+    profile = (
+        supabase_.table("profiles").select("*").eq("id", user_id).single().execute()
+    )
+
+    if not profile.data:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    _profile_cache.set(user_id, profile.data)
+    return dict(profile.data)
+
+
+def get_user_role(user_id: str) -> Optional[str]:
+    """Obtener el rol de un usuario ('user', 'agent', ...) desde la caché de perfiles"""
+    return get_profile(user_id).get("role")
+
+
+def invalidate_profile(user_id: str) -> None:
+    """Descartar el perfil cacheado de un usuario (llamar al cambiar su perfil)"""
+    _profile_cache.invalidate(user_id)
+
+
 def get_user_info(user: Any) -> Dict[str, Any]:
     """Obtener información del usuario desde la tabla profiles"""
-    import time
-    from httpx import ReadError, ConnectError, TimeoutException
-
-    user_id = user.id
-
-    # Retry logic para manejar errores de conexión HTTP/2
-    max_retries = 3
-    retry_delay = 0.5  # segundos
-
-    for attempt in range(max_retries):
-        try:
-            profile = (
-                supabase_.table("profiles")
-                .select("*")
-                .eq("id", user_id)
-                .single()
-                .execute()
-            )
-
-            if not profile.data:
-                raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-            user_data = user.model_dump()
-            response = {**user_data, **profile.data}
-            return response
-
-        except (ReadError, ConnectError, TimeoutException) as e:
-            if attempt < max_retries - 1:
-                print(
-                    f"⚠️ Connection error in get_user_info (attempt {attempt + 1}/{max_retries}): {e}"
-                )
-                time.sleep(retry_delay * (attempt + 1))  # Exponential backoff
-                continue
-            else:
-                print(f"❌ Failed to get user info after {max_retries} attempts: {e}")
-                raise HTTPException(
-                    status_code=503,
-                    detail="Error de conexión con la base de datos. Por favor, intente nuevamente.",
-                )
-        except Exception as e:
-            # Otros errores no son reintentos
-            print(f"❌ Unexpected error in get_user_info: {e}")
-            raise
+    user_data = user.model_dump()
+    return {**user_data, **get_profile(user.id)}
@@ -0,0 +1,154 @@
+"""
+Auto-Assign Service
+Matches pending agent requests to available agents on a fixed tick, so
+requests don't wait for an agent to click "take".
+
+Each tick reloads the agent queue from the database (other workers escalate
+and take requests too) and walks it in service order (priority with aging,
+see agent_queue_service), giving each request that has waited at least
+AUTO_ASSIGN_GRACE_SECONDS to the least-loaded agent that is accepting cases
+and below its capacity (profiles.max_cases). Ties go to the agent who was
+assigned least recently. Claims go through assign_request_to_agent, i.e. the
+atomic claim RPC, so manual takes and other workers can't double-assign.
+
+The clock and the data sources are injectable, so a tick can be unit-tested
+without a database or real time.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import Config
+from app.core.timeutil import epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class AutoAssigner:
+    """
+    Args:
+        fetch_agents: () -> [{"id", "max_cases", "load"}] of agents accepting cases
+        fetch_pending: () -> pending requests in service order ({"id", "escalated_at"})
+        assign: (request_id, agent_id) -> claim; raises HTTPException(409) if lost
+        clock: () -> seconds since epoch
+        grace_seconds: Minimum wait before a request is auto-assigned
+    """
+
+    def __init__(
+        self,
+        fetch_agents: Callable[[], List[Dict[str, Any]]],
+        fetch_pending: Callable[[], List[Dict[str, Any]]],
+        assign: Callable[[str, str], Any],
+        clock: Callable[[], float] = time.time,
+        grace_seconds: float = 0,
+    ):
+        self.fetch_agents = fetch_agents
+        self.fetch_pending = fetch_pending
+        self.assign = assign
+        self.clock = clock
+        self.grace_seconds = grace_seconds
+        self._last_assigned: Dict[str, float] = {}
+
+    def tick(self) -> List[Tuple[str, str]]:
+        """Run one matching round. Returns the (request_id, agent_id) assigned."""
+        now = self.clock()
+        due = [
+            request
+            for request in self.fetch_pending()
+            if (epoch_seconds(request.get("escalated_at")) or 0.0)
+            <= now - self.grace_seconds
+        ]
+        if not due:
+            return []
+
+        # (load, last assigned at, agent_id) -> least loaded first
+        agents: List[Tuple[int, float, str]] = []
+        capacity: Dict[str, int] = {}
+        for agent in self.fetch_agents():
+            if agent["load"] < agent["max_cases"]:
+                capacity[agent["id"]] = agent["max_cases"]
+                agents.append(
+                    (
+                        agent["load"],
+                        self._last_assigned.get(agent["id"], 0.0),
+                        agent["id"],
+                    )
+                )
+        heapq.heapify(agents)
+
+        assigned: List[Tuple[str, str]] = []
+        for request in due:
+            if not agents:
+                break
+
+            load, last, agent_id = heapq.heappop(agents)
+            try:
+                self.assign(request["id"], agent_id)
+            except HTTPException as e:
+                # 409: the request was taken meanwhile or the agent filled up
+                # with manual takes; the agent sits out until the next tick
+                if e.status_code != 409:
+                    logger.error(f"Auto-assign of {request['id']} failed: {e.detail}")
+                continue
+
+            assigned.append((request["id"], agent_id))
+            self._last_assigned[agent_id] = now
+            if load + 1 < capacity[agent_id]:
+                heapq.heappush(agents, (load + 1, now, agent_id))
+
+        if assigned:
+            logger.info(f"Auto-assigned {len(assigned)} requests")
+        return assigned
+
+    async def run(self, interval: float) -> None:
+        """Tick forever (until cancelled), off the event loop"""
+        while True:
+            try:
+                await run_in_threadpool(self.tick)
+            except Exception as e:
+                logger.error(f"Error in auto-assign tick: {e}")
+            await asyncio.sleep(interval)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start_auto_assign() -> None:
+    """Start the auto-assign loop in the running event loop (if enabled)"""
+    global _task
+    if not Config.AUTO_ASSIGN_ENABLED:
+        return
+
+    # Imported here so AutoAssigner can be tested without the service graph
+    from app.services.agent_queue_service import agent_queue
+    from app.services.agent_service import assign_request_to_agent, get_available_agents
+
+    assigner = AutoAssigner(
+        fetch_agents=get_available_agents,
+        fetch_pending=agent_queue.refresh,
+        assign=assign_request_to_agent,
+        grace_seconds=Config.AUTO_ASSIGN_GRACE_SECONDS,
+    )
+    _task = asyncio.create_task(assigner.run(Config.AUTO_ASSIGN_TICK_SECONDS))
+    logger.info(
+        f"Auto-assign started (every {Config.AUTO_ASSIGN_TICK_SECONDS}s, "
+        f"grace {Config.AUTO_ASSIGN_GRACE_SECONDS}s)"
+    )
+
+
+async def stop_auto_assign() -> None:
+    """Cancel the auto-assign loop"""
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
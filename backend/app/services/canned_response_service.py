@@ -0,0 +1,194 @@
+"""
+Servicio de respuestas predefinidas para agentes.
+
+Biblioteca compartida de respuestas que los agentes insertan al escribir. El
+autocompletado se sirve desde un trie de prefijos en memoria (atajo y
+palabras del título) cuyos nodos guardan las respuestas más usadas, así que
+sugerir no toca la base de datos. El trie vive en una TTLCache, como las demás
+cachés de datos de referencia: se descarta al crear, editar o borrar una
+respuesta y se reconstruye en la siguiente consulta; el TTL cubre los cambios
+hechos por otros workers. Los usos solo reordenan el trie, sin reconstruirlo.
+
+Crear en el SQL Editor de Supabase:
+
+CREATE TABLE IF NOT EXISTS canned_responses (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  title TEXT NOT NULL,
+  shortcut TEXT UNIQUE,                      -- p. ej. 'horario' (se escribe /horario)
+  content TEXT NOT NULL,
+  usage_count INT NOT NULL DEFAULT 0,
+  created_by UUID REFERENCES profiles(id),
+  created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+  updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+
+CREATE OR REPLACE FUNCTION increment_canned_response_usage(p_id UUID)
+RETURNS INT AS $$
+  UPDATE canned_responses SET usage_count = usage_count + 1
+  WHERE id = p_id
+  RETURNING usage_count;
+$$ LANGUAGE sql;
+"""
+
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.cache import TTLCache
+from app.core.config import Config, supabase_
+from app.core.trie import PrefixTrie
+
+logger = logging.getLogger(__name__)
+
+# Sugerencias guardadas por nodo del trie (tope del parámetro limit)
+MAX_SUGGESTIONS = 10
+INDEX_KEY = "index"
+
+# Un único valor: (trie, {id: respuesta})
+_index_cache = TTLCache(maxsize=1, ttl=Config.CANNED_RESPONSES_CACHE_TTL_SECONDS)
+
+
+def get_utc_timestamp() -> str:
+    """
+    Obtener timestamp UTC en formato compatible con Supabase.
+    Supabase espera formato ISO sin timezone explícito (naive UTC).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def response_keys(response: Dict[str, Any]) -> List[str]:
+    """Claves de autocompletado: el atajo y cada palabra del título"""
+    keys = [word for word in re.split(r"\W+", response["title"]) if len(word) > 1]
+    if response.get("shortcut"):
+        keys.append(response["shortcut"].lstrip("/"))
+    return keys
+
+
+def build_index(
+    responses: List[Dict[str, Any]],
+) -> Tuple[PrefixTrie, Dict[str, Dict[str, Any]]]:
+    trie = PrefixTrie(k=MAX_SUGGESTIONS)
+    for response in responses:
+        trie.insert(response["id"], response_keys(response), response["usage_count"])
+    return trie, {response["id"]: response for response in responses}
+
+
+def _get_index() -> Tuple[PrefixTrie, Dict[str, Dict[str, Any]]]:
+    index = _index_cache.get(INDEX_KEY)
+    if index is None:
+        index = build_index(list_canned_responses())
+        _index_cache.set(INDEX_KEY, index)
+        logger.info(f"Trie de respuestas predefinidas: {len(index[0])} respuestas")
+    return index
+
+
+def invalidate_canned_responses() -> None:
+    """Descartar el trie (se reconstruye en la siguiente sugerencia)"""
+    _index_cache.invalidate(INDEX_KEY)
+
+
+def list_canned_responses() -> List[Dict[str, Any]]:
+    """Todas las respuestas predefinidas, las más usadas primero"""
+    response = (
+        supabase_.table("canned_responses")
+        .select("*")
+        .order("usage_count", desc=True)
+        .order("title")
+        .execute()
+    )
+    return response.data or []
+
+
+def suggest_canned_responses(prefix: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Respuestas cuyo atajo o alguna palabra del título empieza por prefix
+    (sin distinguir mayúsculas ni acentos), ordenadas por uso.
+    """
+    trie, responses = _get_index()
+    ids = trie.search(prefix.strip().lstrip("/"), limit=min(limit, MAX_SUGGESTIONS))
+    return [responses[response_id] for response_id in ids]
+
+
+def create_canned_response(
+    title: str, content: str, shortcut: Optional[str], agent_id: str
+) -> Dict[str, Any]:
+    """Crear una respuesta predefinida"""
+    response = (
+        supabase_.table("canned_responses")
+        .insert(
+            {
+                "title": title,
+                "content": content,
+                "shortcut": shortcut,
+                "created_by": agent_id,
+            }
+        )
+        .execute()
+    )
+    invalidate_canned_responses()
+
+    if not response.data:
+        raise HTTPException(status_code=500, detail="Error creando respuesta")
+    return response.data[0]
+
+
+def update_canned_response(
+    response_id: str, title: str, content: str, shortcut: Optional[str]
+) -> Dict[str, Any]:
+    """Editar una respuesta predefinida"""
+    response = (
+        supabase_.table("canned_responses")
+        .update(
+            {
+                "title": title,
+                "content": content,
+                "shortcut": shortcut,
+                "updated_at": get_utc_timestamp(),
+            }
+        )
+        .eq("id", response_id)
+        .execute()
+    )
+    invalidate_canned_responses()
+
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Respuesta no encontrada")
+    return response.data[0]
+
+
+def delete_canned_response(response_id: str) -> None:
+    """Eliminar una respuesta predefinida"""
+    response = (
+        supabase_.table("canned_responses").delete().eq("id", response_id).execute()
+    )
+    invalidate_canned_responses()
+
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Respuesta no encontrada")
+
+
+def record_canned_response_use(response_id: str) -> None:
+    """
+    Contar un uso de la respuesta: se incrementa en la base de datos y se
+    reordena en el trie actual, sin reconstruirlo.
+    """
+    try:
+        result = supabase_.rpc(
+            "increment_canned_response_usage", {"p_id": response_id}
+        ).execute()
+    except Exception as e:
+        logger.error(f"Error contando uso de respuesta {response_id}: {e}")
+        return
+
+    usage_count = result.data
+    index = _index_cache.get(INDEX_KEY)
+    if index is None or not isinstance(usage_count, int):
+        return
+
+    trie, responses = index
+    if response_id in responses:
+        responses[response_id]["usage_count"] = usage_count
+        trie.update_score(response_id, usage_count)
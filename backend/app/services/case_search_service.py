@@ -0,0 +1,231 @@
+"""
+Servicio de búsqueda de casos resueltos.
+
+Cada solicitud resuelta se indexa una vez, al resolverse: su título, el
+resumen del escalamiento y la transcripción se guardan en resolved_cases, cuya
+columna tsvector tiene un índice GIN (índice invertido que Postgres mantiene
+de forma incremental con cada inserción). Buscar cuesta una consulta al
+índice y solo se calculan los fragmentos de los resultados de la página, así
+que el tiempo no crece con el número de casos.
+
+Crear en el SQL Editor de Supabase:
+
+CREATE TABLE IF NOT EXISTS resolved_cases (
+  request_id UUID PRIMARY KEY REFERENCES agent_requests(id) ON DELETE CASCADE,
+  conversation_id UUID NOT NULL,
+  agent_id UUID,
+  headline TEXT NOT NULL DEFAULT '',   -- título + intención + pregunta abierta
+  content TEXT NOT NULL DEFAULT '',    -- transcripción
+  summary JSONB,
+  resolved_at TIMESTAMP NOT NULL,
+  content_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('spanish', headline), 'A') ||
+    setweight(to_tsvector('spanish', content), 'B')
+  ) STORED
+);
+CREATE INDEX IF NOT EXISTS resolved_cases_tsv_idx
+  ON resolved_cases USING GIN (content_tsv);
+
+-- p_match_any: cualquier término basta (casos similares) en lugar de todos
+CREATE OR REPLACE FUNCTION search_resolved_cases(
+  p_query TEXT, p_limit INT DEFAULT 10, p_match_any BOOLEAN DEFAULT FALSE,
+  p_exclude_request_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+  request_id UUID, conversation_id UUID, agent_id UUID, headline TEXT,
+  summary JSONB, resolved_at TIMESTAMP, rank REAL, snippet TEXT
+) AS $$
+  WITH q AS (
+    SELECT CASE WHEN p_match_any
+             THEN replace(plainto_tsquery('spanish', p_query)::TEXT, '&', '|')::tsquery
+             ELSE websearch_to_tsquery('spanish', p_query)
+           END AS query
+  ),
+  top AS (
+    SELECT r.*, ts_rank_cd(r.content_tsv, q.query) AS rank
+    FROM resolved_cases r, q
+    WHERE r.content_tsv @@ q.query
+      AND r.request_id IS DISTINCT FROM p_exclude_request_id
+    ORDER BY rank DESC, r.resolved_at DESC
+    LIMIT p_limit
+  )
+  SELECT t.request_id, t.conversation_id, t.agent_id, t.headline, t.summary,
+         t.resolved_at, t.rank,
+         ts_headline('spanish',
+                     replace(replace(replace(t.content, '&', '&amp;'),
+                                     '<', '&lt;'), '>', '&gt;'),
+                     q.query,
+                     'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10')
+  FROM top t, q
+  ORDER BY t.rank DESC, t.resolved_at DESC;
+$$ LANGUAGE sql STABLE;
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.core.config import supabase_
+from app.core.pagination import keyset_after
+from app.core.retry import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+# Texto indexado por caso (las transcripciones largas se recortan)
+MAX_CONTENT_CHARS = 20000
+BACKFILL_PAGE_SIZE = 200
+
+_index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="case-index")
+
+
+def build_case_document(
+    request: Dict[str, Any],
+    title: Optional[str],
+    messages: List[Dict[str, Any]],
+    resolved_at: str,
+) -> Dict[str, Any]:
+    """Fila de resolved_cases para una solicitud resuelta"""
+    summary = request.get("summary") or {}
+    headline = " · ".join(
+        part
+        for part in (title, summary.get("intent"), summary.get("open_question"))
+        if part
+    )
+    content = "\n".join(
+        f"{msg['role']}: {msg['content']}" for msg in messages if msg.get("content")
+    )
+    return {
+        "request_id": request["id"],
+        "conversation_id": request["conversation_id"],
+        "agent_id": request.get("agent_id"),
+        "headline": headline,
+        "content": content[:MAX_CONTENT_CHARS],
+        "summary": request.get("summary"),
+        "resolved_at": resolved_at,
+    }
+
+
+def index_resolved_case(request_id: str) -> None:
+    """Agregar (o reemplazar) una solicitud resuelta en el índice de búsqueda"""
+    try:
+        request = call_with_retry(
+            lambda: supabase_.table("agent_requests")
+            .select("*, conversations:conversation_id (title)")
+            .eq("id", request_id)
+            .single()
+            .execute(),
+            "load resolved case",
+        ).data
+        messages = (
+            call_with_retry(
+                lambda: supabase_.table("messages")
+                .select("role, content")
+                .eq("conversation_id", request["conversation_id"])
+                .order("timestamp")
+                .execute(),
+                "load resolved case messages",
+            ).data
+            or []
+        )
+
+        document = build_case_document(
+            request,
+            (request.get("conversations") or {}).get("title"),
+            messages,
+            request.get("resolved_at") or request.get("updated_at"),
+        )
+        call_with_retry(
+            lambda: supabase_.table("resolved_cases")
+            .upsert(document, on_conflict="request_id")
+            .execute(),
+            "index resolved case",
+        )
+    except Exception as e:
+        logger.error(f"Error indexando caso resuelto {request_id}: {e}")
+
+
+def schedule_case_indexing(request_id: str) -> None:
+    """Indexar el caso en segundo plano (no retrasa la resolución)"""
+    _index_executor.submit(index_resolved_case, request_id)
+
+
+def backfill_resolved_cases() -> int:
+    """
+    Indexar las solicitudes resueltas antes de existir el índice (una sola vez):
+        python -c "from app.services.case_search_service import backfill_resolved_cases; backfill_resolved_cases()"
+    """
+    cursor = None
+    indexed = 0
+    while True:
+        query = (
+            supabase_.table("agent_requests")
+            .select("id, created_at")
+            .eq("status", "resolved")
+        )
+        if cursor:
+            query = query.or_(keyset_after("created_at", *cursor))
+        rows = (
+            call_with_retry(
+                query.order("created_at").order("id").limit(BACKFILL_PAGE_SIZE).execute,
+                "list resolved cases to backfill",
+            ).data
+            or []
+        )
+
+        for row in rows:
+            index_resolved_case(row["id"])
+        indexed += len(rows)
+
+        if len(rows) < BACKFILL_PAGE_SIZE:
+            break
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+    logger.info(f"Casos resueltos indexados: {indexed}")
+    return indexed
+
+
+def search_resolved_cases(
+    query: str,
+    limit: int = 10,
+    match_any: bool = False,
+    exclude_request_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Casos resueltos ordenados por relevancia, cada uno con un fragmento de la
+    transcripción (coincidencias entre <mark>...</mark>). La transcripción se
+    escapa como HTML antes de resaltar: <mark> es la única etiqueta del
+    fragmento.
+    """
+    response = supabase_.rpc(
+        "search_resolved_cases",
+        {
+            "p_query": query,
+            "p_limit": limit,
+            "p_match_any": match_any,
+            "p_exclude_request_id": exclude_request_id,
+        },
+    ).execute()
+    return response.data or []
+
+
+def find_similar_cases(request_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Casos resueltos parecidos a una solicitud, buscando por su resumen
+    (intención y pregunta abierta) con cualquiera de sus términos.
+    """
+    request = (
+        supabase_.table("agent_requests")
+        .select("id, summary")
+        .eq("id", request_id)
+        .maybe_single()
+        .execute()
+    )
+    summary = ((request.data if request else None) or {}).get("summary") or {}
+    query = " ".join(
+        part for part in (summary.get("intent"), summary.get("open_question")) if part
+    )
+    if not query:
+        return []
+    return search_resolved_cases(
+        query, limit=limit, match_any=True, exclude_request_id=request_id
+    )
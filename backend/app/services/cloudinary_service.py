@@ -2,9 +2,13 @@
 Servicio para gestionar la subida de imágenes a Cloudinary
 """
 
+from typing import List, Optional
+
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
 from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import Config
 import logging
 
@@ -103,19 +107,8 @@ class CloudinaryService:
             bool: True si se eliminó exitosamente
         """
         try:
-            # Extraer public_id de la URL
-            # Ejemplo URL: https://res.cloudinary.com/cloud_name/image/upload/v123456/chat_images/abc123.jpg
-            # public_id sería: chat_images/abc123
-
-            parts = image_url.split("/")
-            if "upload" in parts:
-                upload_index = parts.index("upload")
-                # Obtener todo después de 'upload/vXXXXXX/'
-                public_id_parts = parts[upload_index + 2 :]  # Saltar 'upload' y version
-                public_id = "/".join(public_id_parts).rsplit(".", 1)[
-                    0
-                ]  # Remover extensión
-
+            public_id = CloudinaryService.public_id_from_url(image_url)
+            if public_id:
                 result = cloudinary.uploader.destroy(public_id)
                 logger.info(f"Imagen eliminada: {public_id}, resultado: {result}")
                 return result.get("result") == "ok"
@@ -126,5 +119,58 @@ class CloudinaryService:
             logger.error(f"Error eliminando imagen de Cloudinary: {str(e)}")
             return False
 
+    @staticmethod
+    async def delete_images(image_urls: List[str]) -> int:
+        """
+        Elimina varias imágenes de Cloudinary en lotes (hasta 100 por llamada)
+
+        Args:
+            image_urls: URLs de las imágenes a eliminar
+
+        Returns:
+            int: Número de imágenes eliminadas
+        """
+        public_ids = [
+            public_id
+            for public_id in map(CloudinaryService.public_id_from_url, image_urls)
+            if public_id
+        ]
+        deleted = 0
+
+        # La Admin API acepta hasta 100 public_ids por llamada. El SDK es
+        # bloqueante: cada lote corre en el threadpool para no frenar el loop
+        for i in range(0, len(public_ids), 100):
+            batch = public_ids[i : i + 100]
+            try:
+                result = await run_in_threadpool(
+                    cloudinary.api.delete_resources, batch, resource_type="image"
+                )
+                deleted += sum(
+                    1
+                    for status in result.get("deleted", {}).values()
+                    if status == "deleted"
+                )
+            except Exception as e:
+                logger.error(f"Error eliminando lote de imágenes de Cloudinary: {e}")
+
+        logger.info(f"Imágenes eliminadas en lote: {deleted}/{len(public_ids)}")
+        return deleted
+
+    @staticmethod
+    def public_id_from_url(image_url: str) -> Optional[str]:
+        """
+        Extrae el public_id de una URL de Cloudinary
+        Ejemplo URL: https://res.cloudinary.com/cloud_name/image/upload/v123456/chat_images/abc123.jpg
+        public_id sería: chat_images/abc123
+        """
+        parts = image_url.split("/")
+        if "upload" not in parts:
+            return None
+
+        upload_index = parts.index("upload")
+        # Obtener todo después de 'upload/vXXXXXX/'
+        public_id_parts = parts[upload_index + 2 :]  # Saltar 'upload' y version
+        return "/".join(public_id_parts).rsplit(".", 1)[0]  # Remover extensión
+
 
 cloudinary_service = CloudinaryService()
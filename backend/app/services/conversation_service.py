@@ -1,13 +1,36 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from openai import OpenAI
+from app.core.cache import TTLCache
 from app.core.config import supabase_, Config
+from app.core.pagination import keyset_after
+from app.core.retry import call_with_retry, is_connect_error
+from app.services import archive_service, rating_analytics_service
+from app.services.agent_metrics_service import agent_metrics
+from app.services.agent_queue_service import agent_queue
+from app.services.escalation_summary_service import schedule_escalation_summary
+from app.services.message_journal_service import get_message_journal
+from app.services.realtime_service import manager as realtime_manager
 
 client = OpenAI(
     base_url="https://openrouter.ai/api/v1",
     api_key=Config.OPENROUTER_API_KEY,
 )
 
+# Runs the independent reads of get_conversation_snapshot concurrently
+_snapshot_executor = ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="conversation-snapshot"
+)
+
+# conversation_id -> {"user_id", "is_escalated", "archived_at"}, used for
+# ownership checks and to read archive bundles only for archived conversations
+_conversation_access_cache = TTLCache(
+    maxsize=Config.CONVERSATION_CACHE_SIZE,
+    ttl=Config.CONVERSATION_CACHE_TTL_SECONDS,
+)
+
 
 def get_utc_timestamp() -> str:
     """
@@ -23,8 +46,8 @@ def create_conversation(user_id: str) -> Dict[str, Any]:
     Returns the conversation_id and created_at timestamp.
     """
     try:
-        response = (
-            supabase_.table("conversations")
+        response = call_with_retry(
+            lambda: supabase_.table("conversations")
             .insert(
                 {
                     "user_id": user_id,
@@ -32,10 +55,13 @@ def create_conversation(user_id: str) -> Dict[str, Any]:
                     "is_escalated": False,
                 }
             )
-            .execute()
+            .execute(),
+            "create conversation",
+            retryable=is_connect_error,
         )
 
         if response.data:
+            _remember_conversation(response.data[0])
             return {
                 "conversation_id": response.data[0]["id"],
                 "created_at": response.data[0]["created_at"],
@@ -64,7 +90,10 @@ def get_conversation(conversation_id: str, user_id: str) -> Optional[Dict[str, A
             .execute()
         )
 
-        return response.data if response.data else None
+        if response and response.data:
+            _remember_conversation(response.data)
+            return response.data
+        return None
 
     except Exception as e:
         print(
@@ -73,6 +102,242 @@ def get_conversation(conversation_id: str, user_id: str) -> Optional[Dict[str, A
         return None
 
 
+def _remember_conversation(conversation: Dict[str, Any]) -> None:
+    """Cache the owner and escalation state of a conversation row."""
+    _conversation_access_cache.set(
+        conversation["id"],
+        {
+            "user_id": conversation["user_id"],
+            "is_escalated": conversation.get("is_escalated", False),
+            "archived_at": conversation.get("archived_at"),
+        },
+    )
+
+
+def invalidate_conversation_cache(conversation_id: str) -> None:
+    """Drop a conversation from the ownership cache."""
+    _conversation_access_cache.invalidate(conversation_id)
+
+
+def get_conversation_access(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the owner and escalation state of a conversation.
+    Served from the ownership cache; falls back to a narrow select on a miss.
+    """
+    cached = _conversation_access_cache.get(conversation_id)
+    if cached is not None:
+        return cached
+
+    try:
+        response = call_with_retry(
+            lambda: supabase_.table("conversations")
+            .select("id, user_id, is_escalated, archived_at")
+            .eq("id", conversation_id)
+            .maybe_single()
+            .execute(),
+            "get conversation access",
+        )
+
+        if not response or not response.data:
+            return None
+
+        _remember_conversation(response.data)
+        return _conversation_access_cache.get(conversation_id)
+
+    except Exception as e:
+        print(f"Error getting conversation access (id={conversation_id}): {e}")
+        return None
+
+
+def user_owns_conversation(conversation_id: str, user_id: str) -> bool:
+    """
+    Check that a conversation belongs to the user without loading the full row.
+    """
+    access = get_conversation_access(conversation_id)
+    return access is not None and access["user_id"] == user_id
+
+
+def is_conversation_archived(conversation_id: str) -> bool:
+    """
+    Whether the conversation has been archived (archived_at is set).
+    Read from the database, not the ownership cache: only the worker that
+    archives a conversation invalidates its entry, and a stale "not archived"
+    would hide the whole history on the other workers.
+    """
+    response = call_with_retry(
+        lambda: supabase_.table("conversations")
+        .select("archived_at")
+        .eq("id", conversation_id)
+        .maybe_single()
+        .execute(),
+        "check conversation archived",
+    )
+    return bool(response and response.data and response.data.get("archived_at"))
+
+
+def _load_archived_messages(conversation_id: str) -> List[Dict[str, Any]]:
+    """Archived messages of the conversation ([] unless it is archived)"""
+    if not is_conversation_archived(conversation_id):
+        return []
+    return archive_service.load_archived_messages(conversation_id) or []
+
+
+def get_conversation_with_escalation(
+    conversation_id: str, user_id: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve a conversation (of the user, if given) together with its
+    agent_requests (embedded PostgREST select, one round trip).
+    """
+    try:
+        query = (
+            supabase_.table("conversations")
+            .select("*, agent_requests(id, status, assigned_at, resolved_at, agent_id)")
+            .eq("id", conversation_id)
+        )
+        if user_id:
+            query = query.eq("user_id", user_id)
+
+        response = query.maybe_single().execute()
+
+        if response and response.data:
+            _remember_conversation(response.data)
+            return response.data
+        return None
+
+    except Exception as e:
+        print(f"Error getting conversation with escalation (id={conversation_id}): {e}")
+        return None
+
+
+def get_agent_name(agent_id: str) -> Optional[str]:
+    """Get the display name of an agent."""
+    try:
+        response = (
+            supabase_.table("profiles").select("full_name").eq("id", agent_id).execute()
+        )
+        if response.data and len(response.data) > 0:
+            return response.data[0].get("full_name")
+        return None
+
+    except Exception as e:
+        print(f"Error getting agent name (id={agent_id}): {e}")
+        return None
+
+
+def build_escalation_status(
+    conversation: Dict[str, Any], agent_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build the escalation status of a conversation fetched with
+    get_conversation_with_escalation.
+    """
+    escalation_data = {
+        "is_escalated": conversation.get("is_escalated", False),
+        "escalated_at": conversation.get("escalated_at"),
+        "resolved": conversation.get("resolved", False),
+        "resolved_at": conversation.get("resolved_at"),
+        "agent_request": None,
+    }
+
+    agent_requests = conversation.get("agent_requests") or []
+    if agent_requests:
+        agent_req = agent_requests[0]
+        escalation_data["agent_request"] = {
+            "id": agent_req["id"],
+            "status": agent_req["status"],
+            "assigned_at": agent_req.get("assigned_at"),
+            "resolved_at": agent_req.get("resolved_at"),
+            "agent_name": agent_name,
+        }
+
+    return escalation_data
+
+
+def _assigned_agent_id(conversation: Dict[str, Any]) -> Optional[str]:
+    agent_requests = conversation.get("agent_requests") or []
+    return agent_requests[0].get("agent_id") if agent_requests else None
+
+
+def get_escalation_status(
+    conversation_id: str, user_id: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Get the escalation status of a user's conversation, or None if it
+    doesn't exist or belongs to someone else.
+    """
+    conversation = get_conversation_with_escalation(conversation_id, user_id)
+    if not conversation:
+        return None
+
+    agent_id = _assigned_agent_id(conversation)
+    agent_name = get_agent_name(agent_id) if agent_id else None
+    return build_escalation_status(conversation, agent_name)
+
+
+def publish_escalation_status(conversation_id: str) -> None:
+    """
+    Push the current escalation status to the clients connected to the
+    conversation's WebSocket room, so they don't have to poll for it.
+    Nothing is queried when nobody is listening.
+    """
+    if not realtime_manager.has_listeners(conversation_id):
+        return
+
+    conversation = get_conversation_with_escalation(conversation_id)
+    if not conversation:
+        return
+
+    agent_id = _assigned_agent_id(conversation)
+    agent_name = get_agent_name(agent_id) if agent_id else None
+    realtime_manager.notify_conversation(
+        conversation_id,
+        {
+            "type": "escalation_status",
+            "status": build_escalation_status(conversation, agent_name),
+        },
+    )
+
+
+def get_conversation_snapshot(
+    conversation_id: str, user_id: str, message_limit: int = 50
+) -> Optional[Dict[str, Any]]:
+    """
+    Everything needed to open a chat in one call: the conversation, a page of
+    messages, the escalation state and the assigned agent's name.
+    The conversation (with its agent_requests embedded) and the messages are
+    fetched concurrently.
+    Returns None if the conversation doesn't exist or belongs to someone else.
+    """
+    # Cheap rejection from the ownership cache before firing both queries
+    cached = _conversation_access_cache.get(conversation_id)
+    if cached is not None and cached["user_id"] != user_id:
+        return None
+
+    conversation_future = _snapshot_executor.submit(
+        get_conversation_with_escalation, conversation_id, user_id
+    )
+    messages_future = _snapshot_executor.submit(
+        get_conversation_messages, conversation_id, message_limit
+    )
+
+    conversation = conversation_future.result()
+    if not conversation:
+        messages_future.cancel()
+        return None
+
+    agent_id = _assigned_agent_id(conversation)
+    agent_name = get_agent_name(agent_id) if agent_id else None
+    escalation = build_escalation_status(conversation, agent_name)
+    conversation.pop("agent_requests", None)
+
+    return {
+        "conversation": conversation,
+        "messages": messages_future.result(),
+        "escalation": escalation,
+    }
+
+
 def get_user_conversations(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
     """
     Get all conversations for a user, ordered by most recent.
@@ -94,6 +359,20 @@ def get_user_conversations(user_id: str, limit: int = 50) -> List[Dict[str, Any]
         for conv in conversations:
             conv_id = conv["id"]
 
+            if conv.get("archived_at"):
+                # Archived stubs keep their own summary; only count new messages
+                count_response = (
+                    supabase_.table("messages")
+                    .select("id", count="exact")
+                    .eq("conversation_id", conv_id)
+                    .execute()
+                )
+                conv["message_count"] = (conv.get("archived_message_count") or 0) + (
+                    count_response.count or 0
+                )
+                conv["last_message"] = conv.get("archived_last_message")
+                continue
+
             # Get message count
             count_response = (
                 supabase_.table("messages")
@@ -132,6 +411,108 @@ def get_user_conversations(user_id: str, limit: int = 50) -> List[Dict[str, Any]
         return []
 
 
+def search_conversations(
+    user_id: str, query: str, limit: int = 20, offset: int = 0
+) -> Dict[str, Any]:
+    """
+    Full-text search over the content of a user's messages.
+    Returns conversations ranked by relevance, each with a highlighted snippet
+    (matches wrapped in <mark>...</mark>) of its best matching message. The
+    content is HTML-escaped before highlighting, so <mark> is the only markup
+    in a snippet and it can be rendered as HTML.
+
+    Archived conversations are not searched: their messages live in archive
+    bundles, outside the index, so the function skips them instead of
+    matching only the messages written after the archive.
+
+    Backed by a GIN-indexed tsvector column and an RPC function. Create them in
+    the Supabase SQL Editor:
+
+    ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+      GENERATED ALWAYS AS (to_tsvector('spanish', coalesce(content, ''))) STORED;
+    CREATE INDEX IF NOT EXISTS messages_content_tsv_idx
+      ON messages USING GIN (content_tsv);
+    CREATE INDEX IF NOT EXISTS conversations_user_id_idx
+      ON conversations (user_id);
+
+    CREATE OR REPLACE FUNCTION search_user_messages(
+      p_user_id UUID, p_query TEXT, p_limit INT DEFAULT 20, p_offset INT DEFAULT 0
+    )
+    RETURNS TABLE (
+      conversation_id UUID, title TEXT, last_message_at TIMESTAMP,
+      rank REAL, match_count BIGINT, message_id UUID, snippet TEXT,
+      total_count BIGINT
+    ) AS $$
+      WITH q AS (SELECT websearch_to_tsquery('spanish', p_query) AS query),
+      hits AS (
+        SELECT m.id, m.conversation_id, m.content,
+               ts_rank_cd(m.content_tsv, q.query) AS rank
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id, q
+        WHERE c.user_id = p_user_id AND c.archived_at IS NULL
+          AND m.content_tsv @@ q.query
+      ),
+      best AS (
+        SELECT DISTINCT ON (conversation_id) conversation_id, id, content,
+               count(*) OVER (PARTITION BY conversation_id) AS match_count,
+               sum(rank) OVER (PARTITION BY conversation_id) AS total_rank
+        FROM hits
+        ORDER BY conversation_id, rank DESC
+      ),
+      page AS (
+        SELECT b.*, c.title, c.last_message_at, count(*) OVER () AS total_count
+        FROM best b JOIN conversations c ON c.id = b.conversation_id
+        ORDER BY b.total_rank DESC, c.last_message_at DESC
+        LIMIT p_limit OFFSET p_offset
+      )
+      SELECT p.conversation_id, p.title, p.last_message_at, p.total_rank::REAL,
+             p.match_count, p.id,
+             ts_headline('spanish',
+                         replace(replace(replace(p.content, '&', '&amp;'),
+                                         '<', '&lt;'), '>', '&gt;'),
+                         q.query,
+                         'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10'),
+             p.total_count
+      FROM page p, q
+      ORDER BY p.total_rank DESC, p.last_message_at DESC;
+    $$ LANGUAGE sql STABLE;
+    """
+    try:
+        response = supabase_.rpc(
+            "search_user_messages",
+            {
+                "p_user_id": user_id,
+                "p_query": query,
+                "p_limit": limit,
+                "p_offset": offset,
+            },
+        ).execute()
+
+        rows = response.data if response.data else []
+        total = rows[0]["total_count"] if rows else 0
+
+        return {
+            "results": [
+                {
+                    "conversation_id": row["conversation_id"],
+                    "title": row["title"],
+                    "last_message_at": row["last_message_at"],
+                    "rank": row["rank"],
+                    "match_count": row["match_count"],
+                    "message_id": row["message_id"],
+                    "snippet": row["snippet"],
+                }
+                for row in rows
+            ],
+            "total": total,
+            "success": True,
+        }
+
+    except Exception as e:
+        print(f"Error searching conversations: {e}")
+        return {"success": False, "error": str(e)}
+
+
 def save_message(
     conversation_id: str,
     role: str,
@@ -144,18 +525,29 @@ def save_message(
     response_type: 'faq', 'academic_chatbot', 'escalation', 'general', 'support'
     """
     try:
-        response = (
-            supabase_.table("messages")
-            .insert(
-                {
-                    "conversation_id": conversation_id,
-                    "role": role,
-                    "content": content,
-                    "response_type": response_type,
-                    "timestamp": get_utc_timestamp(),
-                }
-            )
-            .execute()
+        row = {
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "response_type": response_type,
+            "timestamp": get_utc_timestamp(),
+        }
+
+        journal = get_message_journal()
+        if journal:
+            # Write-behind mode: acknowledge once the row is in the local journal
+            row["id"] = str(uuid.uuid4())
+            journal.append([row])
+            return {
+                "message_id": row["id"],
+                "timestamp": row["timestamp"],
+                "success": True,
+            }
+
+        response = call_with_retry(
+            lambda: supabase_.table("messages").insert(row).execute(),
+            "insert message",
+            retryable=is_connect_error,
         )
 
         if response.data:
@@ -172,6 +564,57 @@ def save_message(
         return {"success": False, "error": str(e)}
 
 
+def save_messages(
+    conversation_id: str, messages: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Save several messages to the database in a single insert.
+    Each item needs 'role' and 'content'; 'response_type' defaults to 'general'
+    and 'kb_sources' (knowledge base entries behind an answer) is optional.
+    Timestamps are spaced by one microsecond so the rows keep the given order
+    when read back ordered by timestamp.
+    Returns the inserted rows in the same order.
+    """
+    try:
+        base_time = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = [
+            {
+                "conversation_id": conversation_id,
+                "role": message["role"],
+                "content": message["content"],
+                "response_type": message.get("response_type", "general"),
+                "timestamp": (base_time + timedelta(microseconds=i)).isoformat(),
+            }
+            for i, message in enumerate(messages)
+        ]
+        for row, message in zip(rows, messages):
+            if message.get("kb_sources") is not None:
+                row["kb_sources"] = message["kb_sources"]
+
+        journal = get_message_journal()
+        if journal:
+            # Write-behind mode: acknowledge once the rows are in the local journal
+            for row in rows:
+                row["id"] = str(uuid.uuid4())
+            journal.append(rows)
+            return {"messages": rows, "success": True}
+
+        response = call_with_retry(
+            lambda: supabase_.table("messages").insert(rows).execute(),
+            "insert messages",
+            retryable=is_connect_error,
+        )
+
+        if response.data and len(response.data) == len(rows):
+            return {"messages": response.data, "success": True}
+        else:
+            return {"success": False, "error": "Failed to save messages"}
+
+    except Exception as e:
+        print(f"Error saving messages: {e}")
+        return {"success": False, "error": str(e)}
+
+
 def get_conversation_messages(
     conversation_id: str, limit: int = 50
 ) -> List[Dict[str, Any]]:
@@ -188,28 +631,157 @@ def get_conversation_messages(
             .execute()
         )
 
-        return response.data if response.data else []
+        messages = response.data if response.data else []
+
+        # Rehydrate archived conversations from their bundle
+        archived = _load_archived_messages(conversation_id)
+        if archived:
+            live_ids = {msg["id"] for msg in messages}
+            messages = [msg for msg in archived if msg["id"] not in live_ids] + messages
+            messages = messages[:limit]
+
+        # Include rows still waiting in the write-behind journal
+        journal = get_message_journal()
+        if journal:
+            pending = journal.pending_messages(conversation_id)
+            if pending:
+                seen_ids = {msg["id"] for msg in messages}
+                messages += [row for row in pending if row["id"] not in seen_ids]
+                messages.sort(key=lambda msg: msg["timestamp"])
+                messages = messages[:limit]
+
+        return messages
 
     except Exception as e:
         print(f"Error getting conversation messages: {e}")
         return []
 
 
+def get_latest_messages(conversation_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Retrieve the most recent `limit` messages of a conversation, in
+    chronological order (get_conversation_messages returns the oldest ones).
+    """
+    try:
+        response = (
+            supabase_.table("messages")
+            .select("*")
+            .eq("conversation_id", conversation_id)
+            .order("timestamp", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        messages = response.data or []
+
+        # Archived rows and rows still waiting in the write-behind journal
+        extra = _load_archived_messages(conversation_id)
+        journal = get_message_journal()
+        if journal:
+            extra = extra + journal.pending_messages(conversation_id)
+        if extra:
+            seen_ids = {msg["id"] for msg in messages}
+            messages += [row for row in extra if row["id"] not in seen_ids]
+
+        messages.sort(key=lambda msg: (msg["timestamp"], msg["id"]))
+        return messages[-limit:]
+
+    except Exception as e:
+        print(f"Error getting latest messages: {e}")
+        return []
+
+
+def get_messages_since(
+    conversation_id: str,
+    after_timestamp: Optional[str] = None,
+    after_id: Optional[str] = None,
+    limit: int = 200,
+) -> Dict[str, Any]:
+    """
+    Retrieve the messages after a (timestamp, id) cursor, ordered by
+    (timestamp, id), so clients only download new rows after the first load.
+    Without a cursor it returns the first page of the conversation.
+
+    Returns {"messages", "cursor", "has_more"}; pass the returned cursor back
+    to get the next page / the next delta (it is unchanged when nothing is new).
+    """
+    try:
+        query = (
+            supabase_.table("messages")
+            .select("*")
+            .eq("conversation_id", conversation_id)
+        )
+        if after_timestamp and after_id:
+            query = query.or_(keyset_after("timestamp", after_timestamp, after_id))
+
+        response = query.order("timestamp").order("id").limit(limit + 1).execute()
+        messages = response.data or []
+
+        # Include archived rows and rows still waiting in the write-behind journal
+        extra = _load_archived_messages(conversation_id)
+        journal = get_message_journal()
+        if journal:
+            extra = extra + journal.pending_messages(conversation_id)
+        if extra:
+            seen_ids = {msg["id"] for msg in messages}
+            after = (after_timestamp or "", after_id or "")
+            messages += [
+                row
+                for row in extra
+                if row["id"] not in seen_ids and (row["timestamp"], row["id"]) > after
+            ]
+            messages.sort(key=lambda msg: (msg["timestamp"], msg["id"]))
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+
+        cursor: Optional[Dict[str, Any]]
+        if messages:
+            cursor = {"timestamp": messages[-1]["timestamp"], "id": messages[-1]["id"]}
+        elif after_timestamp and after_id:
+            cursor = {"timestamp": after_timestamp, "id": after_id}
+        else:
+            cursor = None
+
+        return {
+            "messages": messages,
+            "cursor": cursor,
+            "has_more": has_more,
+            "success": True,
+        }
+
+    except Exception as e:
+        print(f"Error getting messages since cursor: {e}")
+        return {"messages": [], "cursor": None, "has_more": False, "success": False}
+
+
 def count_user_messages(conversation_id: str) -> int:
     """
     Count the number of user messages in a conversation.
     Used to determine when to generate a title (after 3rd user message).
     """
     try:
-        response = (
-            supabase_.table("messages")
+        response = call_with_retry(
+            lambda: supabase_.table("messages")
             .select("id", count="exact")
             .eq("conversation_id", conversation_id)
             .eq("role", "user")
-            .execute()
+            .execute(),
+            "count user messages",
         )
 
-        return response.count if response.count else 0
+        count = response.count if response.count else 0
+
+        # Include user messages still waiting in the write-behind journal
+        journal = get_message_journal()
+        if journal:
+            count += sum(
+                1
+                for row in journal.pending_messages(conversation_id)
+                if row["role"] == "user"
+            )
+
+        return count
 
     except Exception as e:
         print(f"Error counting user messages: {e}")
@@ -266,11 +838,12 @@ def update_conversation_title(conversation_id: str, title: str) -> bool:
     Update the title of a conversation.
     """
     try:
-        response = (
-            supabase_.table("conversations")
+        response = call_with_retry(
+            lambda: supabase_.table("conversations")
             .update({"title": title, "updated_at": get_utc_timestamp()})
             .eq("id", conversation_id)
-            .execute()
+            .execute(),
+            "update conversation title",
         )
 
         return bool(response.data)
@@ -287,12 +860,13 @@ def auto_generate_title_if_needed(conversation_id: str) -> None:
     """
     try:
         # Check if conversation already has a title
-        conv_response = (
-            supabase_.table("conversations")
+        conv_response = call_with_retry(
+            lambda: supabase_.table("conversations")
             .select("title")
             .eq("id", conversation_id)
             .single()
-            .execute()
+            .execute(),
+            "get conversation title",
         )
 
         if conv_response.data and conv_response.data.get("title"):
@@ -315,15 +889,17 @@ def auto_generate_title_if_needed(conversation_id: str) -> None:
 def escalate_conversation(conversation_id: str) -> bool:
     """
     Mark a conversation as escalated (user requested human assistance).
-    Creates an agent_request record for the escalated conversation.
+    Creates an agent_request record for the escalated conversation and
+    schedules its summary for the agent in the background.
     """
     try:
         # Verificar si ya existe un agent_request para esta conversación
-        existing_request = (
-            supabase_.table("agent_requests")
+        existing_request = call_with_retry(
+            lambda: supabase_.table("agent_requests")
             .select("id")
             .eq("conversation_id", conversation_id)
-            .execute()
+            .execute(),
+            "check existing agent request",
         )
 
         if existing_request.data and len(existing_request.data) > 0:
@@ -331,8 +907,8 @@ def escalate_conversation(conversation_id: str) -> bool:
             return True  # Ya está escalada, retornar True
 
         # Marcar la conversación como escalada
-        response = (
-            supabase_.table("conversations")
+        response = call_with_retry(
+            lambda: supabase_.table("conversations")
             .update(
                 {
                     "is_escalated": True,
@@ -341,16 +917,19 @@ def escalate_conversation(conversation_id: str) -> bool:
                 }
             )
             .eq("id", conversation_id)
-            .execute()
+            .execute(),
+            "mark conversation escalated",
         )
+        # After the write, so a concurrent read can't re-cache the old state
+        invalidate_conversation_cache(conversation_id)
 
         if not response.data:
             print(f"Failed to update conversation {conversation_id} as escalated")
             return False
 
         # Crear un agent_request con status='pending'
-        agent_request_response = (
-            supabase_.table("agent_requests")
+        agent_request_response = call_with_retry(
+            lambda: supabase_.table("agent_requests")
             .insert(
                 {
                     "conversation_id": conversation_id,
@@ -359,13 +938,23 @@ def escalate_conversation(conversation_id: str) -> bool:
                     "updated_at": get_utc_timestamp(),
                 }
             )
-            .execute()
+            .execute(),
+            "insert agent request",
+            retryable=is_connect_error,
         )
 
         if agent_request_response.data:
             print(
                 f"✅ Escalated conversation {conversation_id} - Created agent_request"
             )
+            agent_metrics.record_escalated(
+                agent_request_response.data[0].get("created_at")
+            )
+            agent_queue.add(agent_request_response.data[0], response.data[0])
+            publish_escalation_status(conversation_id)
+            schedule_escalation_summary(
+                agent_request_response.data[0]["id"], conversation_id
+            )
             return True
         else:
             print(
@@ -387,14 +976,8 @@ def rate_message(message_id: str, rating: str) -> bool:
         if rating not in ["up", "down"]:
             return False
 
-        response = (
-            supabase_.table("messages")
-            .update({"rating": rating, "rated_at": get_utc_timestamp()})
-            .eq("id", message_id)
-            .execute()
-        )
-
-        return bool(response.data)
+        # The rating and its aggregate deltas are applied in one transaction
+        return rating_analytics_service.rate_message(message_id, rating)
 
     except Exception as e:
         print(f"Error rating message: {e}")
@@ -442,6 +1025,74 @@ def detect_escalation_request(message: str) -> bool:
     return is_escalation
 
 
+# Max ids per in_() filter, keeps the request URL well under size limits
+DELETE_BATCH_SIZE = 100
+
+
+def delete_conversations(
+    user_id: str,
+    conversation_ids: Optional[List[str]] = None,
+    older_than: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Delete several conversations of a user with batched statements.
+    Selects either the given ids or every conversation whose last message is
+    older than `older_than` (both filters combine if given). Ownership is
+    verified with a single query; ids that don't belong to the user are ignored.
+    Returns the deleted ids and the image URLs of their messages so the caller
+    can remove them from Cloudinary.
+    """
+    try:
+        query = supabase_.table("conversations").select("id").eq("user_id", user_id)
+        if conversation_ids is not None:
+            query = query.in_("id", conversation_ids)
+        if older_than:
+            query = query.lt("last_message_at", older_than)
+        response = call_with_retry(query.execute, "select conversations to delete")
+
+        owned_ids = [row["id"] for row in response.data or []]
+        image_urls: List[str] = []
+
+        for i in range(0, len(owned_ids), DELETE_BATCH_SIZE):
+            batch = owned_ids[i : i + DELETE_BATCH_SIZE]
+
+            images_response = call_with_retry(
+                lambda: supabase_.table("messages")
+                .select("image_url")
+                .in_("conversation_id", batch)
+                .not_.is_("image_url", "null")
+                .execute(),
+                "select images to delete",
+            )
+            image_urls += [row["image_url"] for row in images_response.data or []]
+
+            call_with_retry(
+                lambda: supabase_.table("messages")
+                .delete()
+                .in_("conversation_id", batch)
+                .execute(),
+                "delete messages",
+            )
+            call_with_retry(
+                lambda: supabase_.table("conversations")
+                .delete()
+                .in_("id", batch)
+                .eq("user_id", user_id)
+                .execute(),
+                "delete conversations",
+            )
+
+            for conversation_id in batch:
+                invalidate_conversation_cache(conversation_id)
+                archive_service.delete_archive(conversation_id)
+
+        return {"deleted_ids": owned_ids, "image_urls": image_urls, "success": True}
+
+    except Exception as e:
+        print(f"Error deleting conversations: {e}")
+        return {"success": False, "error": str(e)}
+
+
 def delete_conversation(conversation_id: str) -> bool:
     """
     Delete a conversation and all its messages.
@@ -449,17 +1100,26 @@ def delete_conversation(conversation_id: str) -> bool:
     """
     try:
         # Delete messages first (if not using cascade)
-        supabase_.table("messages").delete().eq(
-            "conversation_id", conversation_id
-        ).execute()
+        call_with_retry(
+            lambda: supabase_.table("messages")
+            .delete()
+            .eq("conversation_id", conversation_id)
+            .execute(),
+            "delete messages",
+        )
 
         # Delete conversation
-        response = (
-            supabase_.table("conversations")
+        call_with_retry(
+            lambda: supabase_.table("conversations")
             .delete()
             .eq("id", conversation_id)
-            .execute()
+            .execute(),
+            "delete conversation",
         )
+        invalidate_conversation_cache(conversation_id)
+
+        # Delete the cold-storage bundle, if the conversation was archived
+        archive_service.delete_archive(conversation_id)
 
         return True
 
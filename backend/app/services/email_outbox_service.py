@@ -0,0 +1,215 @@
+"""
+Email Outbox Service
+Emails are never sent inside an HTTP request or a scheduler scan: callers
+insert a row into the email_outbox table (one insert) and a background
+dispatcher delivers it with retries, exponential backoff and dead-lettering.
+
+Each kind of email has a handler registered with register_email_handler();
+the handler gets the row payload and raises on failure
+(PermanentEmailError to dead-letter right away).
+
+Create in the Supabase SQL Editor:
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  kind TEXT NOT NULL,                        -- 'agent_assignment', 'activity_reminder'
+  payload JSONB NOT NULL,
+  dedupe_key TEXT UNIQUE,                    -- enqueue is a no-op if it exists
+  status TEXT NOT NULL DEFAULT 'pending',    -- pending | sending | sent | dead
+  attempts INT NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+  last_error TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+  sent_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS email_outbox_due ON email_outbox (status, next_attempt_at);
+
+-- Lease due rows to one dispatcher (rows of a crashed dispatcher come back
+-- when their lease expires)
+CREATE OR REPLACE FUNCTION claim_email_outbox(p_limit INT, p_lease_seconds INT)
+RETURNS SETOF email_outbox AS $$
+  UPDATE email_outbox o
+  SET status = 'sending',
+      attempts = o.attempts + 1,
+      next_attempt_at = (now() AT TIME ZONE 'utc') + make_interval(secs => p_lease_seconds)
+  WHERE o.id IN (
+    SELECT id FROM email_outbox
+    WHERE status IN ('pending', 'sending')
+      AND next_attempt_at <= (now() AT TIME ZONE 'utc')
+    ORDER BY next_attempt_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING o.*;
+$$ LANGUAGE sql;
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import Config, supabase_
+from app.core.retry import call_with_retry, is_connect_error
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("pending", "sending", "sent", "dead")
+# A leased row is retried if its dispatcher hasn't reported back by then
+LEASE_SECONDS = 300
+MAX_BACKOFF_SECONDS = 3600
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+
+class PermanentEmailError(Exception):
+    """Delivery can never succeed (e.g. no address); dead-letter without retrying"""
+
+
+def get_utc_timestamp(delta_seconds: float = 0) -> str:
+    """
+    Obtener timestamp UTC en formato compatible con Supabase.
+    Supabase espera formato ISO sin timezone explícito (naive UTC).
+    """
+    return (
+        (datetime.now(timezone.utc) + timedelta(seconds=delta_seconds))
+        .replace(tzinfo=None)
+        .isoformat()
+    )
+
+
+def register_email_handler(
+    kind: str, handler: Callable[[Dict[str, Any]], None]
+) -> None:
+    """Register the function that delivers emails of a kind"""
+    _handlers[kind] = handler
+
+
+def enqueue_email(
+    kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None
+) -> None:
+    """
+    Queue an email for the dispatcher (a single insert, no SMTP).
+    With a dedupe_key the email is queued at most once.
+    """
+    row = {"kind": kind, "payload": payload, "dedupe_key": dedupe_key}
+    if dedupe_key:
+        # Idempotent: a retried upsert hits the dedupe key
+        call_with_retry(
+            lambda: supabase_.table("email_outbox")
+            .upsert(row, on_conflict="dedupe_key", ignore_duplicates=True)
+            .execute(),
+            "enqueue email",
+        )
+    else:
+        call_with_retry(
+            lambda: supabase_.table("email_outbox").insert(row).execute(),
+            "enqueue email",
+            retryable=is_connect_error,
+        )
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before the next attempt after `attempts` failed ones"""
+    return min(
+        Config.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS
+    )
+
+
+def dispatch_outbox(batch_size: Optional[int] = None) -> int:
+    """
+    Deliver due emails. Runs as a scheduler job.
+    Returns the number of emails sent.
+    """
+    try:
+        # Rows claimed by a lost response wait out their lease, never resent
+        response = call_with_retry(
+            lambda: supabase_.rpc(
+                "claim_email_outbox",
+                {
+                    "p_limit": batch_size or Config.EMAIL_OUTBOX_BATCH_SIZE,
+                    "p_lease_seconds": LEASE_SECONDS,
+                },
+            ).execute(),
+            "claim email outbox",
+        )
+    except Exception as e:
+        logger.error(f"Error claiming email outbox rows: {e}")
+        return 0
+
+    sent = 0
+    for row in response.data or []:
+        if _deliver(row):
+            sent += 1
+
+    if response.data:
+        logger.info(f"Email outbox: sent {sent}/{len(response.data)}")
+    return sent
+
+
+def _deliver(row: Dict[str, Any]) -> bool:
+    handler = _handlers.get(row["kind"])
+    try:
+        if handler is None:
+            raise PermanentEmailError(f"No handler for email kind '{row['kind']}'")
+        handler(row["payload"])
+
+    except Exception as e:
+        permanent = isinstance(e, PermanentEmailError)
+        if permanent or row["attempts"] >= Config.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            update = {"status": "dead", "last_error": str(e)}
+            logger.error(f"Email {row['id']} ({row['kind']}) dead-lettered: {e}")
+        else:
+            update = {
+                "status": "pending",
+                "last_error": str(e),
+                "next_attempt_at": get_utc_timestamp(backoff_seconds(row["attempts"])),
+            }
+            logger.warning(
+                f"Email {row['id']} ({row['kind']}) failed, attempt {row['attempts']}: {e}"
+            )
+        _update_row(row["id"], update)
+        return False
+
+    _update_row(
+        row["id"],
+        {"status": "sent", "sent_at": get_utc_timestamp(), "last_error": None},
+    )
+    return True
+
+
+def _update_row(row_id: str, update: Dict[str, Any]) -> None:
+    try:
+        call_with_retry(
+            lambda: supabase_.table("email_outbox")
+            .update(update)
+            .eq("id", row_id)
+            .execute(),
+            "update email outbox row",
+        )
+    except Exception as e:
+        # The lease expires and the row is retried
+        logger.error(f"Error updating email outbox row {row_id}: {e}")
+
+
+def get_outbox_status(dead_limit: int = 20) -> Dict[str, Any]:
+    """Row counts per status and the most recent dead letters"""
+    counts = {}
+    for status in STATUSES:
+        response = (
+            supabase_.table("email_outbox")
+            .select("id", count="exact", head=True)
+            .eq("status", status)
+            .execute()
+        )
+        counts[status] = response.count or 0
+
+    dead = (
+        supabase_.table("email_outbox")
+        .select("id, kind, dedupe_key, attempts, last_error, created_at")
+        .eq("status", "dead")
+        .order("created_at", desc=True)
+        .limit(dead_limit)
+        .execute()
+    )
+
+    return {"counts": counts, "dead_letters": dead.data or []}
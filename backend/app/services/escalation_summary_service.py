@@ -0,0 +1,181 @@
+"""
+Servicio de resúmenes de escalamiento.
+
+Al escalar una conversación se genera en segundo plano un resumen corto y
+estructurado para el agente (intención, entradas de la base de conocimiento
+que el bot ya mostró y la pregunta que quedó abierta) y se guarda en la fila
+de agent_requests. La cola y el caso activo devuelven el resumen, así el
+agente no tiene que leer toda la transcripción del bot para empezar.
+
+Crear en el SQL Editor de Supabase:
+
+ALTER TABLE agent_requests ADD COLUMN IF NOT EXISTS summary JSONB;
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.config import supabase_
+from app.core.retry import call_with_retry
+from app.services.rating_analytics_service import kb_entry_key
+
+logger = logging.getLogger(__name__)
+
+# Mensajes recientes que se leen para el resumen (entradas de la base de
+# conocimiento y conteo) y, de ellos, los que se envían al modelo
+SUMMARY_SOURCE_MESSAGES = 200
+TRANSCRIPT_MESSAGES = 30
+MAX_MESSAGE_CHARS = 500
+MAX_KB_ENTRIES = 5
+
+_summary_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="escalation-summary"
+)
+
+SUMMARY_PROMPT = (
+    "Eres un asistente que prepara a un agente de soporte humano para atender "
+    "una conversación escalada desde un chatbot académico. Lee la transcripción "
+    'y responde SOLO con un objeto JSON con dos campos: "intent" (qué necesita '
+    'el usuario, una frase de máximo 15 palabras) y "open_question" (la pregunta '
+    "concreta que el bot no resolvió, en una frase)."
+)
+
+
+def get_utc_timestamp() -> str:
+    """
+    Obtener timestamp UTC en formato compatible con Supabase.
+    Supabase espera formato ISO sin timezone explícito (naive UTC).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def collect_kb_entries(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Entradas de la base de conocimiento que el bot ya mostró (kb_sources de sus
+    respuestas), sin repetir y con el texto de la pregunta.
+    """
+    entries: Dict[str, Dict[str, Any]] = {}
+    for message in messages:
+        for source in message.get("kb_sources") or []:
+            entries.setdefault(kb_entry_key(source), dict(source))
+
+    selected = list(entries.values())[-MAX_KB_ENTRIES:]
+    ids_by_table: Dict[str, List[Any]] = {}
+    for entry in selected:
+        ids_by_table.setdefault(entry["source"], []).append(entry["id"])
+
+    questions: Dict[str, str] = {}
+    for table, ids in ids_by_table.items():
+        if table not in ("knowledge_base", "faqs"):
+            continue
+        response = call_with_retry(
+            lambda: supabase_.table(table)
+            .select("id, question")
+            .in_("id", ids)
+            .execute(),
+            "load kb entry questions",
+        )
+        for row in response.data or []:
+            questions[f"{table}:{row['id']}"] = row["question"]
+
+    for entry in selected:
+        entry["question"] = questions.get(kb_entry_key(entry))
+    return selected
+
+
+def _fallback_summary(messages: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Intención = primera pregunta del usuario; pregunta abierta = la última"""
+    user_messages = [
+        msg["content"] for msg in messages if msg["role"] == "user" and msg["content"]
+    ]
+    if not user_messages:
+        return {"intent": "", "open_question": ""}
+    return {
+        "intent": user_messages[0][:MAX_MESSAGE_CHARS],
+        "open_question": user_messages[-1][:MAX_MESSAGE_CHARS],
+    }
+
+
+def _model_summary(messages: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Intención y pregunta abierta generadas por el modelo (None si falla)"""
+    # Importado aquí: conversation_service programa los resúmenes
+    from app.services.conversation_service import client
+
+    transcript = "\n".join(
+        f"{msg['role']}: {(msg['content'] or '')[:MAX_MESSAGE_CHARS]}"
+        for msg in messages[-TRANSCRIPT_MESSAGES:]
+    )
+    try:
+        response = client.chat.completions.create(
+            model="deepseek/deepseek-chat",
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            max_tokens=200,
+            temperature=0.2,
+        )
+        content = (response.choices[0].message.content or "").strip()
+        # Algunos modelos envuelven el JSON en un bloque de código
+        content = content.strip("`").removeprefix("json").strip()
+        parsed = json.loads(content)
+        return {
+            "intent": str(parsed.get("intent") or "")[:200],
+            "open_question": str(parsed.get("open_question") or "")[:MAX_MESSAGE_CHARS],
+        }
+    except Exception as e:
+        logger.warning(f"Error generando resumen con el modelo: {e}")
+        return None
+
+
+def build_escalation_summary(conversation_id: str) -> Dict[str, Any]:
+    """
+    Resumen estructurado de la conversación hasta el escalamiento.
+
+    Returns:
+        {"intent", "open_question", "kb_entries": [{"source", "id", "question"}],
+         "message_count", "generator": "model" | "fallback", "generated_at"}
+    """
+    from app.services.conversation_service import get_latest_messages
+
+    messages = get_latest_messages(conversation_id, limit=SUMMARY_SOURCE_MESSAGES)
+
+    summary = _model_summary(messages) if messages else None
+    generator = "model"
+    if not summary or not summary["intent"]:
+        summary = _fallback_summary(messages)
+        generator = "fallback"
+
+    return {
+        **summary,
+        "kb_entries": collect_kb_entries(messages),
+        "message_count": len(messages),
+        "generator": generator,
+        "generated_at": get_utc_timestamp(),
+    }
+
+
+def summarize_escalation(request_id: str, conversation_id: str) -> None:
+    """Generar el resumen y guardarlo en agent_requests.summary"""
+    try:
+        summary = build_escalation_summary(conversation_id)
+        call_with_retry(
+            lambda: supabase_.table("agent_requests")
+            .update({"summary": summary})
+            .eq("id", request_id)
+            .execute(),
+            "save escalation summary",
+        )
+        logger.info(
+            f"Resumen de escalamiento listo para {request_id} ({summary['generator']})"
+        )
+    except Exception as e:
+        logger.error(f"Error guardando resumen de escalamiento {request_id}: {e}")
+
+
+def schedule_escalation_summary(request_id: str, conversation_id: str) -> None:
+    """Generar el resumen en segundo plano (no retrasa la respuesta al usuario)"""
+    _summary_executor.submit(summarize_escalation, request_id, conversation_id)
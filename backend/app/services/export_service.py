@@ -0,0 +1,158 @@
+"""
+Export Service
+Streams conversations and their messages as NDJSON for compliance dumps.
+
+Both tables are read with keyset pagination ((created_at, id) for
+conversations and (timestamp, id) for messages), so memory use stays
+constant no matter how many rows are exported. Archived conversations are
+exported in full: their bundle first, then any message written after the
+archive.
+"""
+
+import json
+import logging
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from app.core.config import supabase_
+from app.core.pagination import keyset_after
+from app.core.retry import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 500
+# Compressed output is buffered up to this size before it is yielded
+GZIP_CHUNK_SIZE = 64 * 1024
+
+
+def iter_conversations(
+    user_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    escalated: Optional[bool] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield conversations ordered by (created_at, id).
+
+    Args:
+        user_id: Only conversations of this user
+        start: Only conversations created at or after this ISO date/datetime
+        end: Only conversations created before this ISO date/datetime
+        escalated: Only escalated (True) or non-escalated (False) conversations
+        page_size: Rows fetched per request
+    """
+    cursor = None
+    while True:
+        query = supabase_.table("conversations").select("*")
+        if user_id:
+            query = query.eq("user_id", user_id)
+        if start:
+            query = query.gte("created_at", start)
+        if end:
+            query = query.lt("created_at", end)
+        if escalated is not None:
+            query = query.eq("is_escalated", escalated)
+        if cursor:
+            query = query.or_(keyset_after("created_at", *cursor))
+
+        response = call_with_retry(
+            query.order("created_at").order("id").limit(page_size).execute,
+            "export conversations page",
+        )
+        rows = response.data or []
+
+        yield from rows
+
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def iter_conversation_messages(
+    conversation_id: str, page_size: int = DEFAULT_PAGE_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """Yield the messages of a conversation ordered by (timestamp, id)"""
+    cursor = None
+    while True:
+        query = (
+            supabase_.table("messages")
+            .select("*")
+            .eq("conversation_id", conversation_id)
+        )
+        if cursor:
+            query = query.or_(keyset_after("timestamp", *cursor))
+
+        response = call_with_retry(
+            query.order("timestamp").order("id").limit(page_size).execute,
+            "export messages page",
+        )
+        rows = response.data or []
+
+        yield from rows
+
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]["timestamp"], rows[-1]["id"])
+
+
+def iter_export_records(
+    user_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    escalated: Optional[bool] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one record per conversation followed by one record per message.
+    Every record carries a "type" field: "conversation" or "message".
+    """
+    # Imported here: archive_service archives with iter_conversation_messages
+    from app.services.archive_service import load_archived_messages
+
+    conversations = iter_conversations(
+        user_id=user_id,
+        start=start,
+        end=end,
+        escalated=escalated,
+        page_size=page_size,
+    )
+    for conversation in conversations:
+        yield {"type": "conversation", **conversation}
+
+        archived_ids = set()
+        if conversation.get("archived_at"):
+            archived = load_archived_messages(conversation["id"], cache=False) or []
+            for message in archived:
+                archived_ids.add(message["id"])
+                yield {"type": "message", **message}
+
+        for message in iter_conversation_messages(conversation["id"], page_size):
+            if message["id"] not in archived_ids:
+                yield {"type": "message", **message}
+
+
+def iter_ndjson(
+    records: Iterable[Dict[str, Any]], compress: bool = False
+) -> Iterator[bytes]:
+    """
+    Serialize records as NDJSON, optionally as a gzip stream.
+    """
+    if not compress:
+        for record in records:
+            yield _ndjson_line(record)
+        return
+
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    buffer = bytearray()
+    for record in records:
+        buffer += compressor.compress(_ndjson_line(record))
+        if len(buffer) >= GZIP_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += compressor.flush()
+    yield bytes(buffer)
+
+
+def _ndjson_line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
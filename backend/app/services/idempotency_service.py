@@ -0,0 +1,267 @@
+"""
+Idempotency Service
+Lets clients safely retry POST requests by sending an `Idempotency-Key` header.
+
+Keys live in the idempotency_keys table, so every worker sees the same keys.
+The first request with a given key claims its row and runs normally; its
+response is stored in the row and retries with the same key replay it instead
+of running the pipeline (LLM call, message inserts) again. A retry that
+arrives while the original is still running gets a 409 right away.
+Failed requests (HTTPException or any error) delete their row, so they can be
+retried. A running row whose worker died is reclaimable once its lease
+(IDEMPOTENCY_LEASE_SECONDS) expires; stored responses expire after
+IDEMPOTENCY_TTL_SECONDS and are purged by the scheduler.
+
+Create in the Supabase SQL Editor:
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  scope TEXT NOT NULL,                       -- endpoint, e.g. 'chatbot.ask'
+  user_id TEXT NOT NULL,
+  key TEXT NOT NULL,
+  fingerprint TEXT NOT NULL,                 -- sha256 of the request data
+  status TEXT NOT NULL DEFAULT 'running',    -- running | completed
+  response JSONB,
+  created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+  expires_at TIMESTAMP NOT NULL,
+  PRIMARY KEY (scope, user_id, key)
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires ON idempotency_keys (expires_at);
+
+-- Claim a key (or an expired one). Returns claimed = TRUE for the new owner,
+-- otherwise the stored row; no row if another request claimed it concurrently
+CREATE OR REPLACE FUNCTION claim_idempotency_key(
+  p_scope TEXT, p_user_id TEXT, p_key TEXT, p_fingerprint TEXT, p_lease_seconds INT
+)
+RETURNS TABLE (claimed BOOLEAN, status TEXT, fingerprint TEXT, response JSONB) AS $$
+  WITH claim AS (
+    INSERT INTO idempotency_keys AS k (scope, user_id, key, fingerprint, expires_at)
+    VALUES (p_scope, p_user_id, p_key, p_fingerprint,
+            (now() AT TIME ZONE 'utc') + make_interval(secs => p_lease_seconds))
+    ON CONFLICT (scope, user_id, key) DO UPDATE
+      SET fingerprint = EXCLUDED.fingerprint,
+          status = 'running',
+          response = NULL,
+          created_at = now() AT TIME ZONE 'utc',
+          expires_at = EXCLUDED.expires_at
+      WHERE k.expires_at <= (now() AT TIME ZONE 'utc')
+    RETURNING TRUE, k.status, k.fingerprint, k.response
+  )
+  SELECT * FROM claim
+  UNION ALL
+  SELECT FALSE, k.status, k.fingerprint, k.response
+  FROM idempotency_keys k
+  WHERE k.scope = p_scope AND k.user_id = p_user_id AND k.key = p_key
+    AND NOT EXISTS (SELECT 1 FROM claim);
+$$ LANGUAGE sql;
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import Config, supabase_
+from app.core.retry import call_with_retry, is_connect_error
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+
+def get_utc_timestamp(delta_seconds: float = 0) -> str:
+    """
+    Obtener timestamp UTC en formato compatible con Supabase.
+    Supabase espera formato ISO sin timezone explícito (naive UTC).
+    """
+    return (
+        (datetime.now(timezone.utc) + timedelta(seconds=delta_seconds))
+        .replace(tzinfo=None)
+        .isoformat()
+    )
+
+
+class IdempotencyStore:
+    """Idempotency keys -> responses, shared by all workers through the database"""
+
+    def __init__(self, ttl: float, lease: float) -> None:
+        self.ttl = ttl
+        self.lease = lease
+
+    def run(
+        self,
+        scope: str,
+        user_id: str,
+        key: Optional[str],
+        payload: Any,
+        operation: Callable[[], Any],
+    ) -> Any:
+        """
+        Run a synchronous operation once per (user, scope, key).
+
+        Args:
+            scope: Name of the endpoint, keys are only unique within a scope
+            user_id: Authenticated user, keys are only unique per user
+            key: Value of the Idempotency-Key header (None disables replay)
+            payload: Request data, a reused key with different data is rejected
+            operation: Callable that produces the response
+        """
+        if not key:
+            return operation()
+
+        row_key, fingerprint = self._prepare(scope, user_id, key, payload)
+        claimed, replay = self._claim(row_key, fingerprint)
+        if not claimed:
+            return replay
+
+        try:
+            response = operation()
+        except BaseException:
+            self._release(row_key)
+            raise
+        return self._complete(row_key, response)
+
+    async def run_async(
+        self,
+        scope: str,
+        user_id: str,
+        key: Optional[str],
+        payload: Any,
+        operation: Callable[[], Any],
+    ) -> Any:
+        """Same as run() for an async operation (a coroutine function)"""
+        if not key:
+            return await operation()
+
+        row_key, fingerprint = self._prepare(scope, user_id, key, payload)
+        claimed, replay = await run_in_threadpool(self._claim, row_key, fingerprint)
+        if not claimed:
+            return replay
+
+        try:
+            response = await operation()
+        except BaseException:
+            await run_in_threadpool(self._release, row_key)
+            raise
+        return await run_in_threadpool(self._complete, row_key, response)
+
+    def purge_expired(self) -> int:
+        """Delete expired keys (scheduler job); returns the number deleted"""
+        response = call_with_retry(
+            lambda: supabase_.table("idempotency_keys")
+            .delete()
+            .lt("expires_at", get_utc_timestamp())
+            .execute(),
+            "purge idempotency keys",
+        )
+        return len(response.data or [])
+
+    def _prepare(
+        self, scope: str, user_id: str, key: str, payload: Any
+    ) -> Tuple[Dict[str, str], str]:
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key too long")
+        fingerprint = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return {"scope": scope, "user_id": user_id, "key": key}, fingerprint
+
+    def _claim(self, row_key: Dict[str, str], fingerprint: str) -> Tuple[bool, Any]:
+        """
+        Returns (True, None) once this caller owns the key, or (False, response)
+        to replay a completed request. Raises 409 while the key is in flight.
+        """
+        # Not retried after a read error: the claim may have landed and the
+        # retry would see this request's own row as in flight
+        response = call_with_retry(
+            lambda: supabase_.rpc(
+                "claim_idempotency_key",
+                {
+                    "p_scope": row_key["scope"],
+                    "p_user_id": row_key["user_id"],
+                    "p_key": row_key["key"],
+                    "p_fingerprint": fingerprint,
+                    "p_lease_seconds": int(self.lease),
+                },
+            ).execute(),
+            "claim idempotency key",
+            retryable=is_connect_error,
+        )
+        rows = response.data or []
+        if not rows:
+            raise self._still_in_progress()
+
+        row = rows[0]
+        if row["claimed"]:
+            return True, None
+        if row["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request",
+            )
+        if row["status"] != "completed":
+            raise self._still_in_progress()
+
+        logger.info(f"Replaying idempotent response for {row_key['scope']}")
+        return False, row["response"]
+
+    def _complete(self, row_key: Dict[str, str], response: Any) -> Any:
+        """Store the response; returns it as it will be replayed (JSON types)"""
+        stored = jsonable_encoder(response)
+        try:
+            call_with_retry(
+                lambda: self._match(
+                    supabase_.table("idempotency_keys").update(
+                        {
+                            "status": "completed",
+                            "response": stored,
+                            "expires_at": get_utc_timestamp(self.ttl),
+                        }
+                    ),
+                    row_key,
+                ).execute(),
+                "store idempotent response",
+            )
+        except Exception as e:
+            # The request already succeeded; a lost row only disables replay
+            logger.error(f"Error storing idempotent response for {row_key}: {e}")
+        return stored
+
+    def _release(self, row_key: Dict[str, str]) -> None:
+        """Delete the claim of a failed request so it can be retried"""
+        try:
+            call_with_retry(
+                lambda: self._match(
+                    supabase_.table("idempotency_keys").delete(), row_key
+                )
+                .eq("status", "running")
+                .execute(),
+                "release idempotency key",
+            )
+        except Exception as e:
+            # The lease expires on its own, the key is reclaimable after it
+            logger.error(f"Error releasing idempotency key {row_key}: {e}")
+
+    @staticmethod
+    def _match(query: Any, row_key: Dict[str, str]) -> Any:
+        return (
+            query.eq("scope", row_key["scope"])
+            .eq("user_id", row_key["user_id"])
+            .eq("key", row_key["key"])
+        )
+
+    @staticmethod
+    def _still_in_progress() -> HTTPException:
+        return HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+        )
+
+
+idempotency_store = IdempotencyStore(
+    ttl=Config.IDEMPOTENCY_TTL_SECONDS, lease=Config.IDEMPOTENCY_LEASE_SECONDS
+)
@@ -0,0 +1,387 @@
+"""
+Message Journal Service
+Write-behind persistence for the messages table.
+
+Rows are appended to a local append-only journal (one JSON object per line)
+and acknowledged as soon as they are on disk. A background worker flushes
+them to Supabase in batches and records a checkpoint with the byte offset
+that has already been persisted. On restart, everything after the
+checkpoint is replayed.
+
+Each worker process holds an exclusive lock on its own journal slot
+(messages.journal, messages.journal.1, ...), so one worker's compaction never
+touches another's rows. A worker also adopts the rows of slots no process
+holds anymore (e.g. after restarting with fewer workers).
+
+Rows the database rejects for good (invalid data, constraint violations) are
+isolated by splitting the batch, moved to the dead-letter file
+(<journal>.dead) and dropped, so they don't block the rows behind them. Any
+other error leaves the batch pending and it is retried on the next flush.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+from app.core.config import Config, supabase_
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker, no locking
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE classes that retrying can't fix: data exception, integrity violation
+PERMANENT_ERROR_CLASSES = ("22", "23")
+
+
+class JournalLockedError(Exception):
+    """The journal slot is held by another process"""
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """The database rejected the rows themselves (retrying can't succeed)"""
+    return isinstance(error, APIError) and (error.code or "")[:2] in (
+        PERMANENT_ERROR_CLASSES
+    )
+
+
+class MessageJournal:
+    """Append-only local journal flushed to Supabase by a background worker"""
+
+    def __init__(self, path: str, batch_size: int = 200, flush_seconds: float = 0.5):
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.dead_letter_path = f"{path}.dead"
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+
+        # Rows not yet persisted in Supabase: (end_offset, row)
+        self._pending: List[Tuple[int, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        # Group commit: one fsync covers every write issued before it
+        self._fsync_lock = threading.Lock()
+        self._written_seq = 0
+        self._synced_seq = 0
+
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._file: Optional[BinaryIO] = None
+        self._lock_file: Optional[BinaryIO] = None
+
+    def start(self) -> None:
+        """
+        Lock the journal, replay unflushed rows and start the flush worker.
+        Raises JournalLockedError if another process holds the journal.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._acquire_lock()
+        self._replay()
+        self._file = open(self.path, "ab")
+
+        self._stop_event.clear()
+        self._worker = threading.Thread(
+            target=self._run, name="message-journal-flusher", daemon=True
+        )
+        self._worker.start()
+        logger.info(
+            f"Message journal started at {self.path} ({len(self._pending)} rows to replay)"
+        )
+
+    def stop(self) -> None:
+        """Stop the worker, flushing whatever is still pending"""
+        self._stop_event.set()
+        if self._worker:
+            self._worker.join(timeout=10)
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+        self._release_lock()
+        logger.info("Message journal stopped")
+
+    def adopt(self, path: str) -> int:
+        """
+        Move the unflushed rows of another journal into this one, if no
+        process holds it. Returns the number of rows adopted.
+        """
+        orphan = MessageJournal(path)
+        try:
+            orphan._acquire_lock()
+        except JournalLockedError:
+            return 0
+
+        try:
+            orphan._replay()
+            rows = [row for _, row in orphan._pending]
+            if rows:
+                # Durable here before the orphan is cleared
+                self.append(rows)
+            orphan._write_checkpoint(0)
+            with open(path, "r+b") as f:
+                f.truncate(0)
+            return len(rows)
+        finally:
+            orphan._release_lock()
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Durably append rows to the journal.
+        Returns once the rows are fsynced; concurrent appends share one fsync.
+        """
+        payload = b"".join(
+            json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n" for row in rows
+        )
+
+        with self._lock:
+            file = self._require_file()
+            file.write(payload)
+            file.flush()
+            end_offset = file.tell()
+            for row in rows:
+                self._pending.append((end_offset, row))
+            self._written_seq += 1
+            seq = self._written_seq
+
+        self._sync(seq)
+
+    def pending_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Rows of a conversation that are journaled but not yet in Supabase"""
+        with self._lock:
+            return [
+                row
+                for _, row in self._pending
+                if row.get("conversation_id") == conversation_id
+            ]
+
+    def flush(self) -> int:
+        """
+        Persist pending rows to Supabase in batches.
+        Returns the number of rows flushed (persisted or dead-lettered).
+        """
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[: self.batch_size]
+                if not batch:
+                    break
+
+                try:
+                    self._write_rows([row for _, row in batch])
+                except Exception as e:
+                    logger.warning(
+                        f"Message journal flush failed, will retry ({len(batch)} rows): {e}"
+                    )
+                    break
+
+                with self._lock:
+                    del self._pending[: len(batch)]
+                    self._write_checkpoint(batch[-1][0])
+                    self._compact_if_drained()
+                flushed += len(batch)
+
+        return flushed
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Upsert rows, splitting the batch to isolate the rows the database
+        rejects for good and dead-lettering them. Transient errors propagate
+        and the batch is retried as a whole (the upsert is idempotent).
+        """
+        try:
+            # Upsert by id so a replay after a crash never duplicates rows
+            supabase_.table("messages").upsert(rows).execute()
+        except Exception as e:
+            if not is_permanent_error(e):
+                raise
+            if len(rows) == 1:
+                self._dead_letter(rows[0], e)
+                return
+            middle = len(rows) // 2
+            self._write_rows(rows[:middle])
+            self._write_rows(rows[middle:])
+
+    def _dead_letter(self, row: Dict[str, Any], error: Exception) -> None:
+        """Keep a rejected row for inspection instead of retrying it forever"""
+        logger.error(
+            f"Message {row.get('id')} rejected, moved to dead letters: {error}"
+        )
+        entry = {
+            "row": row,
+            "error": str(error),
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _require_file(self) -> BinaryIO:
+        if self._file is None:
+            raise RuntimeError("Message journal is not started")
+        return self._file
+
+    def _acquire_lock(self) -> None:
+        if fcntl is None:
+            return
+        lock_file = open(f"{self.path}.lock", "ab")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            lock_file.close()
+            raise JournalLockedError(self.path) from e
+        self._lock_file = lock_file
+
+    def _release_lock(self) -> None:
+        if self._lock_file:
+            # Closing the file releases the flock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _sync(self, seq: int) -> None:
+        """fsync the journal unless a concurrent call already covered seq"""
+        with self._fsync_lock:
+            if self._synced_seq >= seq:
+                return
+            with self._lock:
+                target = self._written_seq
+                fd = self._require_file().fileno()
+            os.fsync(fd)
+            self._synced_seq = target
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Unexpected error in message journal worker: {e}")
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, offset: int) -> None:
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _compact_if_drained(self) -> None:
+        """Truncate the journal once every row in it has been persisted"""
+        if self._pending or self._file is None:
+            return
+        # Reset the checkpoint first: a crash in between only causes an idempotent replay
+        self._write_checkpoint(0)
+        self._file.truncate(0)
+        self._file.seek(0)
+        os.fsync(self._file.fileno())
+
+    def _replay(self) -> None:
+        """Load rows written after the checkpoint back into the pending list"""
+        if not os.path.exists(self.path):
+            return
+
+        checkpoint = self._read_checkpoint()
+        if checkpoint > os.path.getsize(self.path):
+            checkpoint = 0  # Journal was compacted after the checkpoint was written
+        good_offset = checkpoint
+
+        with open(self.path, "rb") as f:
+            f.seek(checkpoint)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write from a crash, drop it
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                good_offset += len(line)
+                self._pending.append((good_offset, row))
+
+        # Cut off anything after the last complete line
+        if os.path.getsize(self.path) > good_offset:
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+
+# Global journal instance (None when write-behind is disabled)
+_journal_instance: Optional[MessageJournal] = None
+
+
+def get_message_journal() -> Optional[MessageJournal]:
+    """Get the running journal, or None if write-behind mode is off"""
+    return _journal_instance
+
+
+def journal_slot_path(base_path: str, slot: int) -> str:
+    """messages.journal for slot 0, messages.journal.<slot> for the others"""
+    return base_path if slot == 0 else f"{base_path}.{slot}"
+
+
+def _existing_slots(base_path: str) -> List[int]:
+    directory = os.path.dirname(base_path) or "."
+    pattern = re.compile(re.escape(os.path.basename(base_path)) + r"(?:\.(\d+))?")
+    slots = []
+    for name in os.listdir(directory):
+        match = pattern.fullmatch(name)
+        if match:
+            slots.append(int(match.group(1) or 0))
+    return sorted(slots)
+
+
+def start_message_journal() -> None:
+    """
+    Start the global journal if MESSAGE_WRITE_BEHIND is enabled, in the first
+    slot no other worker holds, then adopt the rows of abandoned slots.
+    """
+    global _journal_instance
+    if not Config.MESSAGE_WRITE_BEHIND:
+        return
+
+    base_path = Config.MESSAGE_JOURNAL_PATH
+    slot = 0
+    while True:
+        journal = MessageJournal(
+            journal_slot_path(base_path, slot),
+            batch_size=Config.MESSAGE_JOURNAL_BATCH_SIZE,
+            flush_seconds=Config.MESSAGE_JOURNAL_FLUSH_SECONDS,
+        )
+        try:
+            journal.start()
+            break
+        except JournalLockedError:
+            slot += 1
+
+    for other in _existing_slots(base_path):
+        if other != slot:
+            adopted = journal.adopt(journal_slot_path(base_path, other))
+            if adopted:
+                logger.info(f"Adopted {adopted} journaled rows from slot {other}")
+
+    _journal_instance = journal
+
+
+def stop_message_journal() -> None:
+    """Flush and stop the global journal"""
+    global _journal_instance
+    if _journal_instance:
+        _journal_instance.stop()
+        _journal_instance = None
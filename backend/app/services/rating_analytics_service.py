@@ -0,0 +1,177 @@
+"""
+Servicio de analítica de calificaciones.
+
+Mantiene agregados incrementales de calificaciones (👍/👎) por entrada de la
+base de conocimiento y por response_type, actualizados en cada rate_message,
+para no tener que recorrer la tabla messages. La calificación y sus deltas se
+aplican en una sola función (rate_message), dentro de una transacción y con
+la fila del mensaje bloqueada, así dos calificaciones simultáneas del mismo
+mensaje no descuadran los agregados.
+
+Crear en el SQL Editor de Supabase:
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS kb_sources JSONB;
+
+CREATE TABLE IF NOT EXISTS rating_stats (
+  dimension TEXT NOT NULL,          -- 'kb_entry' o 'response_type'
+  key TEXT NOT NULL,                -- 'knowledge_base:12', 'faqs:3', 'faq', ...
+  up_count INT NOT NULL DEFAULT 0,
+  down_count INT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT now(),
+  PRIMARY KEY (dimension, key)
+);
+
+-- Proporción de 👎, para ordenar por ella en la consulta
+ALTER TABLE rating_stats ADD COLUMN IF NOT EXISTS down_ratio REAL
+  GENERATED ALWAYS AS (
+    CASE WHEN up_count + down_count > 0
+         THEN down_count::REAL / (up_count + down_count) ELSE 0 END
+  ) STORED;
+
+CREATE OR REPLACE FUNCTION apply_rating_deltas(p_deltas JSONB)
+RETURNS VOID AS $$
+  INSERT INTO rating_stats AS s (dimension, key, up_count, down_count, updated_at)
+  SELECT d->>'dimension', d->>'key', (d->>'up')::INT, (d->>'down')::INT, now()
+  FROM jsonb_array_elements(p_deltas) AS d
+  ON CONFLICT (dimension, key) DO UPDATE SET
+    up_count = s.up_count + EXCLUDED.up_count,
+    down_count = s.down_count + EXCLUDED.down_count,
+    updated_at = now();
+$$ LANGUAGE sql;
+
+-- Calificar un mensaje y aplicar el cambio a los agregados (atómico)
+CREATE OR REPLACE FUNCTION rate_message(p_message_id UUID, p_rating TEXT)
+RETURNS BOOLEAN AS $$
+DECLARE
+  v_old TEXT;
+  v_type TEXT;
+  v_sources JSONB;
+  v_up INT;
+  v_down INT;
+BEGIN
+  SELECT rating, coalesce(response_type, 'general'), kb_sources
+    INTO v_old, v_type, v_sources
+  FROM messages WHERE id = p_message_id
+  FOR UPDATE;
+  IF NOT FOUND THEN
+    RETURN FALSE;
+  END IF;
+
+  UPDATE messages SET rating = p_rating, rated_at = now() AT TIME ZONE 'utc'
+  WHERE id = p_message_id;
+
+  IF v_old IS DISTINCT FROM p_rating THEN
+    v_up := (p_rating = 'up')::INT - (v_old IS NOT DISTINCT FROM 'up')::INT;
+    v_down := (p_rating = 'down')::INT - (v_old IS NOT DISTINCT FROM 'down')::INT;
+    PERFORM apply_rating_deltas(
+      jsonb_build_array(jsonb_build_object(
+        'dimension', 'response_type', 'key', v_type, 'up', v_up, 'down', v_down
+      )) || coalesce((
+        SELECT jsonb_agg(jsonb_build_object(
+          'dimension', 'kb_entry', 'key', (src->>'source') || ':' || (src->>'id'),
+          'up', v_up, 'down', v_down
+        ))
+        FROM jsonb_array_elements(
+          CASE WHEN jsonb_typeof(v_sources) = 'array'
+               THEN v_sources ELSE '[]'::JSONB END
+        ) AS src
+      ), '[]'::JSONB)
+    );
+  END IF;
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from app.core.config import supabase_
+from app.core.retry import call_with_retry, is_connect_error
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("kb_entry", "response_type")
+
+
+def kb_entry_key(source: Dict[str, Any]) -> str:
+    """Clave de rating_stats para una entrada de la base de conocimiento"""
+    return f"{source['source']}:{source['id']}"
+
+
+def rate_message(message_id: str, rating: str) -> bool:
+    """
+    Guardar la calificación de un mensaje y actualizar los agregados en la
+    misma transacción (función rate_message).
+
+    Args:
+        message_id: Mensaje calificado
+        rating: 'up' o 'down'
+
+    Returns:
+        False si el mensaje no existe
+    """
+    response = call_with_retry(
+        lambda: supabase_.rpc(
+            "rate_message", {"p_message_id": message_id, "p_rating": rating}
+        ).execute(),
+        "rate message",
+        retryable=is_connect_error,
+    )
+    return bool(response.data)
+
+
+def get_rating_stats(
+    dimension: str, order_by: str = "down_count", limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Obtener los agregados de calificación de una dimensión, ordenados en la
+    consulta (down_ratio es una columna generada).
+    Para 'kb_entry' incluye el texto de la pregunta de cada entrada.
+
+    Args:
+        dimension: 'kb_entry' o 'response_type'
+        order_by: 'down_count', 'up_count' o 'down_ratio'
+        limit: Número máximo de filas
+    """
+    response = (
+        supabase_.table("rating_stats")
+        .select("key, up_count, down_count, down_ratio, updated_at")
+        .eq("dimension", dimension)
+        .order(order_by, desc=True)
+        .order("down_count", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    stats = response.data or []
+
+    for row in stats:
+        row["total"] = row["up_count"] + row["down_count"]
+        row["down_ratio"] = round(row["down_ratio"] or 0.0, 4)
+
+    if dimension == "kb_entry" and stats:
+        _attach_kb_questions(stats)
+
+    return stats
+
+
+def _attach_kb_questions(stats: List[Dict[str, Any]]) -> None:
+    """Agregar el texto de la pregunta a cada fila (una consulta por tabla)"""
+    ids_by_table: Dict[str, List[str]] = {}
+    for row in stats:
+        table, _, entry_id = row["key"].partition(":")
+        row["source"], row["entry_id"] = table, entry_id
+        ids_by_table.setdefault(table, []).append(entry_id)
+
+    questions: Dict[str, str] = {}
+    for table, ids in ids_by_table.items():
+        if table not in ("knowledge_base", "faqs"):
+            continue
+        response = (
+            supabase_.table(table).select("id, question").in_("id", ids).execute()
+        )
+        for entry in response.data or []:
+            questions[f"{table}:{entry['id']}"] = entry["question"]
+
+    for row in stats:
+        row["question"] = questions.get(row["key"])
@@ -0,0 +1,368 @@
+"""
+Realtime Service
+WebSocket rooms per conversation, shared by the chat socket and by the
+services that push events (escalation status changes) to connected clients.
+
+Services run in FastAPI's threadpool, so notify_conversation() hands the send
+over to the event loop that owns the sockets instead of awaiting it.
+
+Rooms span workers through a broadcast backend: every broadcast is delivered
+to the local sockets and published on the room's channel, and each worker
+subscribes only to the channels of the rooms it hosts sockets for.
+
+- MemoryBroadcast (default): one process, nothing leaves the worker.
+- PostgresBroadcast: LISTEN/NOTIFY on BROADCAST_DATABASE_URL (psycopg). With
+  Supabase use the direct connection or the session pooler (port 5432); the
+  transaction pooler does not support LISTEN. NOTIFY payloads are limited to
+  8000 bytes, larger messages only reach the local sockets.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_NOTIFY_BYTES = 7999
+
+
+class BroadcastBackend(ABC):
+    """Delivers payloads published on a channel to every subscribed worker"""
+
+    # Whether other processes may host sockets of the same room
+    distributed = False
+
+    def __init__(self) -> None:
+        self._handler: Optional[Callable[[str, str], Awaitable[None]]] = None
+
+    def set_handler(self, handler: Callable[[str, str], Awaitable[None]]) -> None:
+        self._handler = handler
+
+    @abstractmethod
+    async def start(self) -> None:
+        """Open the connections (app startup)"""
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Close the connections (app shutdown)"""
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> None:
+        """Start receiving the payloads published on channel"""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None:
+        """Stop receiving the payloads published on channel"""
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: str) -> None:
+        """Send payload to every worker subscribed to channel"""
+
+
+class MemoryBroadcast(BroadcastBackend):
+    """Single process: published payloads go straight back to the handler"""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def subscribe(self, channel: str) -> None:
+        pass
+
+    async def unsubscribe(self, channel: str) -> None:
+        pass
+
+    async def publish(self, channel: str, payload: str) -> None:
+        if self._handler:
+            await self._handler(channel, payload)
+
+
+class PostgresBroadcast(BroadcastBackend):
+    """
+    Postgres LISTEN/NOTIFY. One connection listens (re-subscribing after a
+    reconnect) and another publishes with pg_notify (reconnecting and retrying
+    once when the publish fails).
+    """
+
+    distributed = True
+
+    def __init__(self, dsn: str, poll_seconds: float = 0.5) -> None:
+        super().__init__()
+        self.dsn = dsn
+        self.poll_seconds = poll_seconds
+        self._channels: Set[str] = set()
+        # psycopg.AsyncConnection (psycopg is imported lazily)
+        self._listener: Any = None
+        self._publisher: Any = None
+        self._publish_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> Any:
+        import psycopg
+
+        return await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+
+    async def start(self) -> None:
+        self._publisher = await self._connect()
+        self._listener = await self._connect()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for connection in (self._listener, self._publisher):
+            if connection:
+                await connection.close()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                # notifies() holds the connection while it waits; the timeout
+                # lets queued LISTEN/UNLISTEN commands through
+                async for notify in self._listener.notifies(timeout=self.poll_seconds):
+                    if self._handler:
+                        await self._handler(notify.channel, notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast listener error, reconnecting: {e}")
+                await asyncio.sleep(1)
+                await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        try:
+            await self._listener.close()
+            self._listener = await self._connect()
+            for channel in self._channels:
+                await self._execute(self._listener, "LISTEN", channel)
+        except Exception as e:
+            logger.error(f"Broadcast reconnect failed: {e}")
+
+    @staticmethod
+    async def _execute(connection: Any, command: str, channel: str) -> None:
+        from psycopg import sql
+
+        await connection.execute(
+            sql.SQL("{} {}").format(sql.SQL(command), sql.Identifier(channel))
+        )
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+        await self._execute(self._listener, "LISTEN", channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._channels.discard(channel)
+        await self._execute(self._listener, "UNLISTEN", channel)
+
+    async def publish(self, channel: str, payload: str) -> None:
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            logger.warning(f"Broadcast payload too large for NOTIFY on {channel}")
+            return
+        try:
+            await self._notify(channel, payload)
+        except Exception as e:
+            # The publisher connection may have dropped: reconnect, retry once
+            logger.warning(f"Broadcast publish failed, reconnecting: {e}")
+            await self._reconnect_publisher()
+            await self._notify(channel, payload)
+
+    async def _notify(self, channel: str, payload: str) -> None:
+        await self._publisher.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+    async def _reconnect_publisher(self) -> None:
+        # Concurrent failed publishes reconnect one at a time
+        async with self._publish_lock:
+            try:
+                await self._publisher.close()
+            except Exception:
+                pass
+            self._publisher = await self._connect()
+
+
+# namespace -> managers of this process (one per namespace outside tests)
+_managers: Dict[str, List["ConnectionManager"]] = {}
+_backend: BroadcastBackend = MemoryBroadcast()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def _dispatch(channel: str, payload: str) -> None:
+    """Deliver a published payload to the local sockets of its room"""
+    try:
+        data = json.loads(payload)
+        for manager in _managers.get(data["namespace"], []):
+            if manager.origin != data["origin"]:
+                await manager.deliver_local(data["room"], data["message"])
+    except Exception as e:
+        logger.error(f"Error dispatching broadcast on {channel}: {e}")
+
+
+def set_broadcast_backend(backend: BroadcastBackend) -> None:
+    global _backend
+    _backend = backend
+    _backend.set_handler(_dispatch)
+
+
+set_broadcast_backend(_backend)
+
+
+class ConnectionManager:
+    """Manage WebSocket connections for escalated conversations"""
+
+    def __init__(self, namespace: str = "chat") -> None:
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.namespace = namespace
+        # Broadcasts from this manager are already delivered locally
+        self.origin = uuid.uuid4().hex
+        _managers.setdefault(namespace, []).append(self)
+
+    def _channel(self, room: str) -> str:
+        return f"{self.namespace}:{room}"
+
+    async def connect(self, websocket: WebSocket, conversation_id: str) -> None:
+        """Add a new WebSocket connection to a conversation room"""
+        global _loop
+        await websocket.accept()
+        _loop = asyncio.get_running_loop()
+
+        if conversation_id not in self.active_connections:
+            self.active_connections[conversation_id] = set()
+            try:
+                await _backend.subscribe(self._channel(conversation_id))
+            except Exception as e:
+                # Local clients of the room still get their messages
+                logger.error(f"Error subscribing to {conversation_id[:8]}: {e}")
+
+        self.active_connections[conversation_id].add(websocket)
+        print(f"✅ WebSocket connected to conversation {conversation_id[:8]}...")
+
+    def disconnect(self, websocket: WebSocket, conversation_id: str) -> None:
+        """Remove a WebSocket connection from a conversation room"""
+        if conversation_id in self.active_connections:
+            self.active_connections[conversation_id].discard(websocket)
+
+            # Remove empty conversation rooms
+            if not self.active_connections[conversation_id]:
+                del self.active_connections[conversation_id]
+                asyncio.get_running_loop().create_task(
+                    self._unsubscribe_if_empty(conversation_id)
+                )
+
+        print(f"❌ WebSocket disconnected from conversation {conversation_id[:8]}...")
+
+    async def _unsubscribe_if_empty(self, conversation_id: str) -> None:
+        # A client may have rejoined the room before this task ran
+        if conversation_id not in self.active_connections:
+            try:
+                await _backend.unsubscribe(self._channel(conversation_id))
+            except Exception as e:
+                logger.error(f"Error unsubscribing from {conversation_id[:8]}: {e}")
+
+    def has_listeners(self, conversation_id: str) -> bool:
+        """
+        Whether any client may be connected to a conversation room (always
+        True with a distributed backend: the sockets may be on another worker)
+        """
+        return _backend.distributed or bool(
+            self.active_connections.get(conversation_id)
+        )
+
+    async def broadcast_to_conversation(
+        self,
+        conversation_id: str,
+        message: Dict[str, Any],
+        exclude: Optional[WebSocket] = None,
+    ) -> None:
+        """Broadcast a message to all connections in a conversation room"""
+        await self.deliver_local(conversation_id, message, exclude)
+
+        payload = json.dumps(
+            {
+                "namespace": self.namespace,
+                "origin": self.origin,
+                "room": conversation_id,
+                "message": message,
+            },
+            default=str,
+        )
+        try:
+            await _backend.publish(self._channel(conversation_id), payload)
+        except Exception as e:
+            logger.error(f"Error publishing to {conversation_id[:8]}: {e}")
+
+    async def deliver_local(
+        self,
+        conversation_id: str,
+        message: Dict[str, Any],
+        exclude: Optional[WebSocket] = None,
+    ) -> None:
+        """Send a message to the sockets of a room hosted by this worker"""
+        if conversation_id not in self.active_connections:
+            return
+
+        # Create a copy to avoid modification during iteration
+        connections = self.active_connections[conversation_id].copy()
+
+        for connection in connections:
+            if connection != exclude:
+                try:
+                    await connection.send_json(message)
+                except Exception as e:
+                    print(f"⚠️ Error sending message to WebSocket: {e}")
+                    # Remove dead connections
+                    self.disconnect(connection, conversation_id)
+
+    def notify_conversation(
+        self, conversation_id: str, message: Dict[str, Any]
+    ) -> None:
+        """
+        Broadcast from synchronous code (threadpool workers, scheduler jobs).
+        Fire-and-forget: the send is scheduled on the event loop of the sockets.
+        """
+        if _loop is None or not self.has_listeners(conversation_id):
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self.broadcast_to_conversation(conversation_id, message), _loop
+            )
+        except RuntimeError as e:
+            # Event loop already closed (shutdown)
+            print(f"⚠️ Could not notify conversation {conversation_id[:8]}: {e}")
+
+
+manager = ConnectionManager()
+
+
+async def start_realtime() -> None:
+    """Start the broadcast backend selected by BROADCAST_BACKEND"""
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+    if Config.BROADCAST_BACKEND == "postgres":
+        backend = PostgresBroadcast(Config.BROADCAST_DATABASE_URL)
+        try:
+            await backend.start()
+        except Exception as e:
+            # Keep serving this worker's sockets rather than failing startup
+            logger.error(f"Postgres broadcast unavailable, using memory: {e}")
+            return
+        set_broadcast_backend(backend)
+
+    logger.info(f"Realtime broadcast backend: {type(_backend).__name__}")
+
+
+async def stop_realtime() -> None:
+    await _backend.stop()
@@ -8,9 +8,19 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-
+from apscheduler.triggers.interval import IntervalTrigger
+
+from app.services.archive_service import archive_old_conversations
+from app.services.email_outbox_service import (
+    PermanentEmailError,
+    dispatch_outbox,
+    enqueue_email,
+    register_email_handler,
+)
 from app.services.email_service import get_email_service
-from app.core.config import supabase_
+from app.services.idempotency_service import idempotency_store
+from app.core.config import Config, supabase_
+from app.core.retry import call_with_retry, is_connect_error
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +40,7 @@ class ReminderScheduler:
         self.scheduler = BackgroundScheduler()
         self.email_service = get_email_service()
         self.supabase = supabase_
+        register_email_handler("activity_reminder", self._deliver_activity_reminder)
 
     def start(self):
         """Start the scheduler"""
@@ -43,6 +54,37 @@ class ReminderScheduler:
             replace_existing=True,
         )
 
+        # Deliver queued emails (reminders, agent assignments) with retries
+        self.scheduler.add_job(
+            dispatch_outbox,
+            IntervalTrigger(seconds=Config.EMAIL_OUTBOX_POLL_SECONDS),
+            id="email_outbox_dispatch",
+            name="Dispatch queued emails from the outbox",
+            replace_existing=True,
+            coalesce=True,
+        )
+
+        # Drop expired Idempotency-Key rows (expired keys are already reclaimable)
+        self.scheduler.add_job(
+            idempotency_store.purge_expired,
+            IntervalTrigger(hours=1),
+            id="idempotency_key_purge",
+            name="Purge expired idempotency keys",
+            replace_existing=True,
+            coalesce=True,
+        )
+
+        # Nightly move of old conversations to cold storage (if enabled)
+        if Config.ARCHIVE_AFTER_DAYS > 0:
+            self.scheduler.add_job(
+                archive_old_conversations,
+                CronTrigger(hour=3, minute=0),
+                args=[Config.ARCHIVE_AFTER_DAYS],
+                id="nightly_conversation_archive",
+                name="Archive conversations older than ARCHIVE_AFTER_DAYS",
+                replace_existing=True,
+            )
+
         self.scheduler.start()
         logger.info(
             "Reminder scheduler started - will run every minute to send reminders 24h before activities"
@@ -93,14 +135,14 @@ class ReminderScheduler:
 
             logger.info(f"Found {len(activities)} activities in the next 24-25 hours")
 
-            # Send reminder email for each activity
-            sent_count = 0
+            # Queue a reminder email for each activity
+            queued_count = 0
             for activity in activities:
                 if self._send_reminder_for_activity(activity):
-                    sent_count += 1
+                    queued_count += 1
 
             logger.info(
-                f"Successfully sent {sent_count}/{len(activities)} reminder emails"
+                f"Queued {queued_count}/{len(activities)} reminder emails in the outbox"
             )
 
         except Exception as e:
@@ -140,7 +182,7 @@ class ReminderScheduler:
                 # Activities can be on either day
                 query = query.gte("date", start_date).lte("date", end_date)
 
-            response = query.execute()
+            response = call_with_retry(query.execute, "get activities in window")
             activities = response.data if response.data else []
 
             # Filter by exact time window
@@ -218,12 +260,13 @@ class ReminderScheduler:
         try:
             # Check if there's a notification with email_sent = true for this activity
             # If email_sent column doesn't exist yet, we check for any reminder notification
-            response = (
-                self.supabase.table("notifications")
+            response = call_with_retry(
+                lambda: self.supabase.table("notifications")
                 .select("id, email_sent")
                 .eq("activity_id", activity_id)
                 .eq("type", "reminder")
-                .execute()
+                .execute(),
+                "check reminder sent",
             )
 
             if response.data:
@@ -271,9 +314,12 @@ class ReminderScheduler:
                 # END;
                 # $$ LANGUAGE plpgsql SECURITY DEFINER;
 
-                result = self.supabase.rpc(
-                    "get_user_email", {"user_uuid": user_id}
-                ).execute()
+                result = call_with_retry(
+                    lambda: self.supabase.rpc(
+                        "get_user_email", {"user_uuid": user_id}
+                    ).execute(),
+                    "get user email",
+                )
 
                 if result.data and len(result.data) > 0:
                     user_data = result.data[0]
@@ -303,49 +349,71 @@ class ReminderScheduler:
 
     def _send_reminder_for_activity(self, activity: Dict[str, Any]) -> bool:
         """
-        Send reminder email for a single activity and create/update notification
+        Queue the reminder email for a single activity in the email outbox.
+        The dispatcher sends it and then marks the notification (see
+        _deliver_activity_reminder).
 
         Args:
             activity: Activity data with user_email and user_name
 
         Returns:
-            True if email sent successfully
+            True if the email was queued
         """
         try:
             user_email = activity.get("user_email")
-            user_name = activity.get("user_name", "Usuario")
-            activity_id = activity.get("id")
-            user_id = activity.get("user_id")
 
             if not user_email:
                 logger.warning(f"No email found for activity {activity.get('id')}")
                 return False
 
-            # Send email
-            success = self.email_service.send_activity_reminder(
-                to_email=user_email, user_name=user_name, activity=activity
+            enqueue_email(
+                "activity_reminder",
+                {
+                    "to_email": user_email,
+                    "user_name": activity.get("user_name", "Usuario"),
+                    "activity": activity,
+                },
+                dedupe_key=f"activity_reminder:{activity.get('id')}",
             )
-
-            if success:
-                logger.info(
-                    f"Sent reminder for activity '{activity.get('title')}' to {user_email}"
-                )
-
-                # Create or update notification to mark email as sent
-                self._create_or_update_notification(activity_id, user_id, activity)
-            else:
-                logger.warning(
-                    f"Failed to send reminder for activity '{activity.get('title')}' to {user_email}"
-                )
-
-            return success
+            logger.info(
+                f"Queued reminder for activity '{activity.get('title')}' to {user_email}"
+            )
+            return True
 
         except Exception as e:
             logger.error(
-                f"Error sending reminder for activity {activity.get('id')}: {str(e)}"
+                f"Error queueing reminder for activity {activity.get('id')}: {str(e)}"
             )
             return False
 
+    def _deliver_activity_reminder(self, payload: Dict[str, Any]) -> None:
+        """
+        Email outbox handler: send a reminder and create/update its notification
+
+        Args:
+            payload: {"to_email", "user_name", "activity"}
+        """
+        activity = payload["activity"]
+        if not payload.get("to_email"):
+            raise PermanentEmailError(f"No email for activity {activity.get('id')}")
+
+        success = self.email_service.send_activity_reminder(
+            to_email=payload["to_email"],
+            user_name=payload.get("user_name", "Usuario"),
+            activity=activity,
+        )
+        if not success:
+            raise RuntimeError("SMTP send failed (see email_service logs)")
+
+        logger.info(
+            f"Sent reminder for activity '{activity.get('title')}' to {payload['to_email']}"
+        )
+
+        # Create or update notification to mark email as sent
+        self._create_or_update_notification(
+            activity.get("id"), activity.get("user_id"), activity
+        )
+
     def _create_or_update_notification(
         self, activity_id: str, user_id: str, activity: Dict[str, Any]
     ):
@@ -359,12 +427,13 @@ class ReminderScheduler:
         """
         try:
             # Check if notification already exists
-            existing = (
-                self.supabase.table("notifications")
+            existing = call_with_retry(
+                lambda: self.supabase.table("notifications")
                 .select("id")
                 .eq("activity_id", activity_id)
                 .eq("type", "reminder")
-                .execute()
+                .execute(),
+                "get reminder notification",
             )
 
             notification_data = {
@@ -391,15 +460,25 @@ class ReminderScheduler:
             if existing.data and len(existing.data) > 0:
                 # Update existing notification
                 notification_id = existing.data[0]["id"]
-                self.supabase.table("notifications").update(notification_data).eq(
-                    "id", notification_id
-                ).execute()
+                call_with_retry(
+                    lambda: self.supabase.table("notifications")
+                    .update(notification_data)
+                    .eq("id", notification_id)
+                    .execute(),
+                    "update reminder notification",
+                )
                 logger.info(
                     f"Updated notification {notification_id} with email_sent status"
                 )
             else:
                 # Create new notification
-                self.supabase.table("notifications").insert(notification_data).execute()
+                call_with_retry(
+                    lambda: self.supabase.table("notifications")
+                    .insert(notification_data)
+                    .execute(),
+                    "insert reminder notification",
+                    retryable=is_connect_error,
+                )
                 logger.info(f"Created new notification for activity {activity_id}")
 
         except Exception as e:
@@ -1,8 +1,11 @@
 import logging
 import os
-from fastapi import FastAPI
+import httpx
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+from supabase_auth.errors import AuthRetryableError
 
 from app.routes import (
     auth,
@@ -18,7 +21,16 @@ from app.routes import (
     quick_solutions_routes,
 )
 from app.services.scheduler_service import start_scheduler, stop_scheduler
+from app.services.agent_metrics_service import start_agent_metrics
+from app.services.agent_queue_service import start_agent_queue
+from app.services.auto_assign_service import start_auto_assign, stop_auto_assign
+from app.services.realtime_service import start_realtime, stop_realtime
+from app.services.message_journal_service import (
+    start_message_journal,
+    stop_message_journal,
+)
 from app.core.config import Config
+from app.core.retry import retry_budget
 
 # Configure logging
 logging.basicConfig(
@@ -34,15 +46,46 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for FastAPI application
     Handles startup and shutdown events
     """
-    # Startup: Start the reminder scheduler
+    # Startup: Replay the message journal (if enabled), connect the websocket
+    # broadcast backend, load the agent queue and metrics, and start the
+    # scheduler and auto-assignment (if enabled)
+    start_message_journal()
+    await start_realtime()
+    start_agent_queue()
+    start_agent_metrics()
     start_scheduler()
+    start_auto_assign()
     yield
-    # Shutdown: Stop the scheduler
+    # Shutdown: Stop background work and flush pending journaled messages
+    await stop_auto_assign()
     stop_scheduler()
+    await stop_realtime()
+    stop_message_journal()
 
 
 app = FastAPI(lifespan=lifespan)
 
+
+@app.middleware("http")
+async def db_retry_budget(request: Request, call_next):
+    """All database calls of a request share one retry budget"""
+    with retry_budget(Config.DB_RETRY_BUDGET_PER_REQUEST):
+        return await call_next(request)
+
+
+@app.exception_handler(httpx.TransportError)
+@app.exception_handler(AuthRetryableError)
+async def database_unavailable(request: Request, exc: Exception):
+    """Database still unreachable after the retries"""
+    logging.error(f"Database connection error on {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": "Error de conexión con la base de datos. Por favor, intente nuevamente."
+        },
+    )
+
+
 # Configure CORS origins
 frontend_url = Config.FRONTEND_URL or "http://localhost:3000"
 is_production = Config.ENVIRONMENT == "production"
@@ -0,0 +1,33 @@
+"""
+Archivar conversaciones antiguas en almacenamiento frío (bundles gzip)
+Ejecutar desde backend/: python scripts/archive_conversations.py --days 180
+"""
+
+import argparse
+import os
+import sys
+
+# Agregar el directorio backend al path para importar app
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from app.services.archive_service import archive_old_conversations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivar conversaciones antiguas")
+    parser.add_argument(
+        "--days",
+        type=int,
+        required=True,
+        help="Archivar conversaciones inactivas o resueltas hace más de N días",
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    archived = archive_old_conversations(args.days, batch_size=args.batch_size)
+    print(f"✅ {archived} conversaciones archivadas")
+
+
+if __name__ == "__main__":
+    main()
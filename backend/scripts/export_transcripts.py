@@ -0,0 +1,52 @@
+"""
+Exportar conversaciones y mensajes como NDJSON (opcionalmente gzip)
+Ejecutar desde backend/:
+    python scripts/export_transcripts.py --out transcripts.ndjson.gz --gzip \
+        --user <user_id> --start 2025-01-01 --end 2025-02-01 --escalated
+"""
+
+import argparse
+import os
+import sys
+
+# Agregar el directorio backend al path para importar app
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from app.services.export_service import iter_export_records, iter_ndjson
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar transcripciones")
+    parser.add_argument("--out", help="Archivo de salida (por defecto stdout)")
+    parser.add_argument("--user", help="Solo conversaciones de este usuario")
+    parser.add_argument("--start", help="Creadas desde esta fecha (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Creadas antes de esta fecha (YYYY-MM-DD)")
+    escalation = parser.add_mutually_exclusive_group()
+    escalation.add_argument(
+        "--escalated", dest="escalated", action="store_true", default=None
+    )
+    escalation.add_argument("--not-escalated", dest="escalated", action="store_false")
+    parser.add_argument("--gzip", action="store_true", help="Comprimir con gzip")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    records = iter_export_records(
+        user_id=args.user,
+        start=args.start,
+        end=args.end,
+        escalated=args.escalated,
+        page_size=args.page_size,
+    )
+
+    output = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        for chunk in iter_ndjson(records, compress=args.gzip):
+            output.write(chunk)
+    finally:
+        if args.out:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
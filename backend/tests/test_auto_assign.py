@@ -0,0 +1,115 @@
+"""
+Pruebas del motor de asignación automática con un reloj simulado
+(sin base de datos: agentes, cola y asignación son funciones falsas)
+"""
+
+import os
+from datetime import datetime, timezone
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+from fastapi import HTTPException
+
+from app.services.auto_assign_service import AutoAssigner
+
+T0 = 1_700_000_000.0  # 2023-11-14T22:13:20 UTC
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def make_assigner(agents, pending, clock, grace=30, taken=()):
+    assignments = []
+
+    def assign(request_id, agent_id):
+        if request_id in taken:
+            raise HTTPException(status_code=409, detail="taken")
+        assignments.append((request_id, agent_id))
+        pending[:] = [r for r in pending if r["id"] != request_id]
+        for agent in agents:
+            if agent["id"] == agent_id:
+                agent["load"] += 1
+
+    assigner = AutoAssigner(
+        fetch_agents=lambda: [dict(a) for a in agents],
+        fetch_pending=lambda: list(pending),
+        assign=assign,
+        clock=clock,
+        grace_seconds=grace,
+    )
+    return assigner, assignments
+
+
+def test_waits_for_grace_period():
+    clock = FakeClock(T0)
+    agents = [{"id": "a1", "max_cases": 1, "load": 0}]
+    pending = [{"id": "r1", "escalated_at": iso(T0 - 10)}]
+    assigner, assignments = make_assigner(agents, pending, clock)
+
+    assert assigner.tick() == []
+
+    clock.now += 25
+    assert assigner.tick() == [("r1", "a1")]
+    assert assignments == [("r1", "a1")]
+
+
+def test_least_loaded_agent_and_capacity():
+    clock = FakeClock(T0)
+    agents = [
+        {"id": "busy", "max_cases": 3, "load": 2},
+        {"id": "idle", "max_cases": 2, "load": 0},
+        {"id": "full", "max_cases": 1, "load": 1},
+    ]
+    pending = [{"id": f"r{i}", "escalated_at": iso(T0 - 600 + i)} for i in range(5)]
+    assigner, _ = make_assigner(agents, pending, clock)
+
+    assigned = assigner.tick()
+
+    # idle takes two (0 -> 1 -> 2 = capacity), busy takes its last slot
+    assert [agent for _, agent in assigned] == ["idle", "idle", "busy"]
+    assert [request for request, _ in assigned] == ["r0", "r1", "r2"]
+    assert [r["id"] for r in pending] == ["r3", "r4"]
+
+
+def test_ties_go_to_least_recently_assigned():
+    clock = FakeClock(T0)
+    agents = [
+        {"id": "a1", "max_cases": 5, "load": 0},
+        {"id": "a2", "max_cases": 5, "load": 0},
+    ]
+    pending = [{"id": "r1", "escalated_at": iso(T0 - 60)}]
+    assigner, _ = make_assigner(agents, pending, clock)
+    assert assigner.tick() == [("r1", "a1")]
+
+    # Both agents resolved everything; a1 was assigned more recently
+    for agent in agents:
+        agent["load"] = 0
+    clock.now += 60
+    pending.append({"id": "r2", "escalated_at": iso(T0)})
+    assert assigner.tick() == [("r2", "a2")]
+
+
+def test_lost_claim_skips_request():
+    clock = FakeClock(T0)
+    agents = [
+        {"id": "a1", "max_cases": 1, "load": 0},
+        {"id": "a2", "max_cases": 1, "load": 0},
+    ]
+    pending = [
+        {"id": "r1", "escalated_at": iso(T0 - 120)},
+        {"id": "r2", "escalated_at": iso(T0 - 60)},
+    ]
+    assigner, assignments = make_assigner(agents, pending, clock, taken={"r1"})
+
+    assert assigner.tick() == [("r2", "a2")]
+    assert assignments == [("r2", "a2")]
@@ -0,0 +1,156 @@
+"""
+Pruebas del almacén de claves de idempotencia (Supabase es un fake con la
+semántica de la tabla idempotency_keys y de claim_idempotency_key)
+"""
+
+import os
+import threading
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import idempotency_service
+from app.services.idempotency_service import IdempotencyStore
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeRpc:
+    def __init__(self, db, params):
+        self.db, self.params = db, params
+
+    def execute(self):
+        p = self.params
+        row_key = (p["p_scope"], p["p_user_id"], p["p_key"])
+        with self.db.lock:
+            row = self.db.rows.get(row_key)
+            if row is None:
+                self.db.rows[row_key] = {
+                    "scope": p["p_scope"],
+                    "user_id": p["p_user_id"],
+                    "key": p["p_key"],
+                    "fingerprint": p["p_fingerprint"],
+                    "status": "running",
+                    "response": None,
+                }
+                return Result([{"claimed": True, "status": "running"}])
+            return Result([{"claimed": False, **row}])
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+        self.filters = {}
+
+    def update(self, values):
+        self.action, self.values = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def execute(self):
+        with self.db.lock:
+            matched = [
+                row_key
+                for row_key, row in self.db.rows.items()
+                if all(row[c] == v for c, v in self.filters.items())
+            ]
+            for row_key in matched:
+                if self.action == "delete":
+                    del self.db.rows[row_key]
+                else:
+                    self.db.rows[row_key].update(self.values)
+        return Result([])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows = {}
+        self.lock = threading.Lock()
+
+    def rpc(self, name, params):
+        assert name == "claim_idempotency_key"
+        return FakeRpc(self, params)
+
+    def table(self, name):
+        assert name == "idempotency_keys"
+        return FakeTable(self)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeSupabase()
+    monkeypatch.setattr(idempotency_service, "supabase_", db)
+    return db
+
+
+def test_retry_on_another_worker_replays_the_first_response(db):
+    first, second = (IdempotencyStore(ttl=60, lease=60) for _ in range(2))
+    calls = []
+
+    def operation():
+        calls.append(1)
+        return {"ok": len(calls)}
+
+    assert first.run("send", "u1", "k1", {"a": 1}, operation) == {"ok": 1}
+    assert second.run("send", "u1", "k1", {"a": 1}, operation) == {"ok": 1}
+    assert len(calls) == 1
+
+
+def test_retry_gets_409_right_away_while_the_original_is_running(db):
+    store = IdempotencyStore(ttl=60, lease=60)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_operation():
+        started.set()
+        release.wait(5)
+        return {"ok": True}
+
+    original = threading.Thread(
+        target=store.run, args=("send", "u1", "k1", {}, slow_operation)
+    )
+    original.start()
+    started.wait(5)
+    try:
+        with pytest.raises(HTTPException) as error:
+            store.run("send", "u1", "k1", {}, slow_operation)
+        assert error.value.status_code == 409
+    finally:
+        release.set()
+        original.join(5)
+
+    # Once the original finishes, retries replay its response
+    assert store.run("send", "u1", "k1", {}, slow_operation) == {"ok": True}
+
+
+def test_failed_request_releases_the_key(db):
+    store = IdempotencyStore(ttl=60, lease=60)
+
+    def failing_operation():
+        raise HTTPException(status_code=500, detail="boom")
+
+    with pytest.raises(HTTPException):
+        store.run("send", "u1", "k1", {}, failing_operation)
+    assert db.rows == {}
+    assert store.run("send", "u1", "k1", {}, lambda: {"ok": True}) == {"ok": True}
+
+
+def test_reused_key_with_different_data_is_rejected(db):
+    store = IdempotencyStore(ttl=60, lease=60)
+    store.run("send", "u1", "k1", {"a": 1}, lambda: {"ok": True})
+
+    with pytest.raises(HTTPException) as error:
+        store.run("send", "u1", "k1", {"a": 2}, lambda: {"ok": True})
+    assert error.value.status_code == 422
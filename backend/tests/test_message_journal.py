@@ -0,0 +1,118 @@
+"""
+Journal tests: rejected rows go to dead letters, transient errors keep the
+batch, and each worker gets its own journal slot (Supabase is a fake)
+"""
+
+import json
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+from app.services import message_journal_service
+from app.services.message_journal_service import JournalLockedError, MessageJournal
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+
+    def upsert(self, rows):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        if self.db.down:
+            raise httpx.ConnectError("connection refused")
+        for row in self.rows:
+            if row["content"] is None:
+                raise APIError({"code": "23502", "message": "null content"})
+        self.db.calls += 1
+        self.db.rows.extend(self.rows)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows = []
+        self.calls = 0
+        self.down = False
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+def make_rows(count, bad=()):
+    return [
+        {"id": f"m{i}", "content": None if i in bad else f"hola {i}"}
+        for i in range(count)
+    ]
+
+
+def test_rejected_rows_are_dead_lettered(tmp_path, monkeypatch):
+    db = FakeSupabase()
+    monkeypatch.setattr(message_journal_service, "supabase_", db)
+    journal = MessageJournal(str(tmp_path / "messages.journal"), batch_size=8)
+    journal.start()
+    try:
+        journal.append(make_rows(8, bad={3, 6}))
+        assert journal.flush() == 8
+    finally:
+        journal.stop()
+
+    assert sorted(row["id"] for row in db.rows) == ["m0", "m1", "m2", "m4", "m5", "m7"]
+    with open(journal.dead_letter_path) as f:
+        dead = [json.loads(line)["row"]["id"] for line in f]
+    assert dead == ["m3", "m6"]
+    assert os.path.getsize(journal.path) == 0
+
+
+def test_transient_error_keeps_the_batch(tmp_path, monkeypatch):
+    db = FakeSupabase()
+    db.down = True
+    monkeypatch.setattr(message_journal_service, "supabase_", db)
+    journal = MessageJournal(str(tmp_path / "messages.journal"))
+    journal.start()
+    try:
+        journal.append(make_rows(3))
+        assert journal.flush() == 0
+        assert len(journal._pending) == 3
+
+        db.down = False
+        assert journal.flush() == 3
+    finally:
+        journal.stop()
+
+    assert not os.path.exists(journal.dead_letter_path)
+    assert len(db.rows) == 3
+
+
+def test_workers_get_their_own_slot_and_adopt_orphans(tmp_path, monkeypatch):
+    db = FakeSupabase()
+    db.down = True
+    monkeypatch.setattr(message_journal_service, "supabase_", db)
+    base = str(tmp_path / "messages.journal")
+
+    # A previous run left unflushed rows in slot 1
+    orphan = MessageJournal(message_journal_service.journal_slot_path(base, 1))
+    orphan.start()
+    orphan.append(make_rows(2))
+    orphan._stop_event.set()
+    orphan._file.close()
+    orphan._file = None
+    orphan._release_lock()
+
+    first = MessageJournal(base)
+    first.start()
+    with pytest.raises(JournalLockedError):
+        MessageJournal(base).start()
+
+    assert first.adopt(orphan.path) == 2
+    assert os.path.getsize(orphan.path) == 0
+
+    db.down = False
+    first.stop()
+    assert sorted(row["id"] for row in db.rows) == ["m0", "m1"]
@@ -0,0 +1,102 @@
+"""
+Pruebas del reparto de mensajes entre workers del ConnectionManager, con dos
+managers sobre el backend en memoria (cada uno hace de un worker)
+"""
+
+import asyncio
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+
+from app.services import realtime_service
+from app.services.realtime_service import (
+    ConnectionManager,
+    MemoryBroadcast,
+    PostgresBroadcast,
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+class RecordingBroadcast(MemoryBroadcast):
+    def __init__(self):
+        super().__init__()
+        self.channels = set()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+
+def test_rooms_span_workers():
+    previous = realtime_service._backend
+    backend = RecordingBroadcast()
+    realtime_service.set_broadcast_backend(backend)
+    worker_a = ConnectionManager(namespace="test-chat")
+    worker_b = ConnectionManager(namespace="test-chat")
+    student, agent, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await worker_a.connect(student, "conv-1")
+        await worker_b.connect(agent, "conv-1")
+        await worker_b.connect(other, "conv-2")
+
+        await worker_a.broadcast_to_conversation(
+            "conv-1", {"type": "message", "content": "hola"}, exclude=student
+        )
+
+        worker_b.disconnect(other, "conv-2")
+        await asyncio.sleep(0)
+
+    try:
+        asyncio.run(run())
+    finally:
+        realtime_service.set_broadcast_backend(previous)
+
+    assert agent.sent == [{"type": "message", "content": "hola"}]
+    assert student.sent == []
+    assert other.sent == []
+    assert backend.channels == {"test-chat:conv-1"}
+
+
+class FakeConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = False
+        self.executed = []
+
+    async def execute(self, query, params=None):
+        if self.fail:
+            raise ConnectionError("server closed the connection")
+        self.executed.append(params)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_postgres_publish_reconnects_once():
+    backend = PostgresBroadcast("postgresql://test")
+    broken, fresh = FakeConnection(fail=True), FakeConnection()
+    backend._publisher = broken
+
+    async def connect():
+        return fresh
+
+    backend._connect = connect
+    asyncio.run(backend.publish("chat:conv-1", '{"room": "conv-1"}'))
+
+    assert broken.closed
+    assert backend._publisher is fresh
+    assert fresh.executed == [("chat:conv-1", '{"room": "conv-1"}')]
@@ -0,0 +1,136 @@
+"""
+Pruebas de la política de reintentos compartida (app.core.retry) con un
+cliente httpx simulado
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from postgrest.exceptions import APIError
+
+from app.core import retry
+from app.core.retry import (
+    RetryPolicy,
+    call_with_retry,
+    call_with_retry_async,
+    is_connect_error,
+    is_retryable,
+    retry_budget,
+    with_db_retry,
+)
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+@pytest.fixture(autouse=True)
+def fast_policy():
+    previous = retry.default_policy
+    retry.configure(FAST)
+    yield
+    retry.configure(previous)
+
+
+def flaky_client(failures, error=httpx.ConnectError):
+    """Client whose first `failures` requests fail with `error`"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) <= failures:
+            raise error("boom", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+    client = httpx.Client(
+        transport=httpx.MockTransport(handler), base_url="http://db/rest/v1"
+    )
+    return client, calls
+
+
+def run_with_retry(operation, name="test", **kwargs):
+    return asyncio.run(call_with_retry_async(operation, name, **kwargs))
+
+
+def test_full_jitter_delay_is_bounded():
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    for attempt in range(6):
+        delay = policy.delay(attempt)
+        assert 0 <= delay <= min(2.0, 0.5 * 2**attempt)
+
+
+def test_retries_connection_errors():
+    client, calls = flaky_client(failures=2)
+    response = run_with_retry(lambda: client.get("/profiles"), "test get profiles")
+    assert response.json() == {"ok": True}
+    assert len(calls) == 3
+    assert retry.retry_stats.snapshot()["test get profiles"]["retries"] == 2
+
+
+def test_gives_up_after_max_attempts():
+    client, calls = flaky_client(failures=5)
+    with pytest.raises(httpx.ConnectError):
+        run_with_retry(lambda: client.get("/profiles"))
+    assert len(calls) == FAST.max_attempts
+
+
+def test_writes_are_not_retried_after_a_read_error():
+    client, calls = flaky_client(failures=1, error=httpx.ReadError)
+    with pytest.raises(httpx.ReadError):
+        run_with_retry(
+            lambda: client.post("/messages", json={}), retryable=is_connect_error
+        )
+    assert calls == ["POST"]
+
+
+def test_sync_helper_retries_service_calls():
+    client, calls = flaky_client(failures=1)
+    response = call_with_retry(lambda: client.get("/profiles"), "test sync get")
+    assert response.json() == {"ok": True}
+    assert len(calls) == 2
+
+
+def test_sync_helper_does_not_retry_writes_after_a_read_error():
+    client, calls = flaky_client(failures=1, error=httpx.ReadError)
+    with pytest.raises(httpx.ReadError):
+        call_with_retry(
+            lambda: client.post("/messages", json={}),
+            "test sync insert",
+            retryable=is_connect_error,
+        )
+    assert calls == ["POST"]
+
+
+def test_gateway_errors_are_retryable():
+    assert is_retryable(APIError({"message": "Bad Gateway", "code": 502}))
+    assert not is_retryable(APIError({"message": "null value", "code": "23502"}))
+
+
+def test_budget_is_shared_by_the_calls_of_a_request():
+    client, calls = flaky_client(failures=10)
+
+    async def run():
+        with retry_budget(1):
+            for _ in range(2):
+                with pytest.raises(httpx.ConnectError):
+                    await call_with_retry_async(lambda: client.get("/profiles"), "t")
+
+    asyncio.run(run())
+    # One retry in total: 2 first attempts + 1 retry
+    assert len(calls) == 3
+
+
+def test_route_decorator_keeps_the_signature_and_retries():
+    client, calls = flaky_client(failures=1)
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    @with_db_retry("test get item")
+    def get_item(item_id: str, limit: int = 5):
+        client.get("/items")
+        return {"item_id": item_id, "limit": limit}
+
+    response = TestClient(app).get("/items/a1?limit=3")
+    assert response.json() == {"item_id": "a1", "limit": 3}
+    assert len(calls) == 2
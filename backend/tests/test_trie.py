@@ -0,0 +1,44 @@
+"""
+Pruebas del trie de autocompletado (app.core.trie)
+"""
+
+from app.core.trie import PrefixTrie
+
+
+def make_trie(k=10):
+    trie = PrefixTrie(k=k)
+    trie.insert("horario", ["horario", "Horario", "atención"], score=5)
+    trie.insert("inscripcion", ["inscripción", "materias"], score=2)
+    trie.insert("homologacion", ["homologación", "materias"], score=9)
+    return trie
+
+
+def test_prefix_ranked_by_score():
+    trie = make_trie()
+    assert trie.search("ho") == ["homologacion", "horario"]
+    assert trie.search("mat") == ["homologacion", "inscripcion"]
+    assert trie.search("x") == []
+
+
+def test_case_and_accent_insensitive():
+    trie = make_trie()
+    assert trie.search("INSCRIPCIÓN") == ["inscripcion"]
+    assert trie.search("atencion") == ["horario"]
+
+
+def test_update_score_reranks_in_place():
+    trie = make_trie()
+    trie.update_score("inscripcion", 20)
+    assert trie.search("mat") == ["inscripcion", "homologacion"]
+
+
+def test_nodes_keep_only_top_k():
+    trie = PrefixTrie(k=2)
+    for i, score in enumerate([1, 5, 3, 4]):
+        trie.insert(f"r{i}", [f"respuesta{i}"], score=score)
+    assert trie.search("resp", limit=10) == ["r1", "r3"]
+
+    # An item outside the top k enters it once its score is high enough
+    trie.update_score("r0", 10)
+    assert trie.search("resp") == ["r0", "r1"]
+    assert trie.search("respuesta0") == ["r0"]
@@ -8,8 +8,15 @@ import { MessageSquareOff } from 'lucide-react';
 import Link from 'next/link';
 
 export default function CasoActivoPage() {
-  const { activeCase, loading, error, refetch, resolveRequest } =
-    useAgentRequests();
+  const {
+    activeCases,
+    activeCase,
+    selectCase,
+    loading,
+    error,
+    refetch,
+    resolveRequest,
+  } = useAgentRequests();
 
   if (loading) {
     return (
@@ -48,7 +55,7 @@ export default function CasoActivoPage() {
         <div className="text-center max-w-md">
           <MessageSquareOff size={64} className="mx-auto mb-4 text-gray-400" />
           <h2 className="text-2xl font-bold text-gray-900 mb-2">
-            No tienes un caso activo
+            No tienes casos activos
           </h2>
           <p className="text-gray-600 mb-6">
             Actualmente no tienes ningún caso asignado. Ve a la sección de
@@ -66,6 +73,38 @@ export default function CasoActivoPage() {
   }
 
   return (
-    <AgentChatInterface activeCase={activeCase} onResolve={resolveRequest} />
+    <div className="flex flex-col h-full">
+      {/* Selector de casos cuando el agente atiende varios a la vez */}
+      {activeCases.length > 1 && (
+        <div className="flex gap-2 overflow-x-auto border-b border-gray-200 bg-white px-4 py-2">
+          {activeCases.map((item) => {
+            const selected = item.request.id === activeCase.request.id;
+            return (
+              <button
+                key={item.request.id}
+                onClick={() => selectCase(item.request.id)}
+                className={`whitespace-nowrap rounded-lg px-3 py-1.5 text-sm transition-colors ${
+                  selected
+                    ? 'bg-primary text-white'
+                    : 'bg-gray-100 text-gray-700 hover:bg-gray-200'
+                }`}
+              >
+                {item.user_info.name}
+                {item.conversation.title
+                  ? ` · ${item.conversation.title}`
+                  : ''}
+              </button>
+            );
+          })}
+        </div>
+      )}
+      <div className="flex-1 min-h-0">
+        <AgentChatInterface
+          key={activeCase.request.id}
+          activeCase={activeCase}
+          onResolve={resolveRequest}
+        />
+      </div>
+    </div>
   );
 }
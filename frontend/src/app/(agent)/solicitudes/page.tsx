@@ -7,7 +7,7 @@ import RequestList from '@/components/agent/RequestList';
 import { AlertCircle, RefreshCw } from 'lucide-react';
 
 export default function SolicitudesPage() {
-  const { requests, activeCase, loading, error, refetch, takeRequest } =
+  const { requests, activeCases, loading, error, refetch, takeRequest } =
     useAgentRequests();
 
   // Filtrar solo solicitudes pendientes
@@ -62,8 +62,8 @@ export default function SolicitudesPage() {
         </div>
       </div>
 
-      {/* Aviso si tiene caso activo */}
-      {activeCase && (
+      {/* Aviso si tiene casos activos */}
+      {activeCases.length > 0 && (
         <div className="p-6">
           <div className="max-w-4xl mx-auto">
             <div className="bg-info bg-opacity-10 border-l-4 border-info rounded-lg p-4">
@@ -73,14 +73,19 @@ export default function SolicitudesPage() {
                 </div>
                 <div className="flex-1">
                   <p className="text-sm font-semibold text-dark mb-1">
-                    Tienes un caso activo
+                    {activeCases.length === 1
+                      ? 'Tienes un caso activo'
+                      : `Tienes ${activeCases.length} casos activos`}
                   </p>
                   <p className="text-sm text-dark opacity-80">
                     Actualmente estás atendiendo a{' '}
                     <span className="font-semibold text-info">
-                      {activeCase.user_info.name}
+                      {activeCases
+                        .map((item) => item.user_info.name)
+                        .join(', ')}
                     </span>
-                    . Solo puedes tomar otro caso después de resolver el actual.
+                    . Puedes tomar más casos hasta llegar a tu límite de casos
+                    simultáneos.
                   </p>
                 </div>
               </div>
@@ -239,10 +239,10 @@ export default function ChatInterface({
   }, [blocked]);
 
   // Monitor escalation status and unblock chat when agent takes the case
-  // Enable polling for active chat to detect when agent takes the case
+  // Subscribe to pushed status changes to detect when agent takes the case
   const { status: escalationStatus } = useEscalationStatus(
     conversationId || undefined,
-    { enablePolling: true }
+    { subscribe: true }
   );
 
   // 🔹 Update hasActiveAgentRef when escalation status changes
@@ -98,8 +98,30 @@ export default function RequestList({
             </div>
           </div>
 
-          {/* Preview del último mensaje */}
-          {request.last_message && (
+          {/* Resumen del escalamiento (o, mientras no esté, el último mensaje) */}
+          {request.summary?.intent && (
+            <div className="mb-4 p-3 bg-light rounded-md border border-gray-200 space-y-1">
+              <p className="text-sm font-semibold text-dark line-clamp-2">
+                {request.summary.intent}
+              </p>
+              {request.summary.open_question && (
+                <p className="text-sm text-dark line-clamp-2">
+                  Pregunta abierta: {request.summary.open_question}
+                </p>
+              )}
+              {request.summary.kb_entries.length > 0 && (
+                <p className="text-xs text-dark opacity-70 line-clamp-1">
+                  Ya se mostró:{' '}
+                  {request.summary.kb_entries
+                    .map(
+                      (entry) => entry.question || `${entry.source} ${entry.id}`
+                    )
+                    .join(' · ')}
+                </p>
+              )}
+            </div>
+          )}
+          {!request.summary?.intent && request.last_message && (
             <div className="mb-4 p-3 bg-light rounded-md border border-gray-200">
               <p className="text-sm text-dark line-clamp-2">
                 {request.last_message}
@@ -1,44 +1,80 @@
 // Hook para gestionar solicitudes de agentes
 'use client';
 
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import {
   getAgentRequests,
   getActiveCase,
+  getActiveCases,
   takeRequest,
   resolveRequest,
 } from '@/lib/agentRequestApi';
-import type { AgentRequest, AgentActiveCase } from '@/types/agentRequest';
+import type {
+  AgentRequest,
+  AgentActiveCase,
+  AgentActiveCaseSummary,
+} from '@/types/agentRequest';
 
 export function useAgentRequests() {
   const [requests, setRequests] = useState<AgentRequest[]>([]);
+  // Todos los casos activos del agente (puede atender hasta max_cases)
+  const [activeCases, setActiveCases] = useState<AgentActiveCaseSummary[]>(
+    []
+  );
+  // Caso abierto en el chat, con su historial
   const [activeCase, setActiveCase] = useState<AgentActiveCase | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const selectedRequestIdRef = useRef<string | null>(null);
+
+  const loadActiveCase = useCallback(async (requestId: string | null) => {
+    selectedRequestIdRef.current = requestId;
+    if (!requestId) {
+      setActiveCase(null);
+      return;
+    }
+    const caseData = await getActiveCase(requestId).catch((err) => {
+      console.error('Error fetching active case:', err);
+      return null; // Return null if active case fetch fails
+    });
+    // Ignorar respuestas de un caso que ya no está seleccionado
+    if (selectedRequestIdRef.current === requestId) {
+      setActiveCase(caseData);
+    }
+  }, []);
 
   const fetchRequests = useCallback(async () => {
     try {
       setLoading(true);
       setError(null);
 
-      // Fetch requests and active case separately to handle errors independently
+      // Fetch requests and active cases separately (independent errors)
       const requestsPromise = getAgentRequests().catch((err) => {
         console.error('Error fetching requests:', err);
         return []; // Return empty array if requests fail
       });
 
-      const activeCasePromise = getActiveCase().catch((err) => {
-        console.error('Error fetching active case:', err);
-        return null; // Return null if active case fetch fails
+      const activeCasesPromise = getActiveCases().catch((err) => {
+        console.error('Error fetching active cases:', err);
+        return []; // Return empty array if active cases fail
       });
 
-      const [requestsData, activeCaseData] = await Promise.all([
+      const [requestsData, activeCasesData] = await Promise.all([
         requestsPromise,
-        activeCasePromise,
+        activeCasesPromise,
       ]);
 
       setRequests(requestsData);
-      setActiveCase(activeCaseData);
+      setActiveCases(activeCasesData);
+
+      // Mantener el caso abierto si sigue activo; si no, abrir el primero
+      const selectedId = selectedRequestIdRef.current;
+      const stillActive = activeCasesData.some(
+        (item) => item.request.id === selectedId
+      );
+      await loadActiveCase(
+        stillActive ? selectedId : (activeCasesData[0]?.request.id ?? null)
+      );
     } catch (err) {
       setError(
         err instanceof Error ? err.message : 'Error al cargar solicitudes'
@@ -47,7 +83,7 @@ export function useAgentRequests() {
     } finally {
       setLoading(false);
     }
-  }, []);
+  }, [loadActiveCase]);
 
   useEffect(() => {
     fetchRequests();
@@ -83,7 +119,9 @@ export function useAgentRequests() {
 
   return {
     requests,
+    activeCases,
     activeCase,
+    selectCase: loadActiveCase,
     loading,
     error,
     refetch: fetchRequests,
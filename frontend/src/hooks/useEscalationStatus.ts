@@ -3,18 +3,19 @@ import { getEscalationStatus, EscalationStatus } from '@/lib/conversationApi';
 
 interface UseEscalationStatusOptions {
   /**
-   * Si es true, hace polling cada 3 segundos para detectar cambios
+   * Si es true, se suscribe por WebSocket a los cambios de estado
+   * (el backend los envía al escalar, asignar y resolver el caso)
    * Si es false, solo carga una vez
    * Por defecto: false (para optimizar performance en listas)
    */
-  enablePolling?: boolean;
+  subscribe?: boolean;
 }
 
 export function useEscalationStatus(
   conversationId?: string,
   options: UseEscalationStatusOptions = {}
 ) {
-  const { enablePolling = false } = options;
+  const { subscribe = false } = options;
   const [status, setStatus] = useState<EscalationStatus | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -56,21 +57,57 @@ export function useEscalationStatus(
     // Primera carga
     fetchStatus();
 
-    // Solo hacer polling si está habilitado (para chat activo)
-    let intervalId: NodeJS.Timeout | null = null;
-    if (enablePolling) {
-      intervalId = setInterval(() => {
+    // Solo suscribirse si está habilitado (para chat activo)
+    let ws: WebSocket | null = null;
+    let reconnectId: NodeJS.Timeout | null = null;
+
+    function connect() {
+      const backendUrl =
+        process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
+      const wsProtocol = backendUrl.startsWith('https://')
+        ? 'wss://'
+        : 'ws://';
+      const wsBaseUrl = backendUrl.replace(/^https?:\/\//, '');
+
+      ws = new WebSocket(`${wsProtocol}${wsBaseUrl}/ws/chat/${conversationId}`);
+
+      // Recargar al (re)conectar por si hubo cambios mientras no había conexión
+      ws.onopen = () => {
         fetchStatus();
-      }, 3000);
+      };
+
+      ws.onmessage = (event) => {
+        try {
+          const data = JSON.parse(event.data);
+          if (data.type === 'escalation_status' && mounted) {
+            setStatus(data.status);
+          }
+        } catch (err) {
+          console.error('Error parsing escalation status event:', err);
+        }
+      };
+
+      ws.onclose = () => {
+        if (mounted) {
+          reconnectId = setTimeout(connect, 3000);
+        }
+      };
+    }
+
+    if (subscribe) {
+      connect();
     }
 
     return () => {
       mounted = false;
-      if (intervalId) {
-        clearInterval(intervalId);
+      if (reconnectId) {
+        clearTimeout(reconnectId);
+      }
+      if (ws) {
+        ws.close();
       }
     };
-  }, [conversationId, enablePolling]);
+  }, [conversationId, subscribe]);
 
   return { status, loading, error };
 }
@@ -11,6 +11,11 @@ export interface WebSocketMessage {
   image_url?: string; // 🔹 URL de imagen adjunta
 }
 
+interface MessageCursor {
+  timestamp: string;
+  id: string;
+}
+
 interface UseWebSocketChatOptions {
   conversationId?: string;
   userId?: string;
@@ -29,6 +34,12 @@ export function useWebSocketChat({
   const wsRef = useRef<WebSocket | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Last message seen, so a reconnect only receives what was missed
+  const cursorRef = useRef<MessageCursor | null>(null);
+
+  useEffect(() => {
+    cursorRef.current = null;
+  }, [conversationId]);
 
   // Connect to WebSocket
   useEffect(() => {
@@ -49,7 +60,14 @@ export function useWebSocketChat({
     // Convert HTTP/HTTPS URL to WS/WSS URL
     const wsProtocol = backendUrl.startsWith('https://') ? 'wss://' : 'ws://';
     const wsBaseUrl = backendUrl.replace(/^https?:\/\//, '');
-    const wsUrl = `${wsProtocol}${wsBaseUrl}/ws/chat/${conversationId}`;
+    let wsUrl = `${wsProtocol}${wsBaseUrl}/ws/chat/${conversationId}`;
+    if (cursorRef.current) {
+      const params = new URLSearchParams({
+        after_timestamp: cursorRef.current.timestamp,
+        after_id: cursorRef.current.id,
+      });
+      wsUrl += `?${params}`;
+    }
 
     console.log('🔌 Connecting to WebSocket:', wsUrl);
 
@@ -65,9 +83,26 @@ export function useWebSocketChat({
       try {
         const data = JSON.parse(event.data);
 
-        if (data.type === 'message' && onMessage) {
+        if (data.type === 'message') {
           // Received a new message from another user
-          onMessage(data.message);
+          cursorRef.current = {
+            timestamp: data.message.timestamp,
+            id: String(data.message.id),
+          };
+          onMessage?.(data.message);
+        } else if (data.type === 'message_sent' && data.timestamp) {
+          cursorRef.current = {
+            timestamp: data.timestamp,
+            id: String(data.message_id),
+          };
+        } else if (data.type === 'resync') {
+          // Messages missed while disconnected
+          data.messages.forEach((message: WebSocketMessage) =>
+            onMessage?.(message)
+          );
+          if (data.cursor) {
+            cursorRef.current = data.cursor;
+          }
         } else if (data.type === 'error') {
           console.error('❌ WebSocket error:', data.message);
           setError(data.message);
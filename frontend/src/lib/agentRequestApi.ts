@@ -4,6 +4,7 @@ import { handleError } from './errors';
 import type {
   AgentRequest,
   AgentActiveCase,
+  AgentActiveCaseSummary,
   AgentMessage,
 } from '@/types/agentRequest';
 
@@ -43,11 +44,48 @@ export async function getAgentRequests(): Promise<AgentRequest[]> {
 }
 
 /**
- * Obtener el caso activo del agente (si tiene uno)
+ * Obtener los casos activos del agente (sin historial de mensajes)
  */
-export async function getActiveCase(): Promise<AgentActiveCase | null> {
+export async function getActiveCases(): Promise<AgentActiveCaseSummary[]> {
   try {
-    const response = await fetch(`${API_URL}/agent/active-case`, {
+    const response = await fetch(`${API_URL}/agent/active-cases`, {
+      method: 'GET',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include',
+    });
+
+    if (!response.ok) {
+      let errorMsg = 'Error al obtener casos activos';
+      try {
+        const errorData = await response.json();
+        errorMsg = errorData.detail || errorMsg;
+      } catch {
+        // Si no se puede parsear el JSON, usar mensaje por defecto
+      }
+      console.error(`getActiveCases failed: ${response.status} - ${errorMsg}`);
+      throw new Error(errorMsg);
+    }
+
+    const data = await response.json();
+    return data.cases || [];
+  } catch (error) {
+    handleError(error);
+    throw error;
+  }
+}
+
+/**
+ * Obtener un caso activo del agente (si tiene uno): el indicado o, sin
+ * requestId, el asignado hace más tiempo
+ */
+export async function getActiveCase(
+  requestId?: string
+): Promise<AgentActiveCase | null> {
+  try {
+    const query = requestId
+      ? `?request_id=${encodeURIComponent(requestId)}`
+      : '';
+    const response = await fetch(`${API_URL}/agent/active-case${query}`, {
       method: 'GET',
       headers: { 'Content-Type': 'application/json' },
       credentials: 'include',
@@ -1,5 +1,20 @@
 // Tipos para el sistema de agentes de soporte
 
+// Resumen generado al escalar (intención, base de conocimiento ya mostrada
+// y pregunta abierta)
+export interface EscalationSummary {
+  intent: string;
+  open_question: string;
+  kb_entries: {
+    source: string;
+    id: string | number;
+    question?: string | null;
+  }[];
+  message_count: number;
+  generator: 'model' | 'fallback';
+  generated_at: string;
+}
+
 export interface AgentRequest {
   id: string; // UUID
   conversation_id: string; // UUID
@@ -13,6 +28,7 @@ export interface AgentRequest {
   user_name?: string;
   last_message?: string;
   message_count?: number;
+  summary?: EscalationSummary | null;
 }
 
 export interface AgentConversation {
@@ -50,4 +66,7 @@ export interface AgentActiveCase {
   };
 }
 
+// Entrada de la lista de casos activos (sin historial de mensajes)
+export type AgentActiveCaseSummary = Omit<AgentActiveCase, 'messages'>;
+
 export type RequestStatus = 'all' | 'pending' | 'in_progress' | 'resolved';